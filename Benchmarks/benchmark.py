@@ -0,0 +1,178 @@
+'''
+Offline benchmark of the scraping pipeline stages, no browser or database server is needed.
+Run from the project root: python -m Benchmarks.benchmark [--update-baseline] [--stage NAME] [--tolerance 0.25] [--memory-floor 256]
+
+Every stage is timed over several repetitions on the fixtures (best run counts) and run once more under tracemalloc
+for its peak memory. Results are compared with Benchmarks/baseline.json and the run exits with 1 when a stage is slower
+or uses more memory than the baseline allows. Memory growth below memory-floor KB is never a regression, stages that
+allocate a few KB would otherwise fail on allocator noise. Record a new baseline with --update-baseline after an intended change
+or on a new machine, the numbers are only comparable on the same hardware.
+
+Requires mongomock (pip install mongomock "pymongo<4.9", newer pymongo versions break mongomock bulk writes).
+'''
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import mongomock
+
+from extraction import parse_listing_page, parse_game_page
+from domain_mapper import DomainMapper
+from mongo import Mongo
+from feed import parse_feed_payload
+from parser_backends import set_default_backend
+from Benchmarks import fixtures
+
+BASELINE_PATH = Path(__file__).parent / 'baseline.json'
+# Peak memory growth in KB that is ignored whatever the relative change
+MEMORY_FLOOR_KB = 256
+MONGO_CONFIG = { 'Database': 'benchmark', 'BookOddsCollection': 'book_odds', 'BasketballTeamsCollection': 'teams', 'BookOddsHistoryCollection': 'odds_history' }
+
+class Stage:
+    """
+    A benchmarked step, setup prepares fresh input outside of the timing and run returns the number of processed items
+    """
+
+    def __init__(self, name: str, unit: str, setup, run) -> None:
+        self.name = name
+        self.unit = unit
+        self.setup = setup
+        self.run = run
+
+def listing_stage() -> Stage:
+    pages, _ = fixtures.listing_pages()
+    def run(pages):
+        return sum(len(parse_listing_page(html, fixtures.SPORT, fixtures.COUNTRY, fixtures.TOURNAMENT).rows) for html in pages)
+    return Stage('listing_parse', 'rows', lambda: pages, run)
+
+def game_stage() -> Stage:
+    pages, _ = fixtures.game_pages()
+    def run(pages):
+        return sum(len(parse_game_page(html).book_odds) for html in pages)
+    return Stage('game_parse', 'bookmakers', lambda: pages, run)
+
+def feed_stage() -> Stage:
+    payloads, names = fixtures.feed_payloads()
+    def run(payloads):
+        return sum(len(parse_feed_payload(payload, names)) for payload in payloads)
+    return Stage('feed_parse', 'bookmakers', lambda: payloads, run)
+
+def mapper_stage() -> Stage:
+    teams, games = fixtures.teams(), fixtures.games()
+    def run(mapper):
+        return sum(1 for _ in mapper.map_to_domain(games))
+    return Stage('map_to_domain', 'games', lambda: DomainMapper(teams), run)
+
+def mongo_stage() -> Stage:
+    # mongomock evaluates the batch $or lookup per document, a smaller dataset keeps the stage within seconds
+    game_dicts = list(DomainMapper(fixtures.teams()).map_to_domain(fixtures.games(500)))
+    def setup():
+        return Mongo(MONGO_CONFIG, client = mongomock.MongoClient())
+    def run(mongo):
+        return sum(batch['inserted'] for batch in mongo.insert_many(game_dicts))
+    return Stage('mongo_insert_many', 'games', setup, run)
+
+STAGES = [ listing_stage, game_stage, feed_stage, mapper_stage, mongo_stage ]
+
+def measure(stage: Stage, repeat: int) -> dict[str, any]:
+    best, items = None, 0
+    for _ in range(repeat):
+        args = stage.setup()
+        started = time.perf_counter()
+        items = stage.run(args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best == None else min(best, elapsed)
+
+    args = stage.setup()
+    tracemalloc.start()
+    stage.run(args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return { 'items': items, 'unit': stage.unit, 'seconds': round(best, 6), 'throughput': round(items / best, 1) if best > 0 else 0, 'peak_memory_kb': round(peak / 1024, 1) }
+
+def compare(name: str, result: dict[str, any], baseline: dict[str, any], tolerance: float, memory_floor_kb: float = MEMORY_FLOOR_KB) -> list[str]:
+    if baseline == None:
+        return []
+
+    regressions = []
+    if result['throughput'] < baseline['throughput'] * (1 - tolerance):
+        regressions.append('{} throughput {:.0f} {}/s is below baseline {:.0f}'.format(name, result['throughput'], result['unit'], baseline['throughput']))
+    if result['peak_memory_kb'] > baseline['peak_memory_kb'] * (1 + tolerance) and result['peak_memory_kb'] - baseline['peak_memory_kb'] > memory_floor_kb:
+        regressions.append('{} peak memory {:.0f} KB is above baseline {:.0f} KB'.format(name, result['peak_memory_kb'], baseline['peak_memory_kb']))
+
+    return regressions
+
+def load_baseline() -> dict[str, any]:
+    if not BASELINE_PATH.exists():
+        return {}
+
+    with open(BASELINE_PATH, 'r') as baseline_file:
+        return json.load(baseline_file)
+
+def save_baseline(results: dict[str, dict[str, any]]):
+    baseline = load_baseline()
+    stages = baseline.get('stages', {})
+    stages.update(results)
+    baseline = { 'recorded_at': datetime.utcnow().isoformat(timespec = 'seconds'), 'python': platform.python_version(), 'machine': platform.machine(), 'stages': stages }
+    with open(BASELINE_PATH, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent = 2)
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark the pipeline stages on offline fixtures')
+    parser.add_argument('--stage', action = 'append', help = 'Only run the named stage, can be repeated')
+    parser.add_argument('--repeat', type = int, default = 5, help = 'Timed repetitions per stage, the best one counts')
+    parser.add_argument('--tolerance', type = float, default = 0.25, help = 'Allowed relative throughput drop or memory growth against the baseline')
+    parser.add_argument('--memory-floor', type = float, default = MEMORY_FLOOR_KB, help = 'Peak memory growth in KB that is never reported as a regression')
+    parser.add_argument('--backend', help = 'HTML parser backend (selectolax, lxml or html.parser), the fastest installed one by default')
+    parser.add_argument('--update-baseline', action = 'store_true', help = 'Store the results as the new baseline instead of comparing')
+    args = parser.parse_args()
+
+    # Skipped rows and unmapped teams are expected on synthetic data and would only slow the stages down
+    logging.disable(logging.WARNING)
+    if args.backend != None:
+        set_default_backend(args.backend)
+
+    _, recorded_listing = fixtures.listing_pages()
+    _, recorded_games = fixtures.game_pages()
+    print('Listing pages: {}, game pages: {}'.format('recorded' if recorded_listing else 'generated', 'recorded' if recorded_games else 'generated'))
+
+    baseline = load_baseline().get('stages', {})
+    results, regressions = {}, []
+    for create_stage in STAGES:
+        stage = create_stage()
+        if args.stage and stage.name not in args.stage:
+            continue
+
+        result = measure(stage, args.repeat)
+        results[stage.name] = result
+        regressions += compare(stage.name, result, baseline.get(stage.name), args.tolerance, args.memory_floor)
+
+        reference = baseline.get(stage.name)
+        change = ' ({:+.0%} vs baseline)'.format(result['throughput'] / reference['throughput'] - 1) if reference else ''
+        print('{:<18} {:>8} {:<10} {:>9.1f} ms {:>12.0f} {}/s{} {:>10.0f} KB peak'.format(
+            stage.name, result['items'], stage.unit, result['seconds'] * 1000, result['throughput'], stage.unit, change, result['peak_memory_kb']))
+
+    if args.update_baseline:
+        save_baseline(results)
+        print('Baseline saved to {}'.format(BASELINE_PATH))
+        return
+
+    if len(baseline) == 0:
+        print('No baseline found, record one with --update-baseline')
+        return
+
+    for regression in regressions:
+        print('REGRESSION: {}'.format(regression))
+
+    if len(regressions) > 0:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+'''
+Parses the fixture pages with every installed parser backend and checks that all of them extract the same data.
+Run from the project root: python -m Benchmarks.compare_backends
+
+Exits with 1 when a backend disagrees with html.parser, the reference backend, on any page.
+'''
+import logging
+import sys
+import time
+
+from extraction import parse_listing_page, parse_game_page
+from parser_backends import ParserBackend, available_backends
+from Benchmarks import fixtures
+
+def extract_listing(html: str, backend: ParserBackend):
+    page = parse_listing_page(html, fixtures.SPORT, fixtures.COUNTRY, fixtures.TOURNAMENT, backend)
+    return page.page_count, [ vars(row) for row in page.rows ]
+
+def extract_game(html: str, backend: ParserBackend):
+    details = parse_game_page(html, backend)
+    return details.home_score, details.away_score, details.date, [ (odd.name, odd.home, odd.away) for odd in details.book_odds ]
+
+def main():
+    logging.disable(logging.WARNING)
+    backends = available_backends()
+    reference = backends[-1]
+    pages = [ ('listing', extract_listing, html) for html in fixtures.listing_pages()[0] ] + [ ('game', extract_game, html) for html in fixtures.game_pages()[0] ]
+
+    expected = [ extract(html, reference) for _, extract, html in pages ]
+    mismatches = 0
+    for backend in backends:
+        started = time.perf_counter()
+        results = [ extract(html, backend) for _, extract, html in pages ]
+        elapsed = time.perf_counter() - started
+
+        for (kind, _, _), result, reference_result in zip(pages, results, expected):
+            if result != reference_result:
+                mismatches += 1
+                print('{} differs from {} on a {} page:\n  {}\n  {}'.format(backend.name, reference.name, kind, result, reference_result))
+
+        print('{:<12} {} pages in {:.1f} ms'.format(backend.name, len(pages), elapsed * 1000))
+
+    if mismatches > 0:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
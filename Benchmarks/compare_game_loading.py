@@ -0,0 +1,74 @@
+'''
+Compares memory held and time taken to load the whole odds collection eagerly into Game objects and lazily as raw BSON.
+Run from the project root: python -m Benchmarks.compare_game_loading [--games 20000]
+
+The collection is simulated offline with mapped fixture games encoded to one BSON batch, the bytes a cursor receives from the server.
+Memory is what the loaded collection keeps allocated, time is measured without tracemalloc.
+Every hundredth game is stored the legacy way, with string odds and '-' for missing prices, as collections that were not migrated hold them.
+'''
+import argparse
+import gc
+import logging
+import time
+import tracemalloc
+
+import bson
+from bson import ObjectId
+
+from domain_mapper import DomainMapper, to_game
+from mongo import LazyGames, RAW_CODEC_OPTIONS
+from Benchmarks import fixtures
+
+def to_legacy(game: dict[str, any]) -> dict[str, any]:
+    odds = [ { 'name': odd['name'], 'home': str(odd['home']), 'away': str(odd['away']) } for odd in game['odds'] ]
+    odds[0]['home'] = '-'
+    return dict(game, odds = odds)
+
+def load_eager(batch: bytes):
+    return [ to_game(document) for document in bson.decode_all(batch) ]
+
+def load_lazy(batch: bytes):
+    return LazyGames(bson.decode_all(batch, RAW_CODEC_OPTIONS))
+
+def read_all(games) -> int:
+    # Touches every price like an analysis over the collection does
+    return sum(1 for game in games for odd in game.odds if odd.home != None)
+
+def measure(load, batch: bytes) -> tuple:
+    started = time.perf_counter()
+    games = load(batch)
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    read_all(games)
+    read_seconds = time.perf_counter() - started
+    del games
+
+    gc.collect()
+    tracemalloc.start()
+    games = load(batch)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return load_seconds, read_seconds, held
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Compare eager and lazy loading of the odds collection')
+    parser.add_argument('--games', type = int, default = 20000, help = 'Games in the simulated collection')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    mapper = DomainMapper(fixtures.teams())
+    games = [ to_legacy(game) if index % 100 == 0 else game for index, game in enumerate(mapper.map_to_domain(fixtures.games(args.games))) ]
+    batch = b''.join(bson.encode(dict(game, _id = ObjectId())) for game in games)
+
+    # Missing and string prices are read as None
+    legacy = load_eager(bson.encode(dict(games[0], _id = ObjectId())))[0]
+    assert all(odd.home == None and odd.away == None for odd in legacy.odds), 'Legacy string odds must load as missing prices'
+    print('{} games, {:.1f} MiB of BSON'.format(args.games, len(batch) / 2 ** 20))
+
+    for name, load in [ ('eager', load_eager), ('lazy', load_lazy) ]:
+        load_seconds, read_seconds, held = measure(load, batch)
+        print('{:<6} load {:.2f}s  read all odds {:.2f}s  held {:.1f} MiB'.format(name, load_seconds, read_seconds, held / 2 ** 20))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+'''
+Fixture pages and datasets for the offline benchmarks.
+
+Pages recorded with Benchmarks.record_pages are used when present in Benchmarks/pages/listing and Benchmarks/pages/game,
+otherwise synthetic pages with the oddsportal markup the parsers rely on are generated. Generated data is seeded so every run sees the same input.
+'''
+import json
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from models import Game, BookOdds, Team, Sport
+
+PAGES_DIR = Path(__file__).parent / 'pages'
+SPORT, COUNTRY, TOURNAMENT = 'basketball', 'europe', 'euroleague'
+BOOKMAKERS = [ 'bet365', 'Pinnacle', '1xBet', 'Unibet', 'bwin', 'William Hill', 'Betway', 'Marathonbet', 'Betfair', '10Bet', 'Betsson', 'Coolbet' ]
+
+def load_pages(kind: str, pattern: str = '*.html') -> list[str]:
+    return [ page.read_text(encoding = 'utf-8') for page in sorted((PAGES_DIR / kind).glob(pattern)) ]
+
+def listing_pages(count: int = 5, rows: int = 50) -> tuple:
+    ''' Recorded listing pages or generated ones, with a flag telling which '''
+    recorded = load_pages('listing')
+    if len(recorded) > 0:
+        return recorded, True
+
+    rng = random.Random(14)
+    return [ listing_page_html(rng, rows) for _ in range(count) ], False
+
+def game_pages(count: int = 20, books: int = 12) -> tuple:
+    recorded = load_pages('game')
+    if len(recorded) > 0:
+        return recorded, True
+
+    rng = random.Random(15)
+    return [ game_page_html(rng, books) for _ in range(count) ], False
+
+def feed_payloads(count: int = 20, books: int = 12) -> tuple:
+    ''' Odds feeds of game pages as (payload, bookmaker names), recorded ones from Benchmarks/pages/feed or generated '''
+    names = { str(index + 1): book for index, book in enumerate(BOOKMAKERS) }
+    recorded = load_pages('feed', '*.dat')
+    if len(recorded) > 0:
+        return recorded, names
+
+    rng = random.Random(17)
+    return [ feed_payload(rng, names, books) for _ in range(count) ], names
+
+def feed_payload(rng: random.Random, names: dict[str, str], books: int) -> str:
+    bookmaker_ids = rng.sample(list(names.keys()), books)
+    odds = { bookmaker_id: [ round(rng.uniform(1.1, 4), 2), round(rng.uniform(1.1, 4), 2) ] for bookmaker_id in bookmaker_ids }
+    feed = { 's': 1, 'd': { 'bt': 3, 'sc': 1, 'oddsdata': { 'back': { 'E-3-1-0-0-0': { 'odds': odds, 'act': { bookmaker_id: True for bookmaker_id in bookmaker_ids } } } } }, 'refresh': 20 }
+    return "globals.jsonpCallback('/feed/match/1-3-AbCdEf12-3-1-yj4b1.dat', {});".format(json.dumps(feed))
+
+def listing_page_html(rng: random.Random, rows: int) -> str:
+    day = datetime(2023, 5, 12)
+    html = [ '<html><body><div id="app">' ]
+    for row in range(rows):
+        home, away = rng.sample(TEAM_NAMES, 2)
+        header = '<div><div class="text-black-main">{} - Play Offs</div></div>'.format(day.strftime('%d %b %Y')) if row % 5 == 0 else ''
+        html.append(
+            '<div class="eventRow flex w-full flex-col text-xs">{header}<div class="border-black-borders flex w-full"><div class="group flex">'
+            '<a href="/{sport}/{country}/{tournament}/{home_slug}-{away_slug}-{row}/"><div><p>{hour:02d}:00</p></div></a>'
+            '<a title="{home}"><p class="participant-name">{home}</p></a><span><span>{home_score}</span><span>–</span><span>{away_score}</span></span>'
+            '<a title="{away}"><p class="participant-name">{away}</p></a>'
+            '<div><p>{odd_home:.2f}</p></div><div><p>{odd_away:.2f}</p></div><div>{books}</div></div></div></div>'.format(
+                header = header, sport = SPORT, country = COUNTRY, tournament = TOURNAMENT, home_slug = slug(home), away_slug = slug(away),
+                row = row, hour = 18 + row % 4, home = home, away = away, home_score = rng.randint(60, 100), away_score = rng.randint(60, 100),
+                odd_home = rng.uniform(1.1, 4), odd_away = rng.uniform(1.1, 4), books = rng.randint(5, 15)))
+        if row % 5 == 4:
+            day -= timedelta(days = 1)
+
+    html.append('<div class="pagination"><a class="pagination-link" data-number="1">1</a><a class="pagination-link" data-number="2">2</a></div>')
+    html.append('</div></body></html>')
+    return ''.join(html)
+
+def game_page_html(rng: random.Random, books: int) -> str:
+    html = [ '<html><body><div id="app"><div><div><div><main><div>header</div><div><div>breadcrumbs</div><div><div><div>'
+             '<div><div class="text-gray-dark font-bold">{}</div></div><div>–</div><div><div class="text-gray-dark font-bold">{}</div></div>'
+             '</div></div></div></div>'.format(rng.randint(60, 100), rng.randint(60, 100)),
+             '<div class="flex"><div class="event-start-time"></div><p>Friday,</p><p>12 May 2023,</p><p>20:00</p></div>' ]
+    for book in rng.sample(BOOKMAKERS, books):
+        html.append('<div class="flex text-xs border-black-borders h-9"><div class="flex" provider-name="0"><a href="#"><img/></a><a href="#"><p>{}</p></a></div>'
+                    '<div class="flex"><p>{:.2f}</p></div><div class="flex"><p>{:.2f}</p></div><div><p>95.1%</p></div></div>'.format(book, rng.uniform(1.1, 4), rng.uniform(1.1, 4)))
+    html.append('</main></div></div></div></div></body></html>')
+    return ''.join(html)
+
+def teams() -> list[Team]:
+    return [ Team(name, name.split(' ')[-1], 'T{:02d}'.format(index), name.split(' ')[0]) for index, name in enumerate(TEAM_NAMES) ]
+
+def games(count: int = 5000) -> list[Game]:
+    rng = random.Random(16)
+    start = datetime(2012, 10, 1, 20)
+    result = []
+    for index in range(count):
+        home, away = rng.sample(TEAM_NAMES, 2)
+        odds = [ BookOdds(book, round(rng.uniform(1.1, 4), 2), round(rng.uniform(1.1, 4), 2)) for book in rng.sample(BOOKMAKERS, 10) ]
+        result.append(Game(Sport.Basketball, TOURNAMENT, home, away, start + timedelta(hours = index), '{}-{}'.format(2012 + index // 300, 2013 + index // 300),
+                           rng.randint(60, 100), rng.randint(60, 100), odds, 'https://www.oddsportal.com/{}/{}/{}/game-{}/'.format(SPORT, COUNTRY, TOURNAMENT, index)))
+    return result
+
+def slug(name: str) -> str:
+    return name.lower().replace(' ', '-')
+
+TEAM_NAMES = [ 'Real Madrid', 'FC Barcelona', 'Olympiacos Piraeus', 'Panathinaikos Athens', 'Fenerbahce Istanbul', 'Anadolu Efes',
+               'CSKA Moscow', 'Zalgiris Kaunas', 'Maccabi Tel Aviv', 'Baskonia Vitoria', 'Olimpia Milano', 'Bayern Munich',
+               'Partizan Belgrade', 'Crvena Zvezda', 'AS Monaco', 'Valencia Basket', 'ALBA Berlin', 'Virtus Bologna' ]
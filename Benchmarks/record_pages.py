@@ -0,0 +1,77 @@
+'''
+Saves rendered oddsportal pages as benchmark fixtures, the benchmark uses them instead of the generated pages.
+Run from the project root: python -m Benchmarks.record_pages <results_page_url> [--games 20]
+or, without a browser, from the pages of an earlier crawl: python -m Benchmarks.record_pages --from-cache page_cache [--games 20]
+
+The listing page is saved to Benchmarks/pages/listing and the first game pages linked from it to Benchmarks/pages/game.
+'''
+import argparse
+import logging
+import re
+from urllib.parse import urlparse
+
+from extraction import parse_listing_page, parse_game_page, LISTING_ROW_SELECTOR, BOOKMAKER_ROW_SELECTOR
+from Benchmarks.fixtures import PAGES_DIR
+
+def save(kind: str, name: str, html: str):
+    directory = PAGES_DIR / kind
+    directory.mkdir(parents = True, exist_ok = True)
+    (directory / '{}.html'.format(name)).write_text(html, encoding = 'utf-8')
+
+def record_from_browser(url: str, games: int):
+    from scraper import Scraper
+    from browser import BrowserProfile
+
+    # Path is /<sport>/<country>/<tournament>/...
+    sport, country, tournament = urlparse(url).path.strip('/').split('/')[0:3]
+
+    with Scraper(profile = BrowserProfile(block_resources = [])) as scraper:
+        scraper.load_page(url, LISTING_ROW_SELECTOR, 'listing')
+        html = scraper.driver.page_source
+        save('listing', '{}-{}'.format(tournament, urlparse(url).path.strip('/').split('/')[-1]), html)
+
+        rows = parse_listing_page(html, sport, country, tournament).rows
+        for index, row in enumerate(rows[0:games]):
+            scraper.load_page(scraper.base_url + row.link, BOOKMAKER_ROW_SELECTOR, 'game')
+            save('game', '{}-{:03d}'.format(tournament, index), scraper.driver.page_source)
+        print('Recorded 1 listing page and {} game pages to {}'.format(min(len(rows), games), PAGES_DIR))
+
+def record_from_cache(directory: str, games: int):
+    from page_cache import PageCache
+
+    # Cached pages are told apart by what they parse into, listing and game URLs share their first path segments.
+    # Game pages are tried as listings first, their skipped rows are expected
+    logging.disable(logging.ERROR)
+    listings, game_count = 0, 0
+    for url, html in PageCache(directory).pages():
+        path = urlparse(url).path.strip('/').split('/')
+        if len(path) < 3:
+            continue
+
+        # Results of past seasons are under <tournament>-<season>, the scraper parses them with the plain tournament name
+        tournament = re.sub(r'-\d{4}(-\d{4})?$', '', path[2])
+        if listings == 0 and len(parse_listing_page(html, path[0], path[1], tournament).rows) > 0:
+            save('listing', '{}-{}'.format(path[2], path[-1]), html)
+            listings += 1
+        elif game_count < games and len(parse_game_page(html).book_odds) > 0:
+            save('game', '{}-{:03d}'.format(path[2], game_count), html)
+            game_count += 1
+
+    print('Recorded {} listing pages and {} game pages from {} to {}'.format(listings, game_count, directory, PAGES_DIR))
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Record oddsportal pages for the offline benchmark')
+    parser.add_argument('url', nargs = '?', help = 'Tournament results or upcoming page, e.g. https://www.oddsportal.com/basketball/europe/euroleague/results/')
+    parser.add_argument('--from-cache', metavar = 'DIRECTORY', help = 'Copy pages from a page cache directory instead of opening a browser')
+    parser.add_argument('--games', type = int, default = 20, help = 'Number of game pages to record')
+    args = parser.parse_args()
+
+    if args.from_cache != None:
+        record_from_cache(args.from_cache, args.games)
+    elif args.url != None:
+        record_from_browser(args.url, args.games)
+    else:
+        parser.error('Give a page url or --from-cache')
+
+if __name__ == "__main__":
+    main()
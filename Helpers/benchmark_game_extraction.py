@@ -0,0 +1,106 @@
+'''
+Compares game page extraction paths on saved oddsportal game pages (*.html).
+Run from the project root: python -m Helpers.benchmark_game_extraction <pages_dir> [--browser]
+
+Without --browser only the single parse of the page source is timed. With --browser every page is opened
+in Chrome and the previous per-element XPath lookups are timed against reading page_source once.
+'''
+import argparse
+import time
+from pathlib import Path
+from datetime import datetime
+from bs4 import BeautifulSoup
+
+from extraction import parse_game_page, BOOKMAKER_ROW_SELECTOR, GAME_DATE_FORMAT
+
+def legacy_extract(driver) -> tuple:
+    # Previous scrape_game_type_A path, two WebDriver round trips per lookup plus a BeautifulSoup parse
+    from selenium.webdriver.common.by import By
+
+    def get_text(target):
+        try:
+            driver.find_element(By.XPATH, target).text
+        except:
+            return None
+        return driver.find_element(By.XPATH, target).text
+
+    home_score = get_text('//*[@id="app"]/div/div[1]/div/main/div[2]/div[2]/div/div/div[1]//div[contains(@class, "text-gray-dark")]')
+    away_score = get_text('//*[@id="app"]/div/div[1]/div/main/div[2]/div[2]/div/div/div[3]//div[contains(@class, "text-gray-dark")]')
+    date_portion_1 = get_text('//div[contains(@class, "event-start-time")]/following-sibling::p[2]')
+    date_portion_2 = get_text('//div[contains(@class, "event-start-time")]/following-sibling::p[3]')
+    date_time = None if date_portion_1 == None or date_portion_2 == None else datetime.strptime(date_portion_1 + date_portion_2, GAME_DATE_FORMAT)
+
+    book_odds = []
+    soup = BeautifulSoup(driver.page_source, 'html.parser')
+    books = soup.select(BOOKMAKER_ROW_SELECTOR)
+    for idx in range(len(books)):
+        book = get_text('//div[contains(@class, "text-xs")][{}]/div[@provider-name="0"]/a[2]/p'.format(idx + 1))
+        if book == None:
+            continue
+        book_rows = books[idx].find_all('div', recursive=False)
+        p_home, p_away = book_rows[1].find('p'), book_rows[2].find('p')
+        try:
+            book_odds.append((book, float(p_home.text if p_home else ''), float(p_away.text if p_away else '')))
+        except ValueError:
+            continue
+
+    return home_score, away_score, date_time, book_odds
+
+def single_parse_extract(html: str) -> tuple:
+    details = parse_game_page(html)
+    return details.home_score, details.away_score, details.date, [ (odd.name, odd.home, odd.away) for odd in details.book_odds ]
+
+def time_call(func, *args) -> tuple:
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark game page extraction on saved pages')
+    parser.add_argument('pages_dir', help = 'Directory with saved game pages (*.html)')
+    parser.add_argument('--browser', action = 'store_true', help = 'Also time the previous XPath path in Chrome')
+    parser.add_argument('--repeat', type = int, default = 5, help = 'Offline parse repetitions per page')
+    args = parser.parse_args()
+
+    pages = sorted(Path(args.pages_dir).glob('*.html'))
+    if len(pages) == 0:
+        print('No saved pages found in {}'.format(args.pages_dir))
+        return
+
+    offline_total = 0
+    for page in pages:
+        html = page.read_text(encoding = 'utf-8')
+        for _ in range(args.repeat):
+            _, elapsed = time_call(single_parse_extract, html)
+            offline_total += elapsed
+    print('Single parse: {} pages, {:.1f} ms per page'.format(len(pages), offline_total / (len(pages) * args.repeat) * 1000))
+
+    if not args.browser:
+        return
+
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
+    options = webdriver.ChromeOptions()
+    options.add_argument('headless')
+    driver = webdriver.Chrome(service = Service(), options = options)
+    legacy_total, single_total, mismatches = 0, 0, 0
+    try:
+        for page in pages:
+            driver.get(page.resolve().as_uri())
+            legacy, legacy_elapsed = time_call(legacy_extract, driver)
+            single, single_elapsed = time_call(lambda: single_parse_extract(driver.page_source))
+            legacy_total += legacy_elapsed
+            single_total += single_elapsed
+            if legacy != single:
+                mismatches += 1
+                print('Results differ for {}'.format(page.name))
+    finally:
+        driver.quit()
+
+    print('Previous XPath path: {:.1f} ms per page'.format(legacy_total / len(pages) * 1000))
+    print('Single page_source read: {:.1f} ms per page ({:.1f}x faster), {} mismatching pages'.format(
+        single_total / len(pages) * 1000, legacy_total / single_total if single_total > 0 else 0, mismatches))
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 import json
+import logging
+import sys
 
 from mongo import Mongo
-from domain_mapper import DomainMapper, to_sport_name
+from migrations import MigrationRunner, MIGRATIONS
 
 def get_config():
     with open('config.json', 'r') as config_file:
@@ -9,19 +11,11 @@ def get_config():
         return config
     
 
+# python -m Helpers.clean_odds [--dry-run] converts odds stored as strings to floats
+logging.basicConfig(level=logging.INFO, format='%(asctime)s  [%(levelname)s] %(message)s')
 config = get_config()
 mongo = Mongo(config)
-odds = mongo.get_game_odds()
-teams = mongo.get_teams()
-
-for odd in odds:
-    if len(odd.odds) > 0 and isinstance(odd.odds[0].home, str):
-        odd.odds = list(filter(lambda book_odds: book_odds.home != "-" and book_odds.away != "-", odd.odds))
-        for book in odd.odds:
-            if book.home != "-" and book.away != "-":
-                book.home = float(book.home)
-                book.away = float(book.away)
-        game_upd = DomainMapper(teams).map_to_domain([odd])[0]
-        mongo.update_one(odd.id, game_upd)
-
+runner = MigrationRunner(mongo, config.get('MigrationStateFile', 'migrations_state.json'), config.get('BatchSize', 500), dry_run = '--dry-run' in sys.argv)
+runner.run(MIGRATIONS['odds_to_float'])
+mongo.close()
 
@@ -0,0 +1,58 @@
+'''
+Loads the same oddsportal pages with a full browser profile and with the profile from config.json and reports
+bytes transferred and load time per page, so the savings of resource blocking and the profile cache can be checked.
+Run from the project root: python -m Helpers.compare_browser_profiles <url> [<url> ...] [--repeat 2]
+
+Pages are loaded repeat times with each profile. With a ProfileDirectory configured, later loads show the warm cache.
+'''
+import argparse
+import json
+import time
+from urllib.parse import urlparse
+
+from scraper import Scraper
+from browser import BrowserProfile
+from extraction import LISTING_ROW_SELECTOR, BOOKMAKER_ROW_SELECTOR
+
+def get_config():
+    with open('config.json', 'r') as config_file:
+        config = json.load(config_file)
+        return config
+
+def ready_selector(url: str) -> str:
+    # Listing pages are /<sport>/<country>/<tournament>/ or .../results/, game pages have the game slug as fourth segment
+    segments = urlparse(url).path.strip('/').split('/')
+    return LISTING_ROW_SELECTOR if len(segments) <= 3 or 'results' in segments else BOOKMAKER_ROW_SELECTOR
+
+def measure(profile: BrowserProfile, urls: list[str], repeat: int) -> dict[str, list]:
+    results = { url: [] for url in urls }
+    with Scraper(profile = profile, name = 'compare') as scraper:
+        for _ in range(repeat):
+            for url in urls:
+                started = time.monotonic()
+                traffic = scraper.load_page(url, ready_selector(url), 'compare')
+                results[url].append((time.monotonic() - started, traffic))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Compare page weight and load time of the full and the configured browser profile')
+    parser.add_argument('urls', nargs = '+', help = 'Pages to load')
+    parser.add_argument('--repeat', type = int, default = 2, help = 'Loads of every page per profile')
+    args = parser.parse_args()
+
+    lean = BrowserProfile.from_config(get_config())
+    lean.measure_traffic = True
+    full = BrowserProfile(headless = lean.headless, block_resources = [], block_ads = False, measure_traffic = True)
+
+    full_results = measure(full, args.urls, args.repeat)
+    lean_results = measure(lean, args.urls, args.repeat)
+
+    for url in args.urls:
+        print(url)
+        for load, ((full_seconds, full_traffic), (lean_seconds, lean_traffic)) in enumerate(zip(full_results[url], lean_results[url])):
+            print('  load {}: full {:.1f}s {:.0f} KB, lean {:.1f}s {:.0f} KB ({} blocked) - saved {:.1f}s and {:.0f} KB'.format(
+                load + 1, full_seconds, full_traffic.bytes / 1024, lean_seconds, lean_traffic.bytes / 1024, lean_traffic.blocked,
+                full_seconds - lean_seconds, (full_traffic.bytes - lean_traffic.bytes) / 1024))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import json
+import sys
+
+from mongo import Mongo
+from jobs import create_queue, PENDING, LEASED, DONE, FAILED
+
+def get_config():
+    with open('config.json', 'r') as config_file:
+        config = json.load(config_file)
+        return config
+
+
+# python -m Helpers.crawl_progress [--requeue] prints job counts and throughput of every shard of the crawl queue,
+# --requeue first hands jobs with expired leases back to the queue
+config = get_config()
+mongo = Mongo(config) if config.get('Queue', {}).get('Backend', 'sqlite') == 'mongo' else None
+queue = create_queue(config, mongo)
+if '--requeue' in sys.argv:
+    print('Requeued {} jobs'.format(queue.requeue_expired()))
+
+for shard, progress in queue.progress().items():
+    total = progress[PENDING] + progress[LEASED] + progress[DONE] + progress[FAILED]
+    print('{:<50} {:>4}/{:<4} done {:>3} leased {:>3} failed {:>6} games {:>8} pages/h {:>8} games/h'.format(
+        shard, progress[DONE], total, progress[LEASED], progress[FAILED], progress['games'], str(progress['pages_per_hour']), str(progress['games_per_hour'])))
+
+if mongo != None:
+    mongo.close()
@@ -0,0 +1,24 @@
+import json
+import logging
+import sys
+
+from mongo import Mongo
+from euroleague import EuroleagueClient, EuroleagueEnricher
+
+def get_config():
+    with open('config.json', 'r') as config_file:
+        config = json.load(config_file)
+        return config
+
+
+# python -m Helpers.enrich_euroleague [E2021 ...] matches stored Euroleague games to official game codes and stores their
+# box scores and play-by-play, seasons default to Euroleague.Seasons of the config
+logging.basicConfig(level=logging.INFO, format='%(asctime)s  [%(levelname)s] %(message)s')
+config = get_config()
+mongo = Mongo(config)
+client = EuroleagueClient.from_config(config)
+enricher = EuroleagueEnricher(mongo, client)
+for season in sys.argv[1:] or config.get('Euroleague', {}).get('Seasons', []):
+    print(season, enricher.enrich(season))
+client.close()
+mongo.close()
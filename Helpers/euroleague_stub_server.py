@@ -0,0 +1,57 @@
+'''
+Serves recorded Euroleague API responses on localhost, so enrichment can run without reaching the official APIs.
+Run from the project root: python -m Helpers.euroleague_stub_server [--directory euroleague_cache] [--port 8099]
+
+Responses are read from the layout of the enrichment response cache, a cache filled by one real run can be served as is.
+Point Euroleague.LiveBaseUrl to http://localhost:8099/api and Euroleague.ApiBaseUrl to http://localhost:8099/v2.
+'''
+import argparse
+import os
+import re
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from euroleague import cache_path, SCHEDULE_ENDPOINT
+
+SCHEDULE_PATH = re.compile(r'^/v2/competitions/[^/]+/seasons/([^/]+)/games$')
+LIVE_PATH = re.compile(r'^/api/(\w+)$')
+
+class StubHandler(BaseHTTPRequestHandler):
+    directory = 'euroleague_cache'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        schedule, live = SCHEDULE_PATH.match(url.path), LIVE_PATH.match(url.path)
+        if schedule != None:
+            path = cache_path(self.directory, SCHEDULE_ENDPOINT, schedule.group(1))
+        elif live != None and 'gamecode' in query and 'seasoncode' in query:
+            path = cache_path(self.directory, live.group(1), query['seasoncode'][0], int(query['gamecode'][0]))
+        else:
+            path = None
+
+        if path == None or not os.path.exists(path):
+            self.send_error(404)
+            return
+
+        with open(path, 'rb') as response_file:
+            body = response_file.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Serve recorded Euroleague API responses')
+    parser.add_argument('--directory', default = 'euroleague_cache', help = 'Directory with recorded responses')
+    parser.add_argument('--port', type = int, default = 8099)
+    args = parser.parse_args()
+
+    StubHandler.directory = args.directory
+    server = ThreadingHTTPServer(('localhost', args.port), StubHandler)
+    print('Serving {} on http://localhost:{}'.format(args.directory, args.port))
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import json
+import sys
+
+from mongo import Mongo
+from exporter import OddsExporter
+
+def get_config():
+    with open('config.json', 'r') as config_file:
+        config = json.load(config_file)
+        return config
+
+
+# python -m Helpers.export_odds [--full] exports games changed since the previous export, or all games with --full
+config = get_config()
+mongo = Mongo(config)
+export_config = config.get('Export', {})
+exporter = OddsExporter(mongo, export_config.get('Directory', 'export'), export_config.get('Format', 'parquet'), export_config.get('BatchSize', 10000))
+print(exporter.export(incremental = '--full' not in sys.argv))
+mongo.close()
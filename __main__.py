@@ -1,47 +1,307 @@
+import argparse
 import logging
 import time
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from models import Sport, ScrapeType
-from domain_mapper import DomainMapper, to_sport_name
-from scraper import Scraper
-from mongo import Mongo
+# Only light modules are imported here. Selenium, the parsers, pymongo, numpy and pyarrow are imported by the
+# commands that use them, so e.g. an export never loads the browser stack
 
-def configure_logger(): 
-    filename = 'sport_data' + str(datetime.now().year) + '0' + str(datetime.now().month) if datetime.now().month < 10 else datetime.now().month
+def configure_logger():
+    filename = datetime.now().strftime('sport_data%Y%m')
     extension = '.log'
 
     # Configure the logging module
     logging.basicConfig(
-        filename='C:\\Projects\\Tasks\\Logs\\' + filename + extension, 
-        level=logging.INFO, 
+        filename='C:\\Projects\\Tasks\\Logs\\' + filename + extension,
+        level=logging.INFO,
         format='%(asctime)s  [%(levelname)s] %(message)s [BookOddsScrape]')
     logging.Formatter.converter = time.gmtime
     logging.getLogger().addHandler(logging.StreamHandler())
 
-def get_config():
-    with open('config.json', 'r') as config_file:
+def get_config(path: str = 'config.json'):
+    with open(path, 'r') as config_file:
         config = json.load(config_file)
         return config
 
+class Context(object):
+    """
+    Connections shared by all jobs of a run. Mongo, the domain mapper and the browser are opened when a job first needs them
+    and closed once all jobs are done. The browser is started with the top level config, job settings do not change it.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.mongo = None
+        self.mapper = None
+        self.scraper = None
+
+    def get_mongo(self):
+        if self.mongo == None:
+            from mongo import Mongo
+            self.mongo = Mongo(self.config)
+        return self.mongo
+
+    def get_mapper(self):
+        if self.mapper == None:
+            from domain_mapper import DomainMapper
+            self.mapper = DomainMapper(self.get_mongo().get_teams(), self.config.get('FuzzyTeamMatchCutoff'))
+        return self.mapper
+
+    def get_scraper(self, job_config):
+        if self.scraper == None:
+            self.scraper = create_scraper(self.config)
+
+        # Per job scraper settings are plain attributes of the shared scraper
+        self.scraper.listing_only = job_config.get('ListingOnly', False)
+        self.scraper.checkpoint = None
+        self.scraper.known_links = set()
+        return self.scraper
+
+    def close(self):
+        if self.scraper != None:
+            self.scraper.close_browser()
+        if self.mongo != None:
+            self.mongo.close()
+
+def create_scraper(config):
+    from scraper import Scraper
+    from browser import BrowserProfile
+    from fetch_policy import FetchPolicy
+    from page_cache import PageCache
+
+    cache_config = config.get('PageCache', {})
+    return Scraper(workers = config.get('Workers', 1), listing_only = config.get('ListingOnly', False), profile = BrowserProfile.from_config(config),
+                   extraction_mode = config.get('ExtractionMode', 'dom'), fetch_policy = FetchPolicy.from_config(config),
+                   page_cache = PageCache.from_config(config), replay = cache_config.get('Enabled', False) and cache_config.get('Replay', False))
+
+def sport_tournaments(config) -> list[dict[str, str]]:
+    from models import Sport
+    from domain_mapper import to_sport_name
+    return [ { 'Sport': to_sport_name(Sport(t['Sport'])), 'Country': t['Country'], 'Tournament': t['Tournament'] } for t in config['Tournaments'] ]
+
+def scrape_upcoming(context: Context, config):
+    from analytics import log_opportunities
+
+    # One browser session serves the upcoming games of all configured tournaments
+    scraper, mongo, mapper = context.get_scraper(config), context.get_mongo(), context.get_mapper()
+    for tournament in sport_tournaments(config):
+        games = list(scraper.scrape_oddsportal_upcoming(sport = tournament['Sport'], country = tournament['Country'], tournament = tournament['Tournament']))
+        log_opportunities(games, config.get('ValueMinEdge', 0.03))
+
+        game_dicts = mapper.map_to_domain(games)
+        mongo.insert_many(game_dicts)
+
+def scrape_historical(context: Context, config):
+    from models import Sport
+    from domain_mapper import to_sport_name
+    from checkpoint import Checkpoint
+
+    # Games stream from the scraper through the mapper into batched writes, the checkpoint is saved after each written batch
+    # so a restarted backfill continues from the first page that was not fully stored
+    # A replay re-parses every cached page, so stored games are written again and the checkpoint is not used
+    scraper, mongo, mapper = context.get_scraper(config), context.get_mongo(), context.get_mapper()
+    sport = to_sport_name(Sport(config['Sport']))
+    on_batch = None
+    if not scraper.replay:
+        scraper.known_links = mongo.get_game_links(sport, config['Tournament'], detailed_only = not scraper.listing_only)
+        scraper.checkpoint = Checkpoint(config.get('CheckpointFile', 'crawl_checkpoint.json'))
+        on_batch = scraper.checkpoint.save
+
+    games = scraper.scrape_oddsportal_historical(sport = sport, country = config['Country'], tournament = config['Tournament'], start_season = config['StartSeason'],
+                                                 nseasons = config['NumberSeasons'], current_season = config.get('CurrentSeason', 'no'))
+    mongo.insert_many(mapper.map_to_domain(games), on_batch = on_batch)
+
+def scrape_details(context: Context, config):
+    from models import Sport, ScrapeType, LISTING_BOOK_NAME
+    from domain_mapper import to_sport_name, to_game
+
+    # Second pass of a listing only backfill, games stored with listing odds only get the odds of all bookmakers from their game pages
+    scraper, mongo, mapper = context.get_scraper(config), context.get_mongo(), context.get_mapper()
+    # Earlier versions stored listing games whose price could not be read without odds
+    filter = { 'sport': to_sport_name(Sport(config['Sport'])), 'tournament': config['Tournament'], 'link': {'$ne': None},
+               '$or': [ {'odds.name': LISTING_BOOK_NAME}, {'odds': []} ] }
+    seasons = {}
+    for document in mongo.find_games(filter, None):
+        seasons.setdefault(document.get('season'), []).append(to_game(document))
+
+    for season, games in seasons.items():
+        logging.info('Scraping details of {} listing games of season {}'.format(len(games), season))
+        mongo.insert_many(mapper.map_to_domain(scraper.scrape_game_details_type_A(games, ScrapeType.Historical)))
+
+def map_games(context: Context, config):
+    from models import Sport
+    from domain_mapper import to_sport_name
+
+    # Re-maps stored games after the teams collection changed, only season and team codes are rewritten
+    mongo, mapper = context.get_mongo(), context.get_mapper()
+    batch_size = config.get('BatchSize', 500)
+    filter = { 'sport': to_sport_name(Sport(config['Sport'])), 'tournament': config['Tournament'] }
+    batch, updated = [], 0
+    for document in mongo.find_games(filter, None, batch_size = batch_size):
+        batch.append(document)
+        if len(batch) >= batch_size:
+            updated += remap_batch(mongo, mapper, batch)
+            batch = []
+    updated += remap_batch(mongo, mapper, batch)
+    logging.info('Re-mapped {} games of {}'.format(updated, filter))
+
+def remap_batch(mongo, mapper, documents: list[dict[str, any]]) -> int:
+    from domain_mapper import to_game
+
+    updates = {}
+    for document, game_dict in zip(documents, mapper.map_to_domain([ to_game(document) for document in documents ])):
+        changes = { field: game_dict[field] for field in [ 'season', 'home_code', 'away_code' ] if field in game_dict and game_dict[field] != document.get(field) }
+        if len(changes) > 0:
+            updates[document['_id']] = changes
+
+    mongo.update_fields(updates)
+    return len(updates)
+
+def export(context: Context, config):
+    from exporter import OddsExporter
+
+    export_config = config.get('Export', {})
+    exporter = OddsExporter(context.get_mongo(), export_config.get('Directory', 'export'), export_config.get('Format', 'parquet'), export_config.get('BatchSize', 10000))
+    logging.info('Exported {}'.format(exporter.export(incremental = not config.get('FullExport', False))))
+
+def migrate(context: Context, config):
+    from migrations import MigrationRunner, MIGRATIONS
+
+    runner = MigrationRunner(context.get_mongo(), config.get('MigrationStateFile', 'migrations_state.json'), config.get('BatchSize', 500), dry_run = config.get('DryRun', False))
+    logging.info('Migration {} {}'.format(config['Migration'], runner.run(MIGRATIONS[config['Migration']])))
+
+def work_queue(context: Context, config):
+    from jobs import JobPlanner, JobWorker, create_queue
+
+    # Every process plans the same backfill, jobs that are already queued are not added again, so the same
+    # command can be started on more machines to share the crawl
+    queue_config = config.get('Queue', {})
+    queue = create_queue(config, context.get_mongo())
+    added = queue.enqueue(JobPlanner().plan(sport_tournaments(config), config['StartSeason'], config['NumberSeasons'], config.get('CurrentSeason', 'no')))
+    logging.info('Queued {} new season jobs'.format(added))
+
+    JobWorker(queue, context.get_scraper(config), context.get_mongo(), context.get_mapper(), lease_seconds = queue_config.get('LeaseSeconds', 600),
+              heartbeat_seconds = queue_config.get('HeartbeatSeconds', 60), idle_seconds = queue_config.get('IdleSeconds', 30)).run()
+
+def schedule(context: Context, config):
+    from scheduler import PollingScheduler
+    from browser import BrowserProfile
+    from fetch_policy import FetchPolicy
+
+    # Polls upcoming games of all configured tournaments until interrupted, the scheduler drives its own browser pool
+    scheduler_config = config.get('Scheduler', {})
+    PollingScheduler(context.get_mongo(), context.get_mapper(), sport_tournaments(config), value_min_edge = config.get('ValueMinEdge', 0.03),
+                     browser_budget = scheduler_config.get('BrowserBudget', 2),
+                     listing_refresh = timedelta(minutes = scheduler_config.get('ListingRefreshMinutes', 30)),
+                     min_interval = timedelta(minutes = scheduler_config.get('MinPollMinutes', 5)),
+                     max_interval = timedelta(minutes = scheduler_config.get('MaxPollMinutes', 360)),
+                     metrics_directory = config.get('Metrics', {}).get('Directory', 'metrics'), profile = BrowserProfile.from_config(config),
+                     fetch_policy = FetchPolicy.from_config(config)).run()
+
+COMMANDS = {
+    'scrape-upcoming': scrape_upcoming,
+    'scrape-historical': scrape_historical,
+    'scrape-details': scrape_details,
+    'map': map_games,
+    'export': export,
+    'migrate': migrate,
+    'work-queue': work_queue,
+    'schedule': schedule,
+}
+
+def default_job(config) -> dict[str, any]:
+    ''' The single job of configs without a Jobs list, picked from the Scheduler, Queue and ScrapeType settings '''
+    if config.get('Scheduler', {}).get('Enabled', False):
+        return { 'Command': 'schedule' }
+    if config.get('Queue', {}).get('Enabled', False):
+        return { 'Command': 'work-queue' }
+    # See models.ScrapeType, 1 is a historical scrape and 2 scrapes the results of the current season only
+    if config.get('ScrapeType') == 1:
+        return { 'Command': 'scrape-historical' }
+    if config.get('ScrapeType') == 2:
+        return { 'Command': 'scrape-historical', 'NumberSeasons': 0, 'CurrentSeason': 'yes' }
+    return { 'Command': 'scrape-upcoming' }
+
+def run_jobs(context: Context, jobs: list[dict[str, any]]):
+    # Settings of a job override the top level config for that job only
+    for job in jobs:
+        if job['Command'] not in COMMANDS:
+            raise ValueError('Unknown job command {}, use one of {}'.format(job['Command'], list(COMMANDS.keys())))
+
+    for job in jobs:
+        logging.info('Running job {}'.format(job))
+        COMMANDS[job['Command']](context, dict(context.config, **job))
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog = 'python .', description = 'Scrape, map and export bookmaker odds. Without a command the Jobs list of the config is run.')
+    parser.add_argument('--config', default = 'config.json', help = 'Config file')
+    commands = parser.add_subparsers(dest = 'command')
+
+    upcoming = commands.add_parser('scrape-upcoming', help = 'Scrape upcoming games of the configured tournaments')
+    upcoming.add_argument('--tournament', action = 'append', metavar = 'SPORT/COUNTRY/TOURNAMENT', help = 'Tournament instead of the configured ones, can be repeated')
+
+    historical = commands.add_parser('scrape-historical', help = 'Backfill seasons of a tournament')
+    historical.add_argument('--tournament', metavar = 'SPORT/COUNTRY/TOURNAMENT')
+    historical.add_argument('--start-season', dest = 'StartSeason')
+    historical.add_argument('--seasons', dest = 'NumberSeasons', type = int)
+    historical.add_argument('--current-season', dest = 'CurrentSeason', action = 'store_const', const = 'yes')
+    historical.add_argument('--listing-only', dest = 'ListingOnly', action = 'store_const', const = True)
+
+    details = commands.add_parser('scrape-details', help = 'Scrape game pages of games stored by a listing only backfill')
+    details.add_argument('--tournament', metavar = 'SPORT/COUNTRY/TOURNAMENT')
+
+    map_parser = commands.add_parser('map', help = 'Re-map season and team codes of stored games')
+    map_parser.add_argument('--tournament', metavar = 'SPORT/COUNTRY/TOURNAMENT')
+
+    export_parser = commands.add_parser('export', help = 'Export stored odds')
+    export_parser.add_argument('--full', dest = 'FullExport', action = 'store_const', const = True, help = 'Export all games instead of changes since the last export')
+
+    migrate_parser = commands.add_parser('migrate', help = 'Run a data migration')
+    migrate_parser.add_argument('Migration', metavar = 'migration', help = 'Migration name, e.g. odds_to_float')
+    migrate_parser.add_argument('--dry-run', dest = 'DryRun', action = 'store_const', const = True)
+
+    commands.add_parser('work-queue', help = 'Plan the configured backfill into the job queue and work on it')
+    commands.add_parser('schedule', help = 'Poll upcoming games until interrupted')
+    return parser.parse_args()
+
+def to_tournament(value: str) -> dict[str, any]:
+    from domain_mapper import to_sport
+
+    sport, country, tournament = value.split('/')
+    return { 'Sport': to_sport(sport).value, 'Country': country, 'Tournament': tournament }
+
+def command_job(args) -> dict[str, any]:
+    ''' Job of a command line, options given on the command line override the config '''
+    job = { name: value for name, value in vars(args).items() if name[0].isupper() and value != None }
+    job['Command'] = args.command
+
+    tournament = getattr(args, 'tournament', None)
+    if isinstance(tournament, list):
+        job['Tournaments'] = [ to_tournament(value) for value in tournament ]
+    elif tournament != None:
+        job.update(to_tournament(tournament))
+    return job
+
 def main():
+    args = parse_args()
     configure_logger()
-    config = get_config()
+    config = get_config(args.config)
 
-    # games = Scraper().scrape_oddsportal_historical(sport = to_sport_name(Sport.Basketball), country = 'europe', tournament= 'euroleague', 
-    #                                                 start_season = '2010-2011', nseasons = 1, current_season = 'no', max_page = 10)
-    
-    games = Scraper().scrape_oddsportal_upcoming(sport = to_sport_name(Sport.Basketball), country = 'europe', tournament= 'euroleague')
-    
-    # games = Scraper().scrape_page_typeA(to_sport_name(Sport.Basketball), 'europe', 'euroleague', ScrapeType.Historical, '2009-2010', 1)
+    from metrics import run_metrics
+    metrics_config = config.get('Metrics', {})
+    run_metrics.tracing = metrics_config.get('Tracing', False)
+    if config.get('HtmlParser') != None:
+        from parser_backends import set_default_backend
+        set_default_backend(config['HtmlParser'])
 
-    mongo = Mongo(config)
-    teams = mongo.get_teams()
-    game_dicts = DomainMapper(teams).map_to_domain(games)
-    mongo.insert_many(game_dicts)
-    mongo.close()
+    jobs = [ command_job(args) ] if args.command != None else config.get('Jobs') or [ default_job(config) ]
+    context = Context(config)
+    try:
+        run_jobs(context, jobs)
+    finally:
+        run_metrics.export(metrics_config.get('Directory', 'metrics'))
+        context.close()
 
 if __name__ == "__main__":
     main()
-    
\ No newline at end of file
@@ -0,0 +1,155 @@
+import logging
+from typing import Iterable, List
+
+import numpy as np
+
+from models import Game, LISTING_BOOK_NAME
+
+logger = logging.getLogger(__name__)
+
+HOME, AWAY = 0, 1
+
+class OddsMatrix:
+    """
+    Two-way odds of many games as a dense games x bookmakers x outcomes (home, away) array, NaN where a bookmaker has no price
+    """
+
+    def __init__(self, games: list, bookmakers: List[str], odds: np.ndarray) -> None:
+        self.games = games
+        self.bookmakers = bookmakers
+        self.odds = odds
+
+class OddsAnalysis:
+    def __init__(self, implied: np.ndarray, margins: np.ndarray, no_vig: np.ndarray, consensus: np.ndarray,
+                 best_prices: np.ndarray, best_books: np.ndarray, arbitrage: np.ndarray, edges: np.ndarray) -> None:
+        self.implied = implied # games x books x outcomes
+        self.margins = margins # games x books
+        self.no_vig = no_vig # games x books x outcomes
+        self.consensus = consensus # games x outcomes
+        self.best_prices = best_prices # games x outcomes
+        self.best_books = best_books # games x outcomes, -1 where no bookmaker has a price
+        self.arbitrage = arbitrage # games, sum of best implied probabilities minus one, negative is an arbitrage
+        self.edges = edges # games x outcomes, expected return of the best price at consensus probability
+
+def from_games(games: Iterable[Game], include_listing: bool = False) -> OddsMatrix:
+    ''' Builds the odds matrix from Game objects, listing averages are left out unless include_listing '''
+    return from_rows(((game, odd.name, odd.home, odd.away) for game in games for odd in game.odds), include_listing)
+
+def from_documents(documents: Iterable[dict[str, any]], include_listing: bool = False) -> OddsMatrix:
+    ''' Builds the odds matrix from stored game documents, games are identified by their _id '''
+    return from_rows(((document['_id'], odd.get('name'), odd.get('home'), odd.get('away')) for document in documents for odd in document.get('odds') or []), include_listing)
+
+def load_from_mongo(mongo, filter: dict[str, any] = None, include_listing: bool = False) -> OddsMatrix:
+    ''' Builds the odds matrix from the odds collection, only the odds of each game are read '''
+    return from_documents(mongo.find_games(filter or {}, [ 'odds' ], batch_size = 10000), include_listing)
+
+def from_table(table, include_listing: bool = False) -> OddsMatrix:
+    ''' Builds the odds matrix from an exported table (see exporter.ODDS_SCHEMA) without a per row Python loop '''
+    import pyarrow.compute as pc
+
+    if not include_listing:
+        table = table.filter(pc.not_equal(table['bookmaker'], LISTING_BOOK_NAME))
+
+    games = pc.dictionary_encode(table['game_id']).combine_chunks()
+    books = pc.dictionary_encode(table['bookmaker']).combine_chunks()
+    odds = np.full((len(games.dictionary), len(books.dictionary), 2), np.nan)
+    game_index = games.indices.to_numpy(zero_copy_only = False)
+    book_index = books.indices.to_numpy(zero_copy_only = False)
+    # Same as to_prices, nulls and prices of 1 or less are missing
+    for outcome, column in [ (HOME, 'home_odds'), (AWAY, 'away_odds') ]:
+        prices = table[column].to_numpy().astype(float)
+        odds[game_index, book_index, outcome] = np.where(prices > 1, prices, np.nan)
+    return OddsMatrix(games.dictionary.to_pylist(), books.dictionary.to_pylist(), odds)
+
+def from_rows(rows: Iterable[tuple], include_listing: bool) -> OddsMatrix:
+    game_index, book_index, game_list = {}, {}, []
+    game_positions, book_positions, home_odds, away_odds = [], [], [], []
+
+    for game, book, home, away in rows:
+        if book == LISTING_BOOK_NAME and not include_listing:
+            continue
+
+        key = id(game) if isinstance(game, Game) else game
+        if key not in game_index:
+            game_index[key] = len(game_list)
+            game_list.append(game)
+
+        game_positions.append(game_index[key])
+        book_positions.append(book_index.setdefault(book, len(book_index)))
+        home_odds.append(home)
+        away_odds.append(away)
+
+    odds = np.full((len(game_list), len(book_index), 2), np.nan)
+    odds[game_positions, book_positions, HOME] = to_prices(home_odds)
+    odds[game_positions, book_positions, AWAY] = to_prices(away_odds)
+    return OddsMatrix(game_list, list(book_index.keys()), odds)
+
+def to_prices(values: list) -> np.ndarray:
+    # Legacy documents hold odds as strings with '-' for missing prices
+    prices = np.array([ value if isinstance(value, (int, float)) else np.nan for value in values ], dtype = float) if len(values) > 0 else np.empty(0)
+    return np.where(prices > 1, prices, np.nan)
+
+def analyze(matrix: OddsMatrix) -> OddsAnalysis:
+    ''' Computes implied and no-vig probabilities, margins, consensus, best prices, arbitrage and value for all games at once '''
+    odds = matrix.odds
+    games = odds.shape[0]
+
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        implied = 1 / odds
+        book_totals = implied.sum(axis = 2)
+        margins = book_totals - 1
+        no_vig = implied / book_totals[:, :, np.newaxis]
+
+        if odds.shape[1] == 0:
+            consensus = np.full((games, 2), np.nan)
+            best_prices = np.full((games, 2), np.nan)
+            best_books = np.full((games, 2), -1)
+        else:
+            # Average of the bookmakers' fair probabilities, books pricing only one side are left out
+            priced = ~np.isnan(no_vig)
+            consensus = np.where(priced, no_vig, 0).sum(axis = 1) / priced.sum(axis = 1)
+            consensus = consensus / consensus.sum(axis = 1, keepdims = True)
+
+            prices = np.where(np.isnan(odds), -np.inf, odds)
+            best_books = prices.argmax(axis = 1)
+            best_prices = prices.max(axis = 1)
+            missing = np.isneginf(best_prices)
+            best_books[missing] = -1
+            best_prices[missing] = np.nan
+
+        arbitrage = (1 / best_prices).sum(axis = 1) - 1
+        edges = best_prices * consensus - 1
+
+    return OddsAnalysis(implied, margins, no_vig, consensus, best_prices, best_books, arbitrage, edges)
+
+def find_opportunities(matrix: OddsMatrix, analysis: OddsAnalysis = None, min_edge: float = 0.03) -> List[dict[str, any]]:
+    ''' Games with an arbitrage across bookmakers or a best price at least min_edge above the consensus fair price '''
+    analysis = analysis or analyze(matrix)
+    opportunities = []
+
+    with np.errstate(invalid = 'ignore'):
+        arbitrage_games = np.flatnonzero(analysis.arbitrage < 0)
+        value_games, value_outcomes = np.nonzero(analysis.edges >= min_edge)
+
+    for game in arbitrage_games:
+        opportunities.append({ 'type': 'arbitrage', 'game': matrix.games[game], 'profit': float(-analysis.arbitrage[game] / (1 + analysis.arbitrage[game])),
+                               'home_book': matrix.bookmakers[analysis.best_books[game, HOME]], 'home_price': float(analysis.best_prices[game, HOME]),
+                               'away_book': matrix.bookmakers[analysis.best_books[game, AWAY]], 'away_price': float(analysis.best_prices[game, AWAY]) })
+
+    for game, outcome in zip(value_games, value_outcomes):
+        opportunities.append({ 'type': 'value', 'game': matrix.games[game], 'outcome': 'home' if outcome == HOME else 'away',
+                               'book': matrix.bookmakers[analysis.best_books[game, outcome]], 'price': float(analysis.best_prices[game, outcome]),
+                               'fair_price': float(1 / analysis.consensus[game, outcome]), 'edge': float(analysis.edges[game, outcome]) })
+
+    return opportunities
+
+def log_opportunities(games: List[Game], min_edge: float = 0.03) -> List[dict[str, any]]:
+    ''' Flags arbitrage and value prices among freshly scraped games '''
+    matrix = from_games(games)
+    opportunities = find_opportunities(matrix, min_edge = min_edge)
+    for opportunity in opportunities:
+        game = opportunity['game']
+        details = { key: value for key, value in opportunity.items() if key not in [ 'type', 'game' ] }
+        logger.info("Found {} for {}:{} at {} - {}".format(opportunity['type'], game.home, game.away, game.date, details))
+
+    return opportunities
@@ -0,0 +1,166 @@
+import json
+import logging
+import os
+import threading
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import WebDriverException
+
+logger = logging.getLogger(__name__)
+
+# URL patterns blocked per resource type, the query string is matched by the trailing wildcard
+RESOURCE_PATTERNS = {
+    'image': [ '*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.webp*', '*.svg*', '*.ico*', '*.avif*' ],
+    'font': [ '*.woff*', '*.woff2*', '*.ttf*', '*.otf*', '*.eot*' ],
+    'stylesheet': [ '*.css*' ],
+    'media': [ '*.mp4*', '*.webm*', '*.mp3*', '*.m3u8*' ],
+}
+
+# Advertising and tracking hosts, none of them are needed to render odds
+AD_URL_PATTERNS = [ '*doubleclick.net*', '*googlesyndication.com*', '*googleadservices.com*', '*google-analytics.com*', '*googletagmanager.com*',
+                    '*adservice.google.*', '*facebook.net*', '*hotjar.com*', '*criteo.*', '*taboola.com*', '*outbrain.com*', '*scorecardresearch.com*' ]
+
+class BrowserProfile(object):
+    """
+    How scraper browsers are started: headless or not, which resource types and hosts are blocked and where
+    the Chrome profile with its HTTP cache is kept between runs.
+
+    Every browser gets its own profile directory under profile_dir as Chrome locks a profile while it is open. Processes
+    that run side by side, e.g. two cron runs or a scheduler next to a backfill, each claim their own slot directory first.
+    Network traffic is read from the Chrome performance log, so bytes transferred and requests blocked can be reported per page.
+    """
+
+    def __init__(self, headless: bool = True, block_resources: list[str] = None, block_ads: bool = True, blocked_url_patterns: list[str] = None,
+                 profile_dir: str = None, measure_traffic: bool = True, page_load_strategy: str = 'normal'):
+        self.headless = headless
+        self.block_resources = block_resources if block_resources != None else [ 'image', 'font', 'media' ]
+        self.block_ads = block_ads
+        self.blocked_url_patterns = blocked_url_patterns or []
+        self.profile_dir = profile_dir
+        self.measure_traffic = measure_traffic
+        # 'eager' returns from navigation once the DOM is parsed, which is all feed extraction needs
+        self.page_load_strategy = page_load_strategy
+
+        unknown = [ resource for resource in self.block_resources if resource not in RESOURCE_PATTERNS ]
+        if len(unknown) > 0:
+            raise ValueError('Unknown resource types {}, use some of {}'.format(unknown, list(RESOURCE_PATTERNS.keys())))
+
+    @staticmethod
+    def from_config(config) -> 'BrowserProfile':
+        browser_config = config.get('Browser', {})
+        return BrowserProfile(headless = browser_config.get('Headless', True), block_resources = browser_config.get('BlockResources'),
+                              block_ads = browser_config.get('BlockAds', True), blocked_url_patterns = browser_config.get('BlockedUrlPatterns'),
+                              profile_dir = browser_config.get('ProfileDirectory'), measure_traffic = browser_config.get('MeasureTraffic', True),
+                              page_load_strategy = browser_config.get('PageLoadStrategy', 'normal'))
+
+    def url_patterns(self) -> list[str]:
+        patterns = [ pattern for resource in self.block_resources for pattern in RESOURCE_PATTERNS[resource] ]
+        if self.block_ads:
+            patterns += AD_URL_PATTERNS
+        return patterns + self.blocked_url_patterns
+
+    def options(self, name: str) -> webdriver.ChromeOptions:
+        options = webdriver.ChromeOptions()
+        options.add_argument("--log-level=3")
+        options.page_load_strategy = self.page_load_strategy
+        if self.headless:
+            options.add_argument('--headless=new')
+            options.add_argument('--window-size=1920,1080')
+
+        if 'image' in self.block_resources:
+            # Images are also turned off in the renderer, so lazily loaded images are not even requested
+            options.add_experimental_option('prefs', { 'profile.managed_default_content_settings.images': 2 })
+
+        if self.profile_dir != None:
+            options.add_argument('--user-data-dir={}'.format(os.path.abspath(os.path.join(claim_profile_slot(self.profile_dir), name))))
+
+        if self.measure_traffic:
+            options.set_capability('goog:loggingPrefs', { 'performance': 'ALL' })
+
+        return options
+
+    def create_driver(self, name: str = 'main') -> webdriver.Chrome:
+        ''' Starts a browser with this profile, name selects its profile directory '''
+        driver = webdriver.Chrome(service = Service(), options = self.options(name))
+        patterns = self.url_patterns()
+        if len(patterns) > 0:
+            try:
+                driver.execute_cdp_cmd('Network.enable', {})
+                driver.execute_cdp_cmd('Network.setBlockedURLs', { 'urls': patterns })
+            except WebDriverException as e:
+                logger.warning('Resource blocking could not be enabled - {}'.format(e))
+
+        logger.debug('Started {} browser {} blocking {} URL patterns'.format('headless' if self.headless else 'windowed', name, len(patterns)))
+        return driver
+
+# Slot directory and its held lock file per profile directory, claimed once per process
+process_slots = {}
+process_slots_lock = threading.Lock()
+
+def claim_profile_slot(profile_dir: str) -> str:
+    '''
+    Directory of this process under profile_dir. The slot is held by a lock on its lock file, which the OS releases when the
+    process exits, so the next process reuses the slot and its HTTP cache while processes running at the same time get different ones.
+    '''
+    with process_slots_lock:
+        if profile_dir not in process_slots:
+            os.makedirs(profile_dir, exist_ok = True)
+            slot = 0
+            while True:
+                lock_file = open(os.path.join(profile_dir, 'slot-{}.lock'.format(slot)), 'a')
+                try:
+                    lock_exclusive(lock_file)
+                    break
+                except OSError:
+                    lock_file.close()
+                    slot += 1
+
+            process_slots[profile_dir] = (os.path.join(profile_dir, 'slot-{}'.format(slot)), lock_file)
+            logger.debug('Claimed browser profile slot {}'.format(process_slots[profile_dir][0]))
+
+        return process_slots[profile_dir][0]
+
+def lock_exclusive(lock_file):
+    ''' Locks an open file without waiting, raises OSError when another process holds the lock '''
+    if os.name == 'nt':
+        import msvcrt
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+class PageTraffic:
+    def __init__(self, requests: int, bytes: int, blocked: int, failed: int) -> None:
+        self.requests = requests
+        self.bytes = bytes
+        self.blocked = blocked
+        self.failed = failed
+
+    def __str__(self):
+        return f"{self.requests} requests, {self.bytes / 1024:.0f} KB, {self.blocked} blocked"
+
+def read_network_events(driver) -> list[dict[str, any]]:
+    ''' Drains the performance log of the driver and returns its Network.* DevTools events as {method, params} '''
+    events = []
+    for entry in driver.get_log('performance'):
+        message = json.loads(entry['message'])['message']
+        if message.get('method', '').startswith('Network.'):
+            events.append(message)
+    return events
+
+def summarize_traffic(events: list[dict[str, any]]) -> PageTraffic:
+    requests, transferred, blocked, failed = 0, 0, 0, 0
+    for event in events:
+        method, params = event['method'], event.get('params', {})
+        if method == 'Network.requestWillBeSent':
+            requests += 1
+        elif method == 'Network.loadingFinished':
+            transferred += int(params.get('encodedDataLength', 0))
+        elif method == 'Network.loadingFailed':
+            if params.get('blockedReason') != None:
+                blocked += 1
+            else:
+                failed += 1
+
+    return PageTraffic(requests, transferred, blocked, failed)
@@ -0,0 +1,46 @@
+import json
+import logging
+import os
+
+from metrics import write_atomic
+
+logger = logging.getLogger(__name__)
+
+class Checkpoint(object):
+    """
+    Keeps track of completed (season, page) units of a historical crawl in a json file,
+    so an interrupted backfill can continue where it stopped.
+
+    Units are marked done in memory and only written by save, which is called once their games are persisted.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.state = {}
+
+        if os.path.exists(path):
+            with open(path, 'r') as checkpoint_file:
+                self.state = json.load(checkpoint_file)
+            logger.info('Loaded crawl checkpoint from {}'.format(path))
+
+    def is_done(self, scope: str, season: str, page: int) -> bool:
+        return page in self.season(scope, season).get('pages', [])
+
+    def page_count(self, scope: str, season: str) -> int:
+        return self.season(scope, season).get('page_count')
+
+    def mark_done(self, scope: str, season: str, page: int, page_count: int = None):
+        season_state = self.state.setdefault(scope, {}).setdefault(season, {})
+        pages = season_state.setdefault('pages', [])
+        if page not in pages:
+            pages.append(page)
+
+        # Only a larger count is kept, a page parsed without its pagination must not cut the season short
+        if page_count != None:
+            season_state['page_count'] = max(page_count, season_state.get('page_count') or 0)
+
+    def season(self, scope: str, season: str) -> dict[str, any]:
+        return self.state.get(scope, {}).get(season, {})
+
+    def save(self):
+        write_atomic(self.path, json.dumps(self.state, indent = 2))
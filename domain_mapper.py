@@ -1,8 +1,10 @@
-from typing import List
+from typing import List, Iterable, Iterator
 from datetime import datetime
+from collections import Counter
+from difflib import get_close_matches
 import logging
 
-from models import Game, Sport, Team, BookOdds
+from models import Game, Sport, Team, BookOdds, OddsBlock
 
 EUROLEAGUE_TOURNAMENT = 'euroleague'
 
@@ -64,8 +66,13 @@ def to_sport_name(sport: Sport) -> str:
           
 class DomainMapper(object):
 
-    def __init__(self, teams: List[Team]):
+    def __init__(self, teams: List[Team], fuzzy_cutoff: float = None):
         self.teams = teams
+        self.team_codes = build_team_index(teams)
+        # Names that are not in the index go through difflib when fuzzy_cutoff is set, results are memoized per name
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.fuzzy_matches = {}
+        self.unmapped = Counter()
 
     def to_season(self, sport: Sport, tournament: str, season: str) -> str:
         match (sport, tournament, season):
@@ -76,21 +83,21 @@ class DomainMapper(object):
             case _:
                 return season
 
-    def map_to_domain(self, games: List[Game]) -> List[dict[str, any]]:
-        list_game_dicts = []
+    def map_to_domain(self, games: Iterable[Game]) -> Iterator[dict[str, any]]:
+        ''' Maps games lazily, so scraped games can stream through to the writer '''
         for game in games:
             game_dict = self.map_game(game)
 
             if game.sport == Sport.Basketball and game.tournament == EUROLEAGUE_TOURNAMENT:
                 game_dict = self.map_euroleague_game(game, game_dict)
 
-            list_game_dicts.append(game_dict)
-        
-        return list_game_dicts
+            yield game_dict
+
+        self.report_unmapped()
 
     def map_game(self, game: Game) -> dict[str, any]:
         game_dict = { 'sport': to_sport_name(game.sport), 'tournament': game.tournament, 'home': game.home, 'away': game.away, 'game_date': game.date, 'season': game.season,
-                'odds': [{'name': odd.name, 'home': odd.home, 'away': odd.away} for odd in game.odds], 'inserted_at': datetime.utcnow() }
+                'odds': [{'name': odd.name, 'home': odd.home, 'away': odd.away} for odd in game.odds], 'link': game.link, 'inserted_at': datetime.utcnow() }
 
         if game.home_score != None:
             game_dict['home_score'] = game.home_score
@@ -102,35 +109,70 @@ class DomainMapper(object):
                 
     def map_euroleague_game(self, game: Game, game_dict: dict[str, any]) -> dict[str, any]:
         game_dict['season'] = self.to_season(game.sport, game.tournament, game.season)
-        game_dict['link'] = game.link
 
-        for team in self.teams:
-            if team.alias == None or team.name == None:
-                continue
+        if game.home == None or game.away == None:
+            logger.warning("Skipping game with no home or away value {} from link {}".format(game, game.link))
+            return game_dict
 
-            if game.home == None or game.away == None:
-                logger.warning("Skipping game with no home or away value {} from link {}".format(game, game.link))
+        home_code = self.to_team_code(game.home)
+        away_code = self.to_team_code(game.away)
 
-            home = game.home.lower()
-            away = game.away.lower()
+        if home_code != None:
+            game_dict['home_code'] = home_code
 
-            if team.alias.lower() == home or team.name.lower() == home or (team.external_name != None and team.external_name.lower() == home) or (team.external_name != None and team.external_name.lower() + " " + team.alias.lower() == home):
-                game_dict['home_code'] = team.code
-            elif team.alias.lower() == away or team.name.lower() == away or (team.external_name != None and team.external_name.lower() == away) or (team.external_name != None and team.external_name.lower() + " " + team.alias.lower() == away):
-                game_dict['away_code'] = team.code
+        if away_code != None:
+            game_dict['away_code'] = away_code
 
-        if game_dict.get('home_code') is None:
-            print("Could not map home team " + game.home)
-
-        if game_dict.get('away_code') == None:
-            print("Could not map away team " + game.away)
         return game_dict
-    
+
+    def to_team_code(self, team_name: str) -> str:
+        name = normalize_team_name(team_name)
+        code = self.team_codes.get(name)
+
+        if code == None and self.fuzzy_cutoff != None:
+            if name not in self.fuzzy_matches:
+                matches = get_close_matches(name, self.team_codes.keys(), n = 1, cutoff = self.fuzzy_cutoff)
+                self.fuzzy_matches[name] = self.team_codes[matches[0]] if len(matches) > 0 else None
+                if len(matches) > 0:
+                    logger.info("Team {} fuzzy matched to {}".format(team_name, matches[0]))
+            code = self.fuzzy_matches[name]
+
+        if code == None:
+            self.unmapped[team_name] += 1
+
+        return code
+
+    def report_unmapped(self):
+        # Unmapped teams are reported once per mapped stream instead of for every game
+        if len(self.unmapped) > 0:
+            logger.warning("Could not map teams (games count) {}".format(dict(self.unmapped.most_common())))
+            self.unmapped.clear()
+
+def build_team_index(teams: List[Team]) -> dict[str, any]:
+    # Normalized name, alias, external name and external name with alias of every team to its code
+    index = {}
+    for team in teams:
+        if team.alias == None or team.name == None:
+            continue
+
+        names = [ team.alias, team.name ]
+        if team.external_name != None:
+            names += [ team.external_name, team.external_name + " " + team.alias ]
+
+        for name in names:
+            index[normalize_team_name(name)] = team.code
+
+    return index
+
+def normalize_team_name(name: str) -> str:
+    return ' '.join(name.lower().split())
+
 def to_team(team: dict[str, any]) -> Team:
     return Team(team['name'], team['alias'], team['_id'], team.get('externalName', None))
 
 def to_game(game: dict[str, any]) -> Game:
-    odds = [ to_odd(odd_dict) for odd_dict in game.get('odds') ]
+    # Odds are packed into an array block, games read in bulk would otherwise hold a BookOdds object per price pair
+    odds = OddsBlock.from_prices([ (odd_dict.get('name'), odd_dict.get('home'), odd_dict.get('away')) for odd_dict in game.get('odds') or [] ])
     game = Game(to_sport(game.get('sport', '')), game.get('tournament'), game.get('home'), game.get('away'), 
                 game.get('game_date'), game.get('season'), game.get('home_score', None), game.get('away_score', None), odds, game.get('link', None), game.get('_id'))
     return game
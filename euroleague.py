@@ -0,0 +1,213 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+import urllib3
+from urllib3.util import Retry, Timeout
+
+from domain_mapper import EUROLEAGUE_TOURNAMENT
+from metrics import run_metrics, write_atomic
+
+logger = logging.getLogger(__name__)
+
+LIVE_BASE_URL = 'https://live.euroleague.net/api'
+API_BASE_URL = 'https://api-live.euroleague.net/v2'
+COMPETITION = 'E'
+
+# Live endpoints per game, they answer with Live: false once a game is final
+GAME_ENDPOINTS = [ 'Boxscore', 'PlaybyPlay' ]
+SCHEDULE_ENDPOINT = 'games'
+
+# Oddsportal start times and official start times differ by time zone, games of the same pairing are weeks apart
+MATCH_TOLERANCE = timedelta(hours = 36)
+
+class ScheduledGame:
+    def __init__(self, game_code: int, home_code: str, away_code: str, date: datetime, played: bool) -> None:
+        self.game_code = game_code
+        self.home_code = home_code
+        self.away_code = away_code
+        self.date = date
+        self.played = played
+
+    def __str__(self):
+        return f"{self.game_code} {self.home_code}-{self.away_code} {self.date}"
+
+def to_scheduled_game(game: dict[str, any]) -> ScheduledGame:
+    date = game.get('date') or game.get('utcDate')
+    date = datetime.fromisoformat(date.rstrip('Z')) if date != None else None
+    # Games without a played flag are taken as played once they started
+    played = game.get('played', date != None and date < datetime.utcnow())
+    return ScheduledGame(int(game['gameCode']), game['local']['club']['code'], game['road']['club']['code'], date, played)
+
+def cache_path(directory: str, endpoint: str, season: str, game_code: int = None) -> str:
+    ''' File of a cached response, the stub server reads recorded responses from the same layout '''
+    return os.path.join(directory, endpoint, season, '{}.json'.format(game_code if game_code != None else 'all'))
+
+class ResponseCache(object):
+    """
+    Euroleague API responses as json files. Responses of final games never change and never expire,
+    the schedule is refreshed once it is older than schedule_ttl.
+    """
+
+    def __init__(self, directory: str, schedule_ttl: timedelta = timedelta(hours = 12)):
+        self.directory = directory
+        self.schedule_ttl = schedule_ttl
+
+    def get(self, endpoint: str, season: str, game_code: int = None) -> any:
+        path = cache_path(self.directory, endpoint, season, game_code)
+        try:
+            if game_code == None and time.time() - os.path.getmtime(path) > self.schedule_ttl.total_seconds():
+                return None
+            with open(path, 'r') as cache_file:
+                return json.load(cache_file)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def put(self, endpoint: str, season: str, game_code: int, response: any):
+        path = cache_path(self.directory, endpoint, season, game_code)
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        write_atomic(path, json.dumps(response))
+
+class EuroleagueClient(object):
+    """
+    Client of the official Euroleague APIs over one pooled urllib3 connection manager.
+
+    At most parallelism requests run at once, connections to each host are kept alive and reused between them.
+    Failed requests and 429/5xx answers are retried with backoff by urllib3.
+    """
+
+    def __init__(self, cache: ResponseCache, live_base_url: str = LIVE_BASE_URL, api_base_url: str = API_BASE_URL, competition: str = COMPETITION,
+                 parallelism: int = 8, timeout: float = 20, http: urllib3.PoolManager = None):
+        self.cache = cache
+        self.live_base_url = live_base_url.rstrip('/')
+        self.api_base_url = api_base_url.rstrip('/')
+        self.competition = competition
+        self.parallelism = parallelism
+        self.http = http if http != None else urllib3.PoolManager(num_pools = 4, maxsize = parallelism, block = True,
+                                                                   retries = Retry(total = 4, backoff_factor = 0.5, status_forcelist = [ 429, 500, 502, 503, 504 ]),
+                                                                   timeout = Timeout(connect = 5, read = timeout))
+
+    @staticmethod
+    def from_config(config) -> 'EuroleagueClient':
+        euroleague_config = config.get('Euroleague', {})
+        cache = ResponseCache(euroleague_config.get('CacheDirectory', 'euroleague_cache'), timedelta(hours = euroleague_config.get('ScheduleTtlHours', 12)))
+        return EuroleagueClient(cache, euroleague_config.get('LiveBaseUrl', LIVE_BASE_URL), euroleague_config.get('ApiBaseUrl', API_BASE_URL),
+                                euroleague_config.get('Competition', COMPETITION), euroleague_config.get('Parallelism', 8))
+
+    def schedule(self, season: str) -> list[ScheduledGame]:
+        response = self.cache.get(SCHEDULE_ENDPOINT, season)
+        if response == None:
+            response = self.get_json('{}/competitions/{}/seasons/{}/games'.format(self.api_base_url, self.competition, season))
+            if response == None:
+                raise ValueError('No schedule of season {} in competition {}'.format(season, self.competition))
+            self.cache.put(SCHEDULE_ENDPOINT, season, None, response)
+
+        # The v2 API wraps lists in {data, total}
+        games = response.get('data', []) if isinstance(response, dict) else response
+        return [ to_scheduled_game(game) for game in games ]
+
+    def game_data(self, endpoint: str, season: str, game_code: int) -> dict[str, any]:
+        ''' Response of a live endpoint for a game, read from the cache once the game is final '''
+        response = self.cache.get(endpoint, season, game_code)
+        if response != None:
+            run_metrics.increment('euroleague_requests', endpoint = endpoint, source = 'cache')
+            return response
+
+        response = self.get_json('{}/{}?{}'.format(self.live_base_url, endpoint, urlencode({ 'gamecode': game_code, 'seasoncode': season })))
+        run_metrics.increment('euroleague_requests', endpoint = endpoint, source = 'api')
+        if response != None and response.get('Live') == False:
+            self.cache.put(endpoint, season, game_code, response)
+        return response
+
+    def fetch_games(self, season: str, game_codes: list[int], endpoints: list[str] = GAME_ENDPOINTS) -> dict[int, dict[str, any]]:
+        ''' Responses of all endpoints for all games, fetched concurrently, as {game code: {endpoint: response}} '''
+        requests = [ (game_code, endpoint) for game_code in game_codes for endpoint in endpoints ]
+        results = { game_code: {} for game_code in game_codes }
+
+        def fetch(request):
+            game_code, endpoint = request
+            try:
+                return self.game_data(endpoint, season, game_code)
+            except (urllib3.exceptions.HTTPError, ValueError) as e:
+                logger.warning('{} of game {} in {} could not be fetched - {}'.format(endpoint, game_code, season, e))
+                run_metrics.increment('euroleague_requests', endpoint = endpoint, source = 'failed')
+                return None
+
+        with ThreadPoolExecutor(max_workers = self.parallelism, thread_name_prefix = 'euroleague') as executor:
+            for (game_code, endpoint), response in zip(requests, executor.map(fetch, requests)):
+                if response != None:
+                    results[game_code][endpoint] = response
+
+        return results
+
+    def get_json(self, url: str) -> any:
+        with run_metrics.timer('euroleague_request_seconds'):
+            response = self.http.request('GET', url, headers = { 'Accept': 'application/json' })
+
+        if response.status == 404:
+            return None
+        if response.status != 200:
+            raise ValueError('HTTP {} from {}'.format(response.status, url))
+
+        # Empty bodies are returned for games that have not started
+        return response.json() if len(response.data) > 0 else None
+
+    def close(self):
+        self.http.clear()
+
+class EuroleagueEnricher(object):
+    """
+    Joins stored Euroleague odds games to official game codes by season, team codes and start time, and stores
+    box scores and play-by-play of played games next to them. Games that already have their data are skipped.
+    """
+
+    def __init__(self, mongo, client: EuroleagueClient):
+        self.mongo = mongo
+        self.client = client
+
+    def enrich(self, season: str) -> dict[str, int]:
+        games = list(self.mongo.find_games({ 'sport': 'basketball', 'tournament': EUROLEAGUE_TOURNAMENT, 'season': season },
+                                           [ 'home_code', 'away_code', 'game_date', 'home_score', 'game_code' ]))
+        schedule = self.client.schedule(season)
+        codes = match_game_codes(games, schedule)
+
+        self.mongo.set_game_codes({ game['_id']: codes[game['_id']] for game in games if game['_id'] in codes and game.get('game_code') != codes[game['_id']] })
+
+        played = { scheduled.game_code for scheduled in schedule if scheduled.played }
+        stored = self.mongo.get_euroleague_game_codes(season)
+        missing = sorted(code for code in set(codes.values()) if code in played and code not in stored)
+        logger.info('Season {}: {} of {} odds games matched to game codes, fetching data of {} games'.format(season, len(codes), len(games), len(missing)))
+
+        fetched = self.client.fetch_games(season, missing)
+        complete = { game_code: responses for game_code, responses in fetched.items() if len(responses) == len(GAME_ENDPOINTS) }
+        # Games that started but are not final yet would be stored with partial stats and never fetched again, they wait for a later run
+        final = { game_code: responses for game_code, responses in complete.items() if all(response.get('Live') == False for response in responses.values()) }
+        documents = [ { 'season': season, 'game_code': game_code, 'box_score': responses.get('Boxscore'), 'play_by_play': responses.get('PlaybyPlay') }
+                      for game_code, responses in final.items() ]
+        self.mongo.upsert_euroleague_games(documents)
+
+        return { 'games': len(games), 'matched': len(codes), 'fetched': len(documents), 'live': len(complete) - len(final), 'failed': len(missing) - len(complete) }
+
+def match_game_codes(games: list[dict[str, any]], schedule: list[ScheduledGame]) -> dict[any, int]:
+    ''' Game code of every stored game whose teams play a scheduled game within MATCH_TOLERANCE of its start '''
+    pairings = {}
+    for scheduled in schedule:
+        pairings.setdefault((scheduled.home_code, scheduled.away_code), []).append(scheduled)
+
+    codes, unmatched = {}, 0
+    for game in games:
+        candidates = [ scheduled for scheduled in pairings.get((game.get('home_code'), game.get('away_code')), [])
+                       if scheduled.date != None and game.get('game_date') != None and abs(scheduled.date - game['game_date']) <= MATCH_TOLERANCE ]
+        if len(candidates) == 0:
+            unmatched += 1
+            continue
+
+        codes[game['_id']] = min(candidates, key = lambda scheduled: abs(scheduled.date - game['game_date'])).game_code
+
+    if unmatched > 0:
+        logger.warning('{} games could not be matched to the official schedule, check their team codes'.format(unmatched))
+    return codes
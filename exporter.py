@@ -0,0 +1,153 @@
+import json
+import logging
+import os
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from mongo import Mongo
+
+logger = logging.getLogger(__name__)
+
+EXPORT_STATE_FILE = '_export_state.json'
+EXPORT_PROJECTION = [ 'sport', 'tournament', 'season', 'game_date', 'home', 'away', 'home_code', 'away_code', 'home_score', 'away_score',
+                      'link', 'odds', 'inserted_at', 'updated_at' ]
+
+ODDS_SCHEMA = pa.schema([
+    ('game_id', pa.string()),
+    ('sport', pa.string()),
+    ('tournament', pa.string()),
+    ('season', pa.string()),
+    ('game_date', pa.timestamp('ms')),
+    ('home', pa.string()),
+    ('away', pa.string()),
+    ('home_code', pa.string()),
+    ('away_code', pa.string()),
+    ('home_score', pa.int32()),
+    ('away_score', pa.int32()),
+    ('link', pa.string()),
+    ('bookmaker', pa.string()),
+    ('home_odds', pa.float64()),
+    ('away_odds', pa.float64()),
+    ('inserted_at', pa.timestamp('ms')),
+    ('updated_at', pa.timestamp('ms')),
+])
+
+class OddsExporter(object):
+    """
+    Streams the odds collection into columnar files with one row per game and bookmaker,
+    partitioned as sport=/tournament=/season= directories under output_dir.
+
+    Incremental exports only read games inserted or updated since the previous export and write them to a new part
+    file of each partition, so a game updated later is present in several parts; readers keep the row with the latest updated_at.
+    """
+
+    def __init__(self, mongo: Mongo, output_dir: str, format: str = 'parquet', batch_size: int = 10000):
+        if format not in [ 'parquet', 'arrow' ]:
+            raise ValueError('Unsupported export format {}, use parquet or arrow'.format(format))
+
+        self.mongo = mongo
+        self.output_dir = output_dir
+        self.format = format
+        self.batch_size = batch_size
+        self.writers = {}
+        self.buffers = {}
+
+    def export(self, filter: dict[str, any] = None, incremental: bool = True) -> dict[str, int]:
+        ''' Exports games matching filter, only those changed since the last export when incremental, returns exported counts '''
+        started_at = datetime.utcnow()
+        query = dict(filter or {})
+        since = self.last_export() if incremental else None
+        if since != None:
+            # Combined with $and, the filter may have an $or of its own
+            query = {'$and': [ query, {'$or': [ {'inserted_at': {'$gt': since}}, {'updated_at': {'$gt': since}} ]} ]}
+
+        part = started_at.strftime('%Y%m%dT%H%M%S%f')
+        games, rows = 0, 0
+        try:
+            for game in self.mongo.find_games(query, EXPORT_PROJECTION, self.batch_size):
+                games += 1
+                rows += self.add_game(game, part)
+        finally:
+            for partition in list(self.buffers.keys()):
+                self.flush(partition)
+            for writer in self.writers.values():
+                writer.close()
+            self.writers, self.buffers = {}, {}
+
+        self.save_last_export(started_at)
+        logger.info('Exported {} games as {} rows to {} since {}'.format(games, rows, self.output_dir, since))
+        return { 'games': games, 'rows': rows }
+
+    def add_game(self, game: dict[str, any], part: str) -> int:
+        partition = (game.get('sport') or 'unknown', game.get('tournament') or 'unknown', game.get('season') or 'unknown', part)
+        buffer = self.buffers.setdefault(partition, { field.name: [] for field in ODDS_SCHEMA })
+
+        for odd in game.get('odds') or []:
+            buffer['game_id'].append(str(game['_id']))
+            for field in [ 'sport', 'tournament', 'season', 'game_date', 'home', 'away', 'home_code', 'away_code', 'link', 'inserted_at', 'updated_at' ]:
+                buffer[field].append(game.get(field))
+            buffer['home_score'].append(to_int(game.get('home_score')))
+            buffer['away_score'].append(to_int(game.get('away_score')))
+            buffer['bookmaker'].append(odd.get('name'))
+            buffer['home_odds'].append(to_float(odd.get('home')))
+            buffer['away_odds'].append(to_float(odd.get('away')))
+
+        if len(buffer['game_id']) >= self.batch_size:
+            self.flush(partition)
+
+        return len(game.get('odds') or [])
+
+    def flush(self, partition: tuple):
+        buffer = self.buffers.pop(partition)
+        if len(buffer['game_id']) == 0:
+            return
+
+        batch = pa.RecordBatch.from_pydict(buffer, schema = ODDS_SCHEMA)
+        writer = self.writers.get(partition)
+        if writer == None:
+            writer = self.open_writer(partition)
+            self.writers[partition] = writer
+
+        if self.format == 'parquet':
+            writer.write_batch(batch)
+        else:
+            writer.write(batch)
+
+    def open_writer(self, partition: tuple):
+        sport, tournament, season, part = partition
+        directory = os.path.join(self.output_dir, 'sport={}'.format(sport), 'tournament={}'.format(tournament), 'season={}'.format(season))
+        os.makedirs(directory, exist_ok = True)
+
+        if self.format == 'parquet':
+            return pq.ParquetWriter(os.path.join(directory, 'part-{}.parquet'.format(part)), ODDS_SCHEMA)
+
+        # Arrow IPC files can be memory mapped directly with pyarrow.ipc.open_file(pyarrow.memory_map(path))
+        return pa.ipc.new_file(os.path.join(directory, 'part-{}.arrow'.format(part)), ODDS_SCHEMA)
+
+    def last_export(self) -> datetime:
+        path = os.path.join(self.output_dir, EXPORT_STATE_FILE)
+        if not os.path.exists(path):
+            return None
+
+        with open(path, 'r') as state_file:
+            return datetime.fromisoformat(json.load(state_file)['exported_at'])
+
+    def save_last_export(self, exported_at: datetime):
+        os.makedirs(self.output_dir, exist_ok = True)
+        with open(os.path.join(self.output_dir, EXPORT_STATE_FILE), 'w') as state_file:
+            json.dump({ 'exported_at': exported_at.isoformat() }, state_file)
+
+def to_float(value) -> float:
+    # Older documents hold odds as strings, '-' for missing
+    try:
+        return float(value) if value != None else None
+    except ValueError:
+        return None
+
+def to_int(value) -> int:
+    try:
+        return int(value) if value != None else None
+    except ValueError:
+        return None
@@ -0,0 +1,207 @@
+from datetime import datetime, timedelta
+import logging
+import re
+
+from models import BookOdds
+from parser_backends import ParserBackend, Selector, get_backend
+
+logger = logging.getLogger(__name__)
+
+LISTING_ROW_SELECTOR = '.eventRow'
+PAGINATION_SELECTOR = 'a.pagination-link'
+BOOKMAKER_ROW_SELECTOR = 'div.text-xs.border-black-borders'
+HOME_SCORE_SELECTOR = '#app > div > div:nth-of-type(1) > div > main > div:nth-of-type(2) > div:nth-of-type(2) > div > div > div:nth-of-type(1) div[class*="text-gray-dark"]'
+AWAY_SCORE_SELECTOR = '#app > div > div:nth-of-type(1) > div > main > div:nth-of-type(2) > div:nth-of-type(2) > div > div > div:nth-of-type(3) div[class*="text-gray-dark"]'
+START_TIME_SELECTOR = 'div[class*="event-start-time"]'
+GAME_DATE_FORMAT = '%d %b %Y,%H:%M'
+
+LISTING_ROWS = Selector(LISTING_ROW_SELECTOR, ".//*[contains(concat(' ', normalize-space(@class), ' '), ' eventRow ')]")
+PAGINATION_LINKS = Selector(PAGINATION_SELECTOR, ".//a[contains(concat(' ', normalize-space(@class), ' '), ' pagination-link ')]")
+EVENT_ROW_GROUP = Selector('div.group.flex', ".//div[contains(concat(' ', normalize-space(@class), ' '), ' group ') and contains(concat(' ', normalize-space(@class), ' '), ' flex ')]")
+BOOKMAKER_ROWS = Selector(BOOKMAKER_ROW_SELECTOR, ".//div[contains(concat(' ', normalize-space(@class), ' '), ' text-xs ') and contains(concat(' ', normalize-space(@class), ' '), ' border-black-borders ')]")
+HOME_SCORE = Selector(HOME_SCORE_SELECTOR, './/*[@id="app"]/div/div[1]/div/main/div[2]/div[2]/div/div/div[1]//div[contains(@class, "text-gray-dark")]')
+AWAY_SCORE = Selector(AWAY_SCORE_SELECTOR, './/*[@id="app"]/div/div[1]/div/main/div[2]/div[2]/div/div/div[3]//div[contains(@class, "text-gray-dark")]')
+START_TIME = Selector(START_TIME_SELECTOR, './/div[contains(@class, "event-start-time")]')
+
+# Listing rows carry a date header only on the first game of each day, e.g. '12 May 2023 - Play Offs' or 'Today, 18 Oct'
+LISTING_DATE_PATTERN = re.compile(r'(\d{1,2}) (Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\w*(?: (\d{4}))?')
+LISTING_TIME_PATTERN = re.compile(r'^(\d{1,2}):(\d{2})$')
+LISTING_SCORE_PATTERN = re.compile(r'(?<![\d.])(\d{1,3})\s*[–-]\s*(\d{1,3})(?![\d.:])')
+
+class GameDetails:
+    def __init__(self, home_score: str, away_score: str, date: datetime, book_odds: list[BookOdds]) -> None:
+        self.home_score = home_score
+        self.away_score = away_score
+        self.date = date
+        self.book_odds = book_odds
+
+class ListingPage:
+    def __init__(self, rows: list, page_count: int) -> None:
+        self.rows = rows
+        self.page_count = page_count
+
+class ListingRow:
+    def __init__(self, link: str, home: str, away: str, odd_home: str, odd_away: str, home_score: str, away_score: str, date: datetime) -> None:
+        self.link = link
+        self.home = home
+        self.away = away
+        self.odd_home = odd_home
+        self.odd_away = odd_away
+        self.home_score = home_score
+        self.away_score = away_score
+        self.date = date
+
+def parse_listing_page(html: str, sport: str, country: str, tournament: str, backend: ParserBackend = None) -> ListingPage:
+    ''' Extracts game rows and the number of result pages of a tournament results or upcoming games page '''
+    backend = backend or get_backend()
+    root = backend.parse(html)
+
+    rows = []
+    day = None
+    for row in backend.select(root, LISTING_ROWS):
+        link_divs = backend.descendants(row, 'a')
+        game_links = list(filter(lambda x: x != None and "{}/{}/{}/".format(sport, country, tournament) in x and x.endswith("{}/".format(tournament)) == False, [ backend.attr(a, 'href') for a in link_divs ]))
+
+        game_link = None
+        if len(game_links) == 0:
+            logger.error("Game link was not found. Skipping")
+            continue
+        elif len(game_links) > 1:
+            game_link = game_links[0]
+            logger.warning("There were multiple links found for game at link {}".format(game_link))
+        else:
+            game_link = game_links[0]
+
+
+        event_row_click = backend.select_one(row, EVENT_ROW_GROUP)
+        if event_row_click == None:
+            logger.warning("No game details found for game at link {}".format(game_link))
+            continue
+
+        inside_divs = backend.children(event_row_click, 'div')
+
+        titles = [ backend.attr(a, 'title') for a in backend.descendants(event_row_click, 'a') ]
+        titles = [ title for title in titles if title != None ]
+
+        if len(titles) < 2 or len(inside_divs) < 2:
+            logger.warning("No links for game was scraped")
+            continue
+
+        home = titles[0]
+        away = titles[1]
+
+        if len(home) < 3 or len(away) < 3:
+            logger.warning("Game teams {}:{} probably was scraped incorrectly".format(home, away))
+
+        # Missing prices are shown as '-' on the page
+        odd_home = first_text(backend, inside_divs[0], 'p') or '-'
+        odd_away = first_text(backend, inside_divs[1], 'p') or '-'
+
+        texts = backend.strings(row)
+        day = parse_listing_day(texts) or day
+        home_score, away_score = parse_listing_score(texts)
+
+        rows.append(ListingRow(game_link, home, away, odd_home, odd_away, home_score, away_score, parse_listing_date(day, texts)))
+
+    return ListingPage(rows, parse_page_count(backend, root))
+
+def parse_page_count(backend: ParserBackend, root) -> int:
+    # Pagination is only rendered when a season has more than one page of results
+    pages = [ 1 ]
+    for link in backend.select(root, PAGINATION_LINKS):
+        number = backend.attr(link, 'data-number') or backend.text(link)
+        if number.isdigit():
+            pages.append(int(number))
+
+    return max(pages)
+
+def parse_listing_day(texts: list[str]) -> datetime:
+    for text in texts:
+        match = LISTING_DATE_PATTERN.search(text)
+        if match == None:
+            continue
+
+        day, month, year = match.groups()
+        if year != None:
+            return datetime.strptime('{} {} {}'.format(day, month, year), '%d %b %Y')
+
+        # Upcoming pages omit the year, games are never more than half a year old
+        date = datetime.strptime('{} {} {}'.format(day, month, datetime.utcnow().year), '%d %b %Y')
+        return date.replace(year = date.year + 1) if date < datetime.utcnow() - timedelta(days = 180) else date
+
+    return None
+
+def parse_listing_date(day: datetime, texts: list[str]) -> datetime:
+    if day == None:
+        return None
+
+    for text in texts:
+        match = LISTING_TIME_PATTERN.match(text)
+        if match != None:
+            return day.replace(hour = int(match.group(1)), minute = int(match.group(2)))
+
+    return day
+
+def parse_listing_score(texts: list[str]) -> tuple:
+    match = LISTING_SCORE_PATTERN.search(' '.join(texts))
+    return (match.group(1), match.group(2)) if match != None else (None, None)
+
+def parse_game_page(html: str, backend: ParserBackend = None) -> GameDetails:
+    ''' Extracts scores, start time and bookmaker odds from a game page source in a single parse '''
+    backend = backend or get_backend()
+    root = backend.parse(html)
+
+    home_score = select_text(backend, root, HOME_SCORE)
+    away_score = select_text(backend, root, AWAY_SCORE)
+
+    date_time = None
+    start_time = backend.select_one(root, START_TIME)
+    if start_time != None:
+        date_parts = backend.next_siblings(start_time, 'p', 3)
+        if len(date_parts) == 3:
+            date_time = datetime.strptime(backend.text(date_parts[1]) + backend.text(date_parts[2]), GAME_DATE_FORMAT)
+
+    book_odds = []
+    for row in backend.select(root, BOOKMAKER_ROWS):
+        book = parse_bookmaker_name(backend, row)
+        if book == None:
+            continue
+
+        book_rows = backend.children(row, 'div')
+        if len(book_rows) < 3:
+            continue
+
+        odd_home = first_text(backend, book_rows[1], 'p') or '' # home odd
+        odd_away = first_text(backend, book_rows[2], 'p') or '' # away odd
+
+        try:
+            odd_home = float(odd_home)
+            odd_away = float(odd_away)
+        except ValueError:
+            logger.warning("Skipped! Book {} odds {}:{} probably was scraped incorrectly".format(book, odd_home, odd_away))
+            continue
+
+        book_odds.append(BookOdds(book, odd_home, odd_away))
+
+    return GameDetails(home_score, away_score, date_time, book_odds)
+
+def parse_bookmaker_name(backend: ParserBackend, row) -> str:
+    # Bookmaker name is in div[@provider-name="0"]/a[2]/p of the bookmaker row
+    providers = [ div for div in backend.children(row, 'div') if backend.attr(div, 'provider-name') == '0' ]
+    if len(providers) == 0:
+        return None
+
+    anchors = backend.children(providers[0], 'a')
+    if len(anchors) < 2:
+        return None
+
+    names = backend.children(anchors[1], 'p')
+    return backend.text(names[0]) if len(names) > 0 else None
+
+def select_text(backend: ParserBackend, root, selector: Selector) -> str:
+    element = backend.select_one(root, selector)
+    return backend.text(element) if element != None else None
+
+def first_text(backend: ParserBackend, node, tag: str) -> str:
+    elements = backend.descendants(node, tag)
+    return backend.text(elements[0]) if len(elements) > 0 else None
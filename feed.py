@@ -0,0 +1,165 @@
+import base64
+import json
+import logging
+import re
+import time
+
+from selenium.common.exceptions import WebDriverException
+
+from models import BookOdds
+from browser import read_network_events, summarize_traffic
+
+logger = logging.getLogger(__name__)
+
+# Game pages load their odds from /feed/match/... or /feed/match-event/... and the bookmaker names from a bookies script
+FEED_URL_PATTERN = re.compile(r'/feed/match(?:-event)?/')
+BOOKMAKERS_URL_PATTERN = re.compile(r'/bookies[^/?]*\.js')
+
+# Feeds are served either as JSON or wrapped in a JSONP call, e.g. globals.jsonpCallback('/feed/match/...', {...});
+JSONP_PATTERN = re.compile(r'^\s*[\w.$]+\(\s*(?:\'[^\']*\'|"[^"]*")\s*,\s*(.*)\)\s*;?\s*$', re.DOTALL)
+BOOKMAKERS_DATA_PATTERN = re.compile(r'bookmakersData\s*=\s*(\{.*?\})\s*;', re.DOTALL)
+
+# Markets are keyed E-<bet type>-<scope>-<handicap>-..., bet type 3 is home/away and scope 1 the full time including overtime
+HOME_AWAY_BET_TYPE = 3
+FULL_TIME_SCOPE = 1
+
+# Reads window.bookmakersData when the bookies script was loaded before the capture started, e.g. from the browser cache
+BOOKMAKER_NAMES_SCRIPT = """
+var data = window.bookmakersData || {};
+var names = {};
+for (var id in data) { names[id] = data[id].WebName || data[id].name; }
+return names;
+"""
+
+def parse_feed_payload(payload: str, bookmaker_names: dict[str, str] = None, bet_type: int = HOME_AWAY_BET_TYPE, scope: int = FULL_TIME_SCOPE) -> list[BookOdds]:
+    ''' Builds bookmaker odds of the home/away market from a game odds feed, raises ValueError when the payload is not a readable feed '''
+    match = JSONP_PATTERN.match(payload)
+    try:
+        feed = json.loads(match.group(1) if match != None else payload)
+    except json.JSONDecodeError as e:
+        # Newer frontends encrypt the feed body, such payloads need a decoder before they can be read
+        raise ValueError('Feed payload is not JSON - {}'.format(e))
+
+    # Payloads of another shape, e.g. an encrypted string or an empty list, are unreadable feeds as well
+    if not isinstance(feed, dict):
+        raise ValueError('Feed payload is a {}, not an object'.format(type(feed).__name__))
+
+    markets = feed_object(feed_object(feed_object(feed, 'd', feed), 'oddsdata'), 'back')
+    market = markets.get('E-{}-{}-0-0-0'.format(bet_type, scope))
+    if market == None:
+        return []
+    if not isinstance(market, dict):
+        raise ValueError('Feed market is a {}, not an object'.format(type(market).__name__))
+
+    bookmaker_names = bookmaker_names or {}
+    active = feed_object(market, 'act')
+    book_odds = []
+    for bookmaker_id, prices in feed_object(market, 'odds').items():
+        if active.get(bookmaker_id, True) == False:
+            continue
+
+        # Prices are listed per outcome either as [home, away] or as {"0": home, "1": away}
+        if isinstance(prices, dict):
+            prices = [ prices.get('0'), prices.get('1') ]
+
+        try:
+            odd_home, odd_away = float(prices[0]), float(prices[1])
+        except (TypeError, ValueError, IndexError):
+            logger.warning("Skipped! Feed odds {} of bookmaker {} probably are malformed".format(prices, bookmaker_id))
+            continue
+
+        book_odds.append(BookOdds(bookmaker_names.get(bookmaker_id, bookmaker_id), odd_home, odd_away))
+
+    return book_odds
+
+def feed_object(value: dict[str, any], key: str, default: dict[str, any] = None) -> dict[str, any]:
+    ''' Object under key of a feed object, empty when missing, raises ValueError when it is something else '''
+    field = value.get(key, default if default != None else {})
+    if not isinstance(field, dict):
+        raise ValueError('Feed field {} is a {}, not an object'.format(key, type(field).__name__))
+    return field
+
+def parse_bookmaker_names(script: str) -> dict[str, str]:
+    ''' Bookmaker id to name mapping from the bookies script of the frontend '''
+    match = BOOKMAKERS_DATA_PATTERN.search(script)
+    if match == None:
+        return {}
+
+    try:
+        data = json.loads(match.group(1))
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+
+    return { bookmaker_id: book.get('WebName') or book.get('name') or bookmaker_id for bookmaker_id, book in data.items() if isinstance(book, dict) }
+
+class FeedCapture(object):
+    """
+    Loads a game page and returns the body of its odds feed as soon as the browser received it, read through
+    the Chrome performance log and CDP Network.getResponseBody. The page is never scrolled or waited on to render.
+
+    Needs a browser started with the performance log enabled, see BrowserProfile.measure_traffic.
+    """
+
+    def __init__(self, driver, timeout: float = 10, poll_interval: float = 0.1):
+        self.driver = driver
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.bookmaker_names = {}
+        self.last_traffic = None
+
+    def load(self, url: str) -> str:
+        ''' Navigates to url and returns the odds feed payload, None when no feed arrived within the timeout '''
+        # Events of earlier pages must not be mistaken for this page's feed
+        read_network_events(self.driver)
+        self.driver.get(url)
+
+        started = time.monotonic()
+        pending, events, payload = {}, [], None
+        while payload == None and time.monotonic() - started < self.timeout:
+            new_events = read_network_events(self.driver)
+            events += new_events
+            for event in new_events:
+                method, params = event['method'], event.get('params', {})
+                if method == 'Network.responseReceived':
+                    response_url = params.get('response', {}).get('url', '')
+                    if FEED_URL_PATTERN.search(response_url):
+                        pending[params['requestId']] = 'feed'
+                    elif BOOKMAKERS_URL_PATTERN.search(response_url):
+                        pending[params['requestId']] = 'bookmakers'
+                elif method == 'Network.loadingFinished' and params.get('requestId') in pending:
+                    kind = pending.pop(params['requestId'])
+                    body = self.response_body(params['requestId'])
+                    if body == None:
+                        continue
+                    elif kind == 'bookmakers':
+                        self.bookmaker_names.update(parse_bookmaker_names(body))
+                    elif payload == None:
+                        payload = body
+
+            if payload == None:
+                time.sleep(self.poll_interval)
+
+        self.last_traffic = summarize_traffic(events)
+        if payload != None and len(self.bookmaker_names) == 0:
+            self.bookmaker_names = self.page_bookmaker_names()
+
+        return payload
+
+    def response_body(self, request_id: str) -> str:
+        try:
+            response = self.driver.execute_cdp_cmd('Network.getResponseBody', { 'requestId': request_id })
+        except WebDriverException as e:
+            logger.warning('Response body of request {} is not available - {}'.format(request_id, e))
+            return None
+
+        if response.get('base64Encoded', False):
+            return base64.b64decode(response['body']).decode('utf-8', errors = 'replace')
+        return response['body']
+
+    def page_bookmaker_names(self) -> dict[str, str]:
+        try:
+            return self.driver.execute_script(BOOKMAKER_NAMES_SCRIPT) or {}
+        except WebDriverException:
+            return {}
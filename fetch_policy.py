@@ -0,0 +1,192 @@
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+from metrics import run_metrics
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket(object):
+    """
+    Allows rate requests per second on average and bursts of up to burst requests. Callers reserve a token
+    and sleep until it is due, so concurrent browsers are spaced out instead of racing for the next token.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        ''' Takes a token, blocks until it is available and returns the seconds waited '''
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+class Backoff(object):
+    """
+    Exponential backoff with equal jitter, half of the delay is fixed and half random, so retries of
+    parallel browsers do not hit the site at the same moment.
+    """
+
+    def __init__(self, base_delay: float = 2, max_delay: float = 60, factor: float = 2):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.factor = factor
+
+    def delay(self, attempt: int) -> float:
+        ''' Delay before retry attempt, attempts start at 1 '''
+        cap = min(self.max_delay, self.base_delay * self.factor ** (attempt - 1))
+        return cap / 2 + random.uniform(0, cap / 2)
+
+class CircuitBreaker(object):
+    """
+    Pauses all fetches after failure_threshold consecutive failures, e.g. when the site starts blocking the crawl.
+
+    Once the cooldown passed fetches are let through again. A success closes the breaker, a failure reopens it
+    with a doubled cooldown, bounded by max_cooldown.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, failure_threshold: int = 8, cooldown: float = 120, max_cooldown: float = 1800):
+        self.failure_threshold = failure_threshold
+        self.initial_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_until = 0.0
+        self.opened = 0
+        self.lock = threading.Lock()
+
+    def wait_until_closed(self) -> float:
+        ''' Blocks while the breaker is open, returns the seconds waited '''
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if self.state == self.OPEN and now >= self.opened_until:
+                    self.state = self.HALF_OPEN
+                    logger.info('Circuit breaker half-open, resuming fetches')
+                if self.state != self.OPEN:
+                    return waited
+                wait = self.opened_until - now
+
+            time.sleep(wait)
+            waited += wait
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            if self.state != self.CLOSED:
+                logger.info('Circuit breaker closed')
+                self.state = self.CLOSED
+                self.cooldown = self.initial_cooldown
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+                self.open()
+            elif self.state == self.CLOSED and self.failures >= self.failure_threshold:
+                self.open()
+
+    def open(self):
+        self.state = self.OPEN
+        self.opened_until = time.monotonic() + self.cooldown
+        self.opened += 1
+        run_metrics.increment('circuit_opened')
+        logger.warning('Circuit breaker opened after {} consecutive failures, pausing fetches for {:.0f}s'.format(self.failures, self.cooldown))
+
+class FetchPolicy(object):
+    """
+    Decides when a page may be fetched: waits while the circuit breaker is open, then takes a token from the
+    rate limiter of the page's host. Failed fetches are retried with backoff up to max_retries times.
+
+    One policy is shared by all browsers of a run, so the rate applies to the crawl as a whole.
+    """
+
+    def __init__(self, requests_per_second: float = 1.0, burst: int = 3, host_rates: dict[str, float] = None, max_retries: int = 5,
+                 backoff: Backoff = None, breaker: CircuitBreaker = None):
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.host_rates = host_rates or {}
+        self.max_retries = max_retries
+        self.backoff = backoff if backoff != None else Backoff()
+        self.breaker = breaker if breaker != None else CircuitBreaker()
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.counters = { 'fetches': 0, 'failures': 0, 'retries': 0, 'throttle_seconds': 0.0, 'backoff_seconds': 0.0, 'circuit_seconds': 0.0 }
+
+    @staticmethod
+    def from_config(config) -> 'FetchPolicy':
+        policy_config = config.get('FetchPolicy', {})
+        return FetchPolicy(requests_per_second = policy_config.get('RequestsPerSecond', 1.0), burst = policy_config.get('Burst', 3),
+                           host_rates = policy_config.get('HostRates'), max_retries = policy_config.get('MaxRetries', 5),
+                           backoff = Backoff(policy_config.get('BackoffBaseSeconds', 2), policy_config.get('BackoffMaxSeconds', 60)),
+                           breaker = CircuitBreaker(policy_config.get('FailureThreshold', 8), policy_config.get('CooldownSeconds', 120),
+                                                    policy_config.get('MaxCooldownSeconds', 1800)))
+
+    def bucket(self, host: str) -> TokenBucket:
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.host_rates.get(host, self.requests_per_second), self.burst)
+            return self.buckets[host]
+
+    def before_fetch(self, url: str):
+        ''' Blocks until url may be fetched '''
+        host = urlparse(url).netloc
+        circuit_wait = self.breaker.wait_until_closed()
+        throttle_wait = self.bucket(host).acquire()
+
+        run_metrics.increment('fetches', host = host)
+        run_metrics.observe('throttle_wait_seconds', throttle_wait, host = host)
+        if circuit_wait > 0:
+            run_metrics.observe('circuit_wait_seconds', circuit_wait)
+        self.count(fetches = 1, throttle_seconds = throttle_wait, circuit_seconds = circuit_wait)
+
+    def record_success(self, url: str):
+        self.breaker.record_success()
+
+    def record_failure(self, url: str, reason: str, breaker: bool = True):
+        ''' Counts a failed fetch, only failures that point at the site blocking the crawl should count towards the breaker '''
+        run_metrics.increment('fetch_failures', reason = reason)
+        self.count(failures = 1)
+        if breaker:
+            self.breaker.record_failure()
+
+    def should_retry(self, attempt: int) -> bool:
+        ''' Whether a fetch that failed attempt retries so far is tried again '''
+        return attempt < self.max_retries
+
+    def wait_before_retry(self, attempt: int) -> float:
+        delay = self.backoff.delay(attempt)
+        run_metrics.observe('backoff_seconds', delay)
+        self.count(retries = 1, backoff_seconds = delay)
+        time.sleep(delay)
+        return delay
+
+    def count(self, **values):
+        with self.lock:
+            for name, value in values.items():
+                self.counters[name] += value
+
+    def summary(self) -> str:
+        with self.lock:
+            counters = dict(self.counters)
+        return '{} fetches, {} failures, {} retries, throttled {:.1f}s, backed off {:.1f}s, circuit open {} times for {:.1f}s'.format(
+            counters['fetches'], counters['failures'], counters['retries'], counters['throttle_seconds'], counters['backoff_seconds'],
+            self.breaker.opened, counters['circuit_seconds'])
@@ -0,0 +1,406 @@
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import BulkWriteError
+
+from models import ScrapeType
+
+logger = logging.getLogger(__name__)
+
+PENDING, LEASED, DONE, FAILED = 'pending', 'leased', 'done', 'failed'
+JOB_FIELDS = [ 'key', 'shard', 'sport', 'country', 'tournament', 'season', 'page', 'scrape_type', 'status', 'attempts', 'owner',
+               'lease_expires', 'started_at', 'finished_at', 'games', 'error' ]
+
+class Job:
+    """
+    One listing page of a tournament season. Jobs of the same season form a shard, the unit progress is reported for.
+    Times are epoch seconds so they compare the same way in every queue backend.
+    """
+
+    def __init__(self, sport: str, country: str, tournament: str, season: str, page: int, scrape_type: ScrapeType, status: str = PENDING,
+                 attempts: int = 0, owner: str = None, lease_expires: float = None, started_at: float = None, finished_at: float = None,
+                 games: int = 0, error: str = None, **_) -> None:
+        self.sport = sport
+        self.country = country
+        self.tournament = tournament
+        self.season = season
+        self.page = page
+        self.scrape_type = ScrapeType(scrape_type)
+        self.status = status
+        self.attempts = attempts
+        self.owner = owner
+        self.lease_expires = lease_expires
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.games = games
+        self.error = error
+
+    @property
+    def shard(self) -> str:
+        return '{}/{}/{}/{}'.format(self.sport, self.country, self.tournament, self.season)
+
+    @property
+    def key(self) -> str:
+        return '{}/{}'.format(self.shard, self.page)
+
+    def to_dict(self) -> dict[str, any]:
+        values = { field: getattr(self, field) for field in JOB_FIELDS }
+        values['scrape_type'] = self.scrape_type.value
+        return values
+
+    def __str__(self):
+        return f"{self.key} ({self.scrape_type.name})"
+
+def season_names(start_season: str, nseasons: int, current_season: str = 'no') -> list[tuple]:
+    ''' (season, scrape type) pairs of a backfill, seasons are named the same way as in Scraper.scrape_historical_seasons_typeA '''
+    long_season = len(start_season) > 6
+    season = int(start_season[0:4])
+    name = '{}'.format(season)
+    seasons = []
+    for _ in range(nseasons):
+        name = '{}-{}'.format(season, season + 1) if long_season else '{}'.format(season)
+        seasons.append((name, ScrapeType.Historical))
+        season += 1
+
+    if current_season == 'yes':
+        if long_season:
+            name = '{}-{}'.format(season, season + 1)
+        seasons.append((name, ScrapeType.CurrentSeasonHistorical))
+
+    return seasons
+
+class JobPlanner(object):
+    """
+    Expands tournaments and seasons into page jobs. The number of pages of a season is only known once its first
+    page was loaded, so only page 1 jobs are planned and the worker that scrapes page 1 enqueues the remaining pages.
+    """
+
+    def plan(self, tournaments: list[dict[str, str]], start_season: str, nseasons: int, current_season: str = 'no') -> list[Job]:
+        return [ Job(tournament['Sport'], tournament['Country'], tournament['Tournament'], season, 1, scrape_type)
+                 for tournament in tournaments for season, scrape_type in season_names(start_season, nseasons, current_season) ]
+
+    def remaining_pages(self, job: Job, page_count: int) -> list[Job]:
+        return [ Job(job.sport, job.country, job.tournament, job.season, page, job.scrape_type) for page in range(job.page + 1, page_count + 1) ]
+
+class JobQueue(object):
+    """
+    A queue of jobs shared by any number of worker processes. A worker leases a job for lease_seconds and keeps
+    the lease alive with heartbeats, a job whose lease expired because its worker died is handed out again
+    until it was attempted max_attempts times.
+    """
+
+    def __init__(self, max_attempts: int = 3):
+        self.max_attempts = max_attempts
+
+    def enqueue(self, jobs: list[Job]) -> int:
+        ''' Adds jobs that are not queued yet, returns how many were added '''
+        raise NotImplementedError()
+
+    def lease(self, owner: str, lease_seconds: float) -> Job:
+        ''' Leases the oldest pending job, None when nothing is pending '''
+        raise NotImplementedError()
+
+    def heartbeat(self, job: Job, owner: str, lease_seconds: float) -> bool:
+        ''' Extends the lease, False when the job is no longer leased by owner '''
+        raise NotImplementedError()
+
+    def complete(self, job: Job, owner: str, games: int) -> bool:
+        raise NotImplementedError()
+
+    def fail(self, job: Job, owner: str, error: str) -> bool:
+        ''' Puts the job back to pending, or marks it failed once it was attempted max_attempts times '''
+        raise NotImplementedError()
+
+    def requeue_expired(self) -> int:
+        raise NotImplementedError()
+
+    def jobs(self) -> list[Job]:
+        raise NotImplementedError()
+
+    def count(self, statuses: list[str]) -> int:
+        ''' Number of jobs in any of statuses '''
+        raise NotImplementedError()
+
+    def status_totals(self, shard: str = None) -> list[dict[str, any]]:
+        ''' Job count, games, first start and last finish per shard and status, aggregated by the backend '''
+        raise NotImplementedError()
+
+    def progress(self, shard: str = None) -> dict[str, dict[str, any]]:
+        ''' Job counts per status, scraped games and throughput of every shard, or only of the given one '''
+        shards = {}
+        for totals in self.status_totals(shard):
+            progress = shards.setdefault(totals['shard'], { PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0, 'games': 0, 'started_at': None, 'finished_at': None })
+            progress[totals['status']] += totals['jobs']
+            progress['games'] += totals['games'] or 0
+            if totals['status'] == DONE:
+                progress['started_at'], progress['finished_at'] = totals['started_at'], totals['finished_at']
+
+        for progress in shards.values():
+            elapsed = (progress['finished_at'] - progress['started_at']) if progress['started_at'] != None else 0
+            progress['pages_per_hour'] = round(progress[DONE] / elapsed * 3600, 1) if elapsed > 0 else None
+            progress['games_per_hour'] = round(progress['games'] / elapsed * 3600, 1) if elapsed > 0 else None
+
+        return shards
+
+    def pending_work(self) -> bool:
+        ''' Whether jobs are pending or leased, leased page 1 jobs may still add more pages '''
+        return self.count([ PENDING, LEASED ]) > 0
+
+class SQLiteJobQueue(JobQueue):
+    """
+    Job queue in a SQLite file, shared by worker processes of one machine. Leases are taken in an immediate
+    transaction, so two processes never lease the same job.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        super().__init__(max_attempts)
+        self.path = path
+        self.lock = threading.Lock()
+        # Autocommit mode, transactions are opened explicitly where several statements must be atomic
+        self.connection = sqlite3.connect(path, timeout = 30, isolation_level = None, check_same_thread = False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT UNIQUE, shard TEXT, sport TEXT,
+                                   country TEXT, tournament TEXT, season TEXT, page INTEGER, scrape_type INTEGER, status TEXT, attempts INTEGER,
+                                   owner TEXT, lease_expires REAL, started_at REAL, finished_at REAL, games INTEGER, error TEXT)''')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS jobs_shard ON jobs (shard, status)')
+
+    def enqueue(self, jobs: list[Job]) -> int:
+        with self.lock:
+            cursor = self.connection.executemany('INSERT OR IGNORE INTO jobs ({}) VALUES ({})'.format(', '.join(JOB_FIELDS), ', '.join('?' * len(JOB_FIELDS))),
+                                                 [ [ job.to_dict()[field] for field in JOB_FIELDS ] for job in jobs ])
+            return cursor.rowcount
+
+    def lease(self, owner: str, lease_seconds: float) -> Job:
+        self.requeue_expired()
+        now = time.time()
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                row = self.connection.execute('SELECT * FROM jobs WHERE status = ? ORDER BY id LIMIT 1', (PENDING,)).fetchone()
+                if row != None:
+                    self.connection.execute('UPDATE jobs SET status = ?, owner = ?, lease_expires = ?, attempts = attempts + 1, started_at = ? WHERE id = ?',
+                                            (LEASED, owner, now + lease_seconds, now, row['id']))
+                self.connection.execute('COMMIT')
+            except Exception:
+                self.connection.execute('ROLLBACK')
+                raise
+
+        if row == None:
+            return None
+
+        return Job(**dict(dict(row), status = LEASED, owner = owner, lease_expires = now + lease_seconds, attempts = row['attempts'] + 1, started_at = now))
+
+    def heartbeat(self, job: Job, owner: str, lease_seconds: float) -> bool:
+        return self.update_leased(job, owner, { 'lease_expires': time.time() + lease_seconds })
+
+    def complete(self, job: Job, owner: str, games: int) -> bool:
+        return self.update_leased(job, owner, { 'status': DONE, 'finished_at': time.time(), 'games': games, 'error': None })
+
+    def fail(self, job: Job, owner: str, error: str) -> bool:
+        status = FAILED if job.attempts >= self.max_attempts else PENDING
+        return self.update_leased(job, owner, { 'status': status, 'owner': None, 'lease_expires': None, 'error': error })
+
+    def update_leased(self, job: Job, owner: str, values: dict[str, any]) -> bool:
+        with self.lock:
+            cursor = self.connection.execute('UPDATE jobs SET {} WHERE key = ? AND status = ? AND owner = ?'.format(', '.join('{} = ?'.format(field) for field in values.keys())),
+                                             list(values.values()) + [ job.key, LEASED, owner ])
+            return cursor.rowcount > 0
+
+    def requeue_expired(self) -> int:
+        with self.lock:
+            now = time.time()
+            self.connection.execute('UPDATE jobs SET status = ?, error = ? WHERE status = ? AND lease_expires < ? AND attempts >= ?',
+                                    (FAILED, 'lease expired', LEASED, now, self.max_attempts))
+            cursor = self.connection.execute('UPDATE jobs SET status = ?, owner = NULL, lease_expires = NULL WHERE status = ? AND lease_expires < ?', (PENDING, LEASED, now))
+            if cursor.rowcount > 0:
+                logger.warning('Requeued {} jobs with expired leases'.format(cursor.rowcount))
+            return cursor.rowcount
+
+    def jobs(self) -> list[Job]:
+        with self.lock:
+            return [ Job(**dict(row)) for row in self.connection.execute('SELECT * FROM jobs ORDER BY id') ]
+
+    def count(self, statuses: list[str]) -> int:
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM jobs WHERE status IN ({})'.format(', '.join('?' * len(statuses))), statuses).fetchone()[0]
+
+    def status_totals(self, shard: str = None) -> list[dict[str, any]]:
+        where, parameters = ('WHERE shard = ? ', [ shard ]) if shard != None else ('', [])
+        with self.lock:
+            return [ dict(row) for row in self.connection.execute('''SELECT shard, status, COUNT(*) AS jobs, SUM(games) AS games, MIN(started_at) AS started_at,
+                                                                     MAX(finished_at) AS finished_at FROM jobs {}GROUP BY shard, status'''.format(where), parameters) ]
+
+class MongoJobQueue(JobQueue):
+    """
+    Job queue in a Mongo collection, shared by workers on any machine that reaches the database.
+    Leases are taken with find_one_and_update, which is atomic per document.
+    """
+
+    def __init__(self, collection, max_attempts: int = 3):
+        super().__init__(max_attempts)
+        self.collection = collection
+        self.collection.create_index([ ('key', ASCENDING) ], unique = True, name = 'job_key')
+        self.collection.create_index([ ('status', ASCENDING), ('lease_expires', ASCENDING) ], name = 'job_status')
+        self.collection.create_index([ ('shard', ASCENDING), ('status', ASCENDING) ], name = 'job_shard')
+
+    def enqueue(self, jobs: list[Job]) -> int:
+        if len(jobs) == 0:
+            return 0
+
+        try:
+            return len(self.collection.insert_many([ job.to_dict() for job in jobs ], ordered = False).inserted_ids)
+        except BulkWriteError as e:
+            # Jobs that are already queued fail on the unique key, every other job was inserted
+            return e.details['nInserted']
+
+    def lease(self, owner: str, lease_seconds: float) -> Job:
+        self.requeue_expired()
+        now = time.time()
+        document = self.collection.find_one_and_update({ 'status': PENDING },
+                                                       { '$set': { 'status': LEASED, 'owner': owner, 'lease_expires': now + lease_seconds, 'started_at': now },
+                                                         '$inc': { 'attempts': 1 } },
+                                                       sort = [ ('_id', ASCENDING) ], return_document = ReturnDocument.AFTER)
+        return Job(**document) if document != None else None
+
+    def heartbeat(self, job: Job, owner: str, lease_seconds: float) -> bool:
+        return self.update_leased(job, owner, { 'lease_expires': time.time() + lease_seconds })
+
+    def complete(self, job: Job, owner: str, games: int) -> bool:
+        return self.update_leased(job, owner, { 'status': DONE, 'finished_at': time.time(), 'games': games, 'error': None })
+
+    def fail(self, job: Job, owner: str, error: str) -> bool:
+        status = FAILED if job.attempts >= self.max_attempts else PENDING
+        return self.update_leased(job, owner, { 'status': status, 'owner': None, 'lease_expires': None, 'error': error })
+
+    def update_leased(self, job: Job, owner: str, values: dict[str, any]) -> bool:
+        return self.collection.update_one({ 'key': job.key, 'status': LEASED, 'owner': owner }, { '$set': values }).modified_count > 0
+
+    def requeue_expired(self) -> int:
+        now = time.time()
+        self.collection.update_many({ 'status': LEASED, 'lease_expires': { '$lt': now }, 'attempts': { '$gte': self.max_attempts } },
+                                    { '$set': { 'status': FAILED, 'error': 'lease expired' } })
+        count = self.collection.update_many({ 'status': LEASED, 'lease_expires': { '$lt': now } },
+                                            { '$set': { 'status': PENDING, 'owner': None, 'lease_expires': None } }).modified_count
+        if count > 0:
+            logger.warning('Requeued {} jobs with expired leases'.format(count))
+        return count
+
+    def jobs(self) -> list[Job]:
+        return [ Job(**document) for document in self.collection.find({}, JOB_FIELDS).sort('_id', ASCENDING) ]
+
+    def count(self, statuses: list[str]) -> int:
+        return self.collection.count_documents({ 'status': { '$in': statuses } })
+
+    def status_totals(self, shard: str = None) -> list[dict[str, any]]:
+        pipeline = [ { '$match': { 'shard': shard } } ] if shard != None else []
+        pipeline.append({ '$group': { '_id': { 'shard': '$shard', 'status': '$status' }, 'jobs': { '$sum': 1 }, 'games': { '$sum': '$games' },
+                                      'started_at': { '$min': '$started_at' }, 'finished_at': { '$max': '$finished_at' } } })
+        return [ dict(totals.pop('_id'), **totals) for totals in self.collection.aggregate(pipeline) ]
+
+def create_queue(config, mongo = None) -> JobQueue:
+    ''' Job queue from the Queue section of the config, the mongo backend keeps jobs in the crawl database '''
+    queue_config = config.get('Queue', {})
+    max_attempts = queue_config.get('MaxAttempts', 3)
+    if queue_config.get('Backend', 'sqlite') == 'mongo':
+        return MongoJobQueue(mongo.database.get_collection(queue_config.get('Collection', 'crawl_jobs')), max_attempts)
+
+    return SQLiteJobQueue(queue_config.get('Path', 'crawl_jobs.sqlite'), max_attempts)
+
+def worker_name() -> str:
+    return '{}-{}'.format(socket.gethostname(), os.getpid())
+
+class JobWorker(object):
+    """
+    Drains a job queue with one scraper: loads the listing page of a job, scrapes its games and writes them.
+    A background thread keeps the lease of the current job alive while it is scraped.
+    """
+
+    def __init__(self, queue: JobQueue, scraper, mongo, mapper, owner: str = None, lease_seconds: float = 600, heartbeat_seconds: float = 60, idle_seconds: float = 30):
+        self.queue = queue
+        self.scraper = scraper
+        self.mongo = mongo
+        self.mapper = mapper
+        self.owner = owner or worker_name()
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.idle_seconds = idle_seconds
+        self.planner = JobPlanner()
+        self.known_tournaments = set()
+
+    def run(self, max_jobs: int = None) -> int:
+        ''' Works until the queue is drained, returns the number of completed jobs '''
+        completed = 0
+        while max_jobs == None or completed < max_jobs:
+            job = self.queue.lease(self.owner, self.lease_seconds)
+            if job == None:
+                # Page 1 jobs leased by other workers may still add pages, so the queue is drained only when nothing is leased
+                if not self.queue.pending_work():
+                    break
+                time.sleep(self.idle_seconds)
+                continue
+
+            if self.work(job):
+                completed += 1
+            self.log_progress(job)
+
+        logger.info('Worker {} completed {} jobs'.format(self.owner, completed))
+        return completed
+
+    def work(self, job: Job) -> bool:
+        logger.info('Worker {} leased {} (attempt {})'.format(self.owner, job, job.attempts))
+        stop_heartbeat = threading.Event()
+        heartbeat = threading.Thread(target = self.keep_alive, args = (job, stop_heartbeat), name = 'job-heartbeat', daemon = True)
+        heartbeat.start()
+        try:
+            self.load_known_links(job)
+            listing = self.scraper.load_listing_typeA(job.sport, job.country, job.tournament, job.scrape_type, job.season, job.page)
+            if listing == None:
+                raise ValueError('Listing page could not be loaded')
+            if len(listing.rows) == 0:
+                # A blocked page has no rows and no pagination, completing it would lose the remaining pages of a page 1 job
+                raise ValueError('Listing page has no games')
+
+            if job.page == 1 and listing.page_count > 1:
+                added = self.queue.enqueue(self.planner.remaining_pages(job, listing.page_count))
+                logger.info('Season {} has {} pages, queued {} more'.format(job.shard, listing.page_count, added))
+
+            games = self.scraper.scrape_listing_games_typeA(listing, job.sport, job.tournament, job.scrape_type, job.season)
+            self.mongo.insert_many(self.mapper.map_to_domain(games))
+            return self.queue.complete(job, self.owner, len(games))
+        except Exception as e:
+            logger.error('Job {} failed - {}'.format(job, e))
+            self.queue.fail(job, self.owner, str(e))
+            return False
+        finally:
+            stop_heartbeat.set()
+            heartbeat.join()
+
+    def keep_alive(self, job: Job, stop: threading.Event):
+        while not stop.wait(self.heartbeat_seconds):
+            if not self.queue.heartbeat(job, self.owner, self.lease_seconds):
+                logger.warning('Lease of {} was lost, another worker may scrape it again'.format(job))
+                return
+
+    def load_known_links(self, job: Job):
+        # Games stored by earlier runs or other workers are skipped, links are read once per tournament
+        if (job.sport, job.tournament) in self.known_tournaments:
+            return
+
+        self.scraper.known_links |= self.mongo.get_game_links(job.sport, job.tournament, detailed_only = not self.scraper.listing_only)
+        self.known_tournaments.add((job.sport, job.tournament))
+
+    def log_progress(self, job: Job):
+        shard = self.queue.progress(job.shard).get(job.shard)
+        if shard == None:
+            return
+
+        total = shard[PENDING] + shard[LEASED] + shard[DONE] + shard[FAILED]
+        logger.info('Shard {}: {}/{} pages done, {} failed, {} games ({} pages/h, {} games/h)'.format(
+            job.shard, shard[DONE], total, shard[FAILED], shard['games'], shard['pages_per_hour'], shard['games_per_hour']))
@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = 'oddsportal_'
+
+# Descriptions written as # HELP lines of the Prometheus textfile, metrics missing here are exported without one
+METRIC_HELP = {
+    'page_load_seconds': 'Time spent in driver navigation per page type',
+    'readiness_wait_seconds': 'Time spent waiting for page content to settle per wait outcome',
+    'scheduler_idle_seconds': 'Time the polling scheduler slept waiting for the next due poll',
+    'listing_rows_parsed': 'Game rows parsed from listing pages',
+    'games_scraped': 'Games built from game pages or listing rows',
+    'games_skipped': 'Games not scraped per reason',
+    'retries': 'Page load retries per page type',
+    'fetches': 'Page navigations per host',
+    'fetch_failures': 'Failed page fetches per reason',
+    'throttle_wait_seconds': 'Time spent waiting for the per host rate limiter',
+    'backoff_seconds': 'Time spent backing off before retries',
+    'circuit_wait_seconds': 'Time fetches were paused by the open circuit breaker',
+    'circuit_opened': 'Times the circuit breaker paused the crawl',
+    'page_cache': 'Page cache lookups per result',
+    'euroleague_requests': 'Euroleague API responses per endpoint and source',
+    'euroleague_request_seconds': 'Latency of Euroleague API requests',
+    'page_bytes': 'Bytes transferred by the browser per page type',
+    'feed_fallbacks': 'Games scraped from the rendered page because their odds feed could not be read',
+    'requests_blocked': 'Browser requests blocked by the browser profile per page type',
+    'mongo_write_seconds': 'Latency of Mongo batch writes',
+    'mongo_games': 'Games written to Mongo per outcome',
+}
+
+class Summary:
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+class Metrics(object):
+    """
+    Thread-safe counters and timing summaries of a scrape run, keyed by metric name and labels.
+
+    Browser workers record into the same registry from their own threads. With tracing enabled every timed block is
+    also kept as a span with its parent, so a game span shows how its page load and readiness waits added up.
+    """
+
+    def __init__(self, tracing: bool = False, max_spans: int = 100000):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.tracing = tracing
+        self.max_spans = max_spans
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started_at = datetime.utcnow()
+            self.started = time.monotonic()
+            self.counters = {}
+            self.summaries = {}
+            self.spans = []
+            self.span_ids = 0
+
+    def increment(self, name: str, value: int = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.summaries.setdefault(key, Summary()).observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        ''' Observes the duration of the block under name, and records it as a span when tracing '''
+        with self.span(name.removesuffix('_seconds'), **labels):
+            started = time.monotonic()
+            try:
+                yield
+            finally:
+                self.observe(name, time.monotonic() - started, **labels)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        ''' Records the block as a trace span nested in the enclosing span of the same thread, a no-op unless tracing '''
+        if not self.tracing:
+            yield
+            return
+
+        stack = self.local.__dict__.setdefault('stack', [])
+        with self.lock:
+            self.span_ids += 1
+            span_id = self.span_ids
+
+        span = { 'id': span_id, 'parent': stack[-1] if len(stack) > 0 else None, 'name': name, 'thread': threading.current_thread().name,
+                 'start': datetime.utcnow().isoformat(), 'attributes': attributes }
+        started = time.monotonic()
+        stack.append(span_id)
+        try:
+            yield
+        finally:
+            stack.pop()
+            span['seconds'] = round(time.monotonic() - started, 6)
+            with self.lock:
+                if len(self.spans) < self.max_spans:
+                    self.spans.append(span)
+
+    def summary(self) -> dict[str, any]:
+        ''' JSON friendly snapshot of the run '''
+        with self.lock:
+            counters = [ { 'name': name, 'labels': dict(labels), 'value': value } for (name, labels), value in sorted(self.counters.items()) ]
+            timings = [ { 'name': name, 'labels': dict(labels), 'count': summary.count, 'total_seconds': round(summary.total, 6),
+                          'max_seconds': round(summary.max, 6), 'mean_seconds': round(summary.total / summary.count, 6) if summary.count > 0 else 0 }
+                        for (name, labels), summary in sorted(self.summaries.items()) ]
+
+            return { 'started_at': self.started_at.isoformat(), 'duration_seconds': round(time.monotonic() - self.started, 3),
+                     'counters': counters, 'timings': timings, 'spans': len(self.spans) }
+
+    def write_json(self, path: str):
+        write_atomic(path, json.dumps(self.summary(), indent = 2))
+
+    def write_spans(self, path: str):
+        ''' Writes the recorded spans as JSON lines '''
+        with self.lock:
+            spans = list(self.spans)
+        write_atomic(path, ''.join(json.dumps(span, default = str) + '\n' for span in spans))
+
+    def write_prometheus(self, path: str):
+        ''' Writes the metrics in the Prometheus text format, e.g. for the node exporter textfile collector '''
+        lines = []
+        with self.lock:
+            for name in sorted({ name for name, _ in self.counters.keys() }):
+                lines += metric_header(name + '_total', 'counter')
+                lines += [ '{}{}{} {}'.format(METRIC_PREFIX, name + '_total', format_labels(labels), value)
+                           for (counter, labels), value in sorted(self.counters.items()) if counter == name ]
+
+            for name in sorted({ name for name, _ in self.summaries.keys() }):
+                lines += metric_header(name, 'summary', name)
+                for (summary_name, labels), summary in sorted(self.summaries.items()):
+                    if summary_name == name:
+                        lines.append('{}{}_sum{} {}'.format(METRIC_PREFIX, name, format_labels(labels), round(summary.total, 6)))
+                        lines.append('{}{}_count{} {}'.format(METRIC_PREFIX, name, format_labels(labels), summary.count))
+
+            lines += metric_header('run_start_timestamp_seconds', 'gauge')
+            lines.append('{}run_start_timestamp_seconds {}'.format(METRIC_PREFIX, round(time.time() - (time.monotonic() - self.started), 3)))
+            lines += metric_header('run_duration_seconds', 'gauge')
+            lines.append('{}run_duration_seconds {}'.format(METRIC_PREFIX, round(time.monotonic() - self.started, 3)))
+
+        write_atomic(path, '\n'.join(lines) + '\n')
+
+    def export(self, directory: str):
+        ''' Writes metrics.json, oddsportal.prom and, when tracing, spans.jsonl to the directory '''
+        os.makedirs(directory, exist_ok = True)
+        self.write_json(os.path.join(directory, 'metrics.json'))
+        self.write_prometheus(os.path.join(directory, 'oddsportal.prom'))
+        if self.tracing:
+            self.write_spans(os.path.join(directory, 'spans.jsonl'))
+        logger.info('Run metrics written to {}'.format(directory))
+
+def metric_header(name: str, type: str, help_name: str = None) -> list[str]:
+    help = METRIC_HELP.get(help_name or name.removesuffix('_total'))
+    header = [ '# HELP {}{} {}'.format(METRIC_PREFIX, name, help) ] if help != None else []
+    return header + [ '# TYPE {}{} {}'.format(METRIC_PREFIX, name, type) ]
+
+def format_labels(labels: tuple) -> str:
+    if len(labels) == 0:
+        return ''
+
+    escaped = [ '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for key, value in labels ]
+    return '{' + ','.join(escaped) + '}'
+
+def write_atomic(path: str, content: str | bytes):
+    ''' Writes to a temporary file first and renames it, readers and crashes never see a half written file '''
+    # The temporary name is unique per process and thread, parallel workers may write the same path
+    temp_path = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+    with open(temp_path, 'wb' if isinstance(content, bytes) else 'w') as output_file:
+        output_file.write(content)
+    os.replace(temp_path, path)
+
+# Registry shared by all modules of a run, __main__ configures and exports it
+run_metrics = Metrics()
@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import List
+
+from bson import ObjectId
+from pymongo import UpdateOne, ASCENDING
+
+from mongo import Mongo, odds_hash, to_snapshot
+from metrics import write_atomic
+
+logger = logging.getLogger(__name__)
+
+class Migration(object):
+    """
+    A data fix over the odds collection. filter selects only the documents that need the fix on the server,
+    transform returns the fields to set on a document or None to leave it unchanged.
+    snapshots returns the odds_history snapshots of a rewrite of odds, so get_odds_at replays the migrated odds as well.
+    """
+
+    name = None
+    filter = {}
+    projection = None
+
+    def transform(self, document: dict[str, any]) -> dict[str, any]:
+        raise NotImplementedError()
+
+    def snapshots(self, document: dict[str, any], update: dict[str, any], now: datetime) -> List[dict[str, any]]:
+        return []
+
+class OddsToFloatMigration(Migration):
+    """
+    Odds were stored as scraped strings by earlier versions, converts them to floats and drops bookmakers without a price
+    """
+
+    name = 'odds_to_float'
+    filter = {'odds': {'$elemMatch': {'$or': [ {'home': {'$type': 'string'}}, {'away': {'$type': 'string'}} ]}}}
+    projection = [ 'odds', 'odds_hash', 'inserted_at', 'updated_at' ]
+
+    def transform(self, document: dict[str, any]) -> dict[str, any]:
+        odds = []
+        for odd in document['odds']:
+            try:
+                odds.append({'name': odd['name'], 'home': float(odd['home']), 'away': float(odd['away'])})
+            except (TypeError, ValueError):
+                continue
+
+        return {'odds': odds, 'odds_hash': odds_hash(odds)}
+
+    def snapshots(self, document: dict[str, any], update: dict[str, any], now: datetime) -> List[dict[str, any]]:
+        # Games with a hash have string odds in their history, the float odds replace them from now on. Games without one
+        # have no history yet and get the converted odds as baseline from when they were stored, as Mongo.write_batch does
+        names = { odd['name'] for odd in update['odds'] }
+        removed = [ odd['name'] for odd in document['odds'] if odd['name'] not in names ]
+        if document.get('odds_hash') != None:
+            return [ to_snapshot(document['_id'], now, update['odds'], removed) ]
+        return [ to_snapshot(document['_id'], document.get('updated_at') or document.get('inserted_at') or now, update['odds'], []) ]
+
+MIGRATIONS = { migration.name: migration for migration in [ OddsToFloatMigration() ] }
+
+class MigrationRunner(object):
+    """
+    Streams the documents selected by a migration in _id order and writes the fixes in unordered bulk writes.
+    The last written _id of every migration is kept in state_path, so an interrupted run continues after it.
+    """
+
+    def __init__(self, mongo: Mongo, state_path: str, batch_size: int = 1000, dry_run: bool = False):
+        self.collection = mongo.book_odds_collection
+        self.history_collection = mongo.odds_history_collection
+        self.state_path = state_path
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.state = {}
+
+        if os.path.exists(state_path):
+            with open(state_path, 'r') as state_file:
+                self.state = json.load(state_file)
+
+    def run(self, migration: Migration) -> dict[str, int]:
+        ''' Applies the migration, returns the number of processed and modified documents '''
+        query = migration.filter
+        last_id = self.state.get(migration.name)
+        if last_id != None:
+            query = {'$and': [ migration.filter, {'_id': {'$gt': ObjectId(last_id)}} ]}
+            logger.info('Resuming migration {} after {}'.format(migration.name, last_id))
+
+        total = self.collection.count_documents(query)
+        logger.info('Migration {} selected {} documents{}'.format(migration.name, total, ' (dry run)' if self.dry_run else ''))
+
+        started = time.monotonic()
+        result = { 'processed': 0, 'modified': 0 }
+        batch = []
+        cursor = self.collection.find(query, migration.projection).sort('_id', ASCENDING).batch_size(self.batch_size)
+        for document in cursor:
+            batch.append(document)
+            if len(batch) >= self.batch_size:
+                self.write_batch(migration, batch, result)
+                self.log_progress(migration, result, total, started)
+                batch = []
+
+        if len(batch) > 0:
+            self.write_batch(migration, batch, result)
+            self.log_progress(migration, result, total, started)
+
+        # A completed migration starts from the beginning again, e.g. for documents that old scrapers store later
+        if not self.dry_run and migration.name in self.state:
+            del self.state[migration.name]
+            self.save_state()
+
+        return result
+
+    def write_batch(self, migration: Migration, documents: List[dict[str, any]], result: dict[str, int]):
+        now = datetime.utcnow()
+        operations, snapshots = [], []
+        for document in documents:
+            update = migration.transform(document)
+            if update == None:
+                continue
+
+            if self.dry_run and len(operations) == 0 and result['processed'] == 0:
+                logger.info('Dry run {} would set {} on {}'.format(migration.name, update, document['_id']))
+
+            operations.append(UpdateOne({'_id': document['_id']}, {'$set': dict(update, updated_at = now)}))
+            snapshots += migration.snapshots(document, update, now)
+
+        result['processed'] += len(documents)
+        if self.dry_run:
+            return
+
+        if len(operations) > 0:
+            result['modified'] += self.collection.bulk_write(operations, ordered = False).modified_count
+        if len(snapshots) > 0:
+            self.history_collection.insert_many(snapshots, ordered = False)
+
+        self.state[migration.name] = str(documents[-1]['_id'])
+        self.save_state()
+
+    def log_progress(self, migration: Migration, result: dict[str, int], total: int, started: float):
+        elapsed = time.monotonic() - started
+        logger.info('Migration {} processed {}/{} documents, modified {} ({:.0f} documents/s)'.format(
+            migration.name, result['processed'], total, result['modified'], result['processed'] / elapsed if elapsed > 0 else 0))
+
+    def save_state(self):
+        write_atomic(self.state_path, json.dumps(self.state, indent = 2))
@@ -1,5 +1,9 @@
+from array import array
 from datetime import datetime
 from enum import Enum
+import sys
+
+LISTING_BOOK_NAME = 'Average' # listing pages show odds averaged over bookmakers
 
 class Sport(Enum):
     Unknown = 0
@@ -22,19 +26,67 @@ class ScrapeType(Enum):
     Upcoming = 3
 
 class BookOdds:
+    __slots__ = ('name', 'home', 'away')
+
     def __init__(self, name: str, home: float, away: float) -> None:
         self.name = name
         self.home = home
         self.away = away
 
 class Team:
+    __slots__ = ('name', 'alias', 'code', 'external_name')
+
     def __init__(self, name: str, alias: str, code: str, external_name: str = None) -> None:
         self.name = name
         self.alias = alias
         self.code = code    
         self.external_name = external_name
 
+class OddsBlock:
+    """
+    Bookmaker odds of one game in two float arrays and a tuple of interned bookmaker names, a fraction of the
+    memory of a list of BookOdds. Reads like a list of BookOdds, entries are built when they are accessed.
+    Missing prices are stored as NaN and read back as None.
+    """
+    __slots__ = ('names', 'homes', 'aways')
+
+    def __init__(self, names: tuple, homes: array, aways: array) -> None:
+        self.names = names
+        self.homes = homes
+        self.aways = aways
+
+    @staticmethod
+    def from_odds(odds: list[BookOdds]) -> 'OddsBlock':
+        return OddsBlock.from_prices([ (odd.name, odd.home, odd.away) for odd in odds ])
+
+    @staticmethod
+    def from_prices(prices: list[tuple]) -> 'OddsBlock':
+        ''' Block of (name, home, away) prices '''
+        names = tuple(sys.intern(name) if name != None else None for name, _, _ in prices)
+        return OddsBlock(names, array('d', [ to_price(home) for _, home, _ in prices ]), array('d', [ to_price(away) for _, _, away in prices ]))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ self[i] for i in range(*index.indices(len(self))) ]
+        return BookOdds(self.names[index], from_price(self.homes[index]), from_price(self.aways[index]))
+
+    def __iter__(self):
+        for name, home, away in zip(self.names, self.homes, self.aways):
+            yield BookOdds(name, from_price(home), from_price(away))
+
+def to_price(price: float) -> float:
+    # Legacy documents hold odds as strings with '-' for missing prices, only numbers are prices as in analytics.to_prices
+    return float(price) if isinstance(price, (int, float)) and not isinstance(price, bool) else float('nan')
+
+def from_price(price: float) -> float:
+    return price if price == price else None
+
 class Game:
+    __slots__ = ('sport', 'tournament', 'home', 'away', 'date', 'season', 'home_score', 'away_score', 'odds', 'link', 'id')
+
     def __init__(self, sport: Sport, tournament: str, home: str, away: str, date: datetime, season: str, 
                  home_score: int, away_score: int, odds: list[BookOdds], link: str, id = None) -> None:
         self.sport = sport
@@ -1,44 +1,193 @@
 import logging
-from pymongo import MongoClient, database
-from typing import List
+import hashlib
+import json
+from pymongo import MongoClient, UpdateOne, ASCENDING, database
+from pymongo.errors import BulkWriteError, OperationFailure
+from bson import decode
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from collections.abc import Sequence
+from typing import List, Iterable
 from datetime import datetime
 
-from models import Game, Team
-from domain_mapper import to_game, to_team
+from models import BookOdds, Game, Team, LISTING_BOOK_NAME
+from domain_mapper import to_game, to_team, to_odd
+from metrics import run_metrics
 
 logger = logging.getLogger(__name__)
 
+# Documents stay undecoded BSON bytes until a field is read
+RAW_CODEC_OPTIONS = CodecOptions(document_class = RawBSONDocument)
+
+GAME_KEY_FIELDS = [ 'sport', 'tournament', 'season', 'home', 'away', 'game_date' ]
+
 class Mongo(object):
 
-    def __init__(self, config):
-        self.client = MongoClient(config['ConnectionString'])
+    def __init__(self, config, client: MongoClient = None):
+        self.client = client if client != None else MongoClient(config['ConnectionString'])
         self.database = self.client.get_database(config['Database'])
         self.book_odds_collection = self.database.get_collection(config['BookOddsCollection'])
         self.basketball_teams_collection = self.database.get_collection(config['BasketballTeamsCollection'])
+        self.odds_history_collection = self.database.get_collection(config.get('BookOddsHistoryCollection', 'odds_history'))
+        self.euroleague_games_collection = self.database.get_collection(config.get('EuroleagueGamesCollection', 'euroleague_games'))
+        self.batch_size = config.get('BatchSize', 500)
+        self.ensure_indexes()
+
+    def ensure_indexes(self):
+        try:
+            self.book_odds_collection.create_index([ (field, ASCENDING) for field in GAME_KEY_FIELDS ], unique = True, name = 'game_key')
+        except OperationFailure as e:
+            logger.error("Unique game index could not be created, remove duplicate games first - {}".format(e))
+
+        self.odds_history_collection.create_index([ ('game_id', ASCENDING), ('taken_at', ASCENDING) ], name = 'game_snapshots')
+        self.euroleague_games_collection.create_index([ ('season', ASCENDING), ('game_code', ASCENDING) ], unique = True, name = 'season_game_code')
 
     def get_teams(self) -> List[Team]:
         teams = self.basketball_teams_collection.find({})
         return [ to_team(t_dict) for t_dict in teams ]
 
-    def get_game_odds(self) -> List[Game]:
+    def get_game_odds(self, lazy: bool = False) -> Sequence[Game]:
+        ''' All stored games, lazy keeps them as raw BSON and decodes a game each time it is accessed '''
+        if lazy:
+            collection = self.book_odds_collection.with_options(codec_options = RAW_CODEC_OPTIONS)
+            return LazyGames(list(collection.find({})))
+
         games = self.book_odds_collection.find({})
         return [ to_game(g_dict) for g_dict in games ]
 
-    def insert_many(self, games: List[dict[str, any]]) -> database:
+    def find_games(self, filter: dict[str, any], projection: List[str], batch_size: int = 1000):
+        ''' Cursor over raw game documents, only the projected fields are transferred '''
+        return self.book_odds_collection.find(filter, projection, batch_size = batch_size)
+
+    def get_game_links(self, sport: str, tournament: str, detailed_only: bool = False) -> set:
+        ''' Links of stored games, detailed_only leaves out games that only have listing odds '''
+        filter = {'sport': sport, 'tournament': tournament, 'link': {'$ne': None}}
+        if detailed_only:
+            # Listing games stored without odds by earlier versions are not detailed either
+            filter['odds.name'] = {'$ne': LISTING_BOOK_NAME}
+            filter['odds.0'] = {'$exists': True}
+
+        return set(self.book_odds_collection.distinct('link', filter))
+
+    def insert_many(self, games: Iterable[dict[str, any]], batch_size: int = None, on_batch = None) -> List[dict[str, int]]:
+        ''' 
+        Upserts games in unordered bulk writes as they arrive from the stream, returns inserted, updated and unchanged counts of every batch.
+        on_batch is called after every written batch, e.g. to save crawl progress.
+        '''
+        batch_size = batch_size or self.batch_size
+        results = []
+        batch = []
         for game in games:
-            existing = self.book_odds_collection.find_one({'sport': game['sport'], 'tournament': game['tournament'], 'season': game['season'], 
-                                                'home': game['home'], 'away': game['away'], 'game_date': game['game_date']})
-            if existing != None and game_odds_same(game['odds'], existing['odds']) == False:
-                existing['odds'] = game['odds']
-                existing['updated_at'] = datetime.utcnow()
-                result = self.book_odds_collection.update_one({"_id": existing["_id"]}, {"$set": {"odds": game["odds"], "updated_at": datetime.utcnow()}})
-                logger.info("Updated game {} with result {}".format(existing, result))
-            elif existing == None:
-                result = self.book_odds_collection.insert_one(game)
-                logger.debug("Inserted game {} with id {}".format(game, result.inserted_id))
+            batch.append(game)
+            if len(batch) >= batch_size:
+                results.append(self.write_batch(batch))
+                batch = []
+                if on_batch != None:
+                    on_batch()
+
+        if len(batch) > 0:
+            results.append(self.write_batch(batch))
+
+        if on_batch != None:
+            on_batch()
+
+        return results
+
+    def write_batch(self, games: List[dict[str, any]]) -> dict[str, int]:
+        # Later duplicates of a game in the batch win, stored games are read with one query per batch
+        games = list({ game_key(game): game for game in games }.values())
+        existing = { game_key(stored): stored for stored in self.book_odds_collection.find(
+            {'$or': [ { field: game.get(field) for field in GAME_KEY_FIELDS } for game in games ]},
+            GAME_KEY_FIELDS + [ 'odds', 'odds_hash', 'inserted_at', 'updated_at' ]) }
+
+        now = datetime.utcnow()
+        # Snapshots are kept with the index of the operation that writes their odds and only stored once it succeeded
+        operations, snapshots = [], []
+        result = { 'inserted': 0, 'updated': 0, 'unchanged': 0 }
+        for game in games:
+            new_hash = odds_hash(game['odds'])
+            stored = existing.get(game_key(game))
+
+            if stored == None:
+                # The id of a new game is known once it was upserted, another writer may have inserted it first
+                key = { field: game.get(field) for field in GAME_KEY_FIELDS }
+                document = dict(game, odds_hash = new_hash, updated_at = now)
+                snapshots.append((len(operations), to_snapshot(None, now, game['odds'], [])))
+                operations.append(UpdateOne(key, {'$setOnInsert': { field: value for field, value in document.items() if field not in key }}, upsert = True))
+                continue
+
+            if stored.get('odds_hash', odds_hash(stored['odds'])) == new_hash:
+                if stored.get('odds_hash') == None:
+                    operations.append(UpdateOne({'_id': stored['_id']}, {'$set': {'odds_hash': new_hash}}))
+                result['unchanged'] += 1
+                continue
+
+            # Games stored before snapshots existed get their previous odds as a baseline snapshot
+            if stored.get('odds_hash') == None:
+                snapshots.append((len(operations), to_snapshot(stored['_id'], stored.get('updated_at') or stored.get('inserted_at') or now, stored['odds'], [])))
+
+            changed, removed = odds_changes(stored['odds'], game['odds'])
+            snapshots.append((len(operations), to_snapshot(stored['_id'], now, changed, removed)))
+            operations.append(UpdateOne({'_id': stored['_id']}, {'$set': {'odds': game['odds'], 'odds_hash': new_hash, 'updated_at': now}}))
+            result['updated'] += 1
+
+        with run_metrics.timer('mongo_write_seconds', collection = self.book_odds_collection.name):
+            if len(operations) > 0:
+                try:
+                    details = self.book_odds_collection.bulk_write(operations, ordered = False).bulk_api_result
+                except BulkWriteError as e:
+                    details = e.details
+                    for error in details.get('writeErrors', []):
+                        logger.error("Failed to write game {} - {}".format(operations[error['index']], error['errmsg']))
+                result['inserted'] = details['nUpserted']
+                snapshots = written_snapshots(snapshots, details)
+
+            if len(snapshots) > 0:
+                self.odds_history_collection.insert_many(snapshots, ordered = False)
+
+        for outcome, count in result.items():
+            run_metrics.increment('mongo_games', count, outcome = outcome)
+
+        logger.info("Wrote batch of {} games {}".format(len(games), result))
+        return result
+
+    def get_odds_at(self, game_id, at: datetime) -> List[BookOdds]:
+        ''' Rebuilds the bookmaker odds of a game as they were at the given time from its odds snapshots '''
+        odds = {}
+        snapshots = self.odds_history_collection.find({'game_id': game_id, 'taken_at': {'$lte': at}}).sort('taken_at', ASCENDING)
+        for snapshot in snapshots:
+            for odd in snapshot['odds']:
+                odds[odd['name']] = odd
+            for name in snapshot['removed']:
+                odds.pop(name, None)
+
+        return [ to_odd(odd) for odd in odds.values() ]
+
+    def set_game_codes(self, codes: dict[any, int]):
+        ''' Stores official game codes of odds games, keyed by game id '''
+        self.update_fields({ id: { 'game_code': code } for id, code in codes.items() })
+
+    def update_fields(self, updates: dict[any, dict[str, any]]):
+        ''' Sets fields of stored games in one unordered bulk write, keyed by game id '''
+        if len(updates) > 0:
+            # Incremental exports select on updated_at, so changed fields must move it as well
+            now = datetime.utcnow()
+            self.book_odds_collection.bulk_write([ UpdateOne({ '_id': id }, { '$set': dict(fields, updated_at = now) }) for id, fields in updates.items() ], ordered = False)
+
+    def get_euroleague_game_codes(self, season: str) -> set:
+        return set(self.euroleague_games_collection.distinct('game_code', { 'season': season }))
+
+    def upsert_euroleague_games(self, games: List[dict[str, any]]):
+        ''' Box scores and play-by-play of official games, keyed by season and game code '''
+        if len(games) == 0:
+            return
+
+        self.euroleague_games_collection.bulk_write([ UpdateOne({ 'season': game['season'], 'game_code': game['game_code'] }, { '$set': dict(game, fetched_at = datetime.utcnow()) }, upsert = True)
+                                                      for game in games ], ordered = False)
+        logger.info("Stored official data of {} Euroleague games".format(len(games)))
 
     def update_one(self, id, game: dict[str, any]) -> database:
-        result = self.book_odds_collection.update_one({"_id": id}, {"$set": {"odds": game["odds"], "updated_at": datetime.utcnow()}})
+        result = self.book_odds_collection.update_one({"_id": id}, {"$set": {"odds": game["odds"], "odds_hash": odds_hash(game["odds"]), "updated_at": datetime.utcnow()}})
         logger.debug("Updated IDs: {}".format(result.upserted_id))
 
     def insert_one(self, games: dict[str, any]) -> database:
@@ -54,17 +203,55 @@ class Mongo(object):
         self.client.close()
 
 
-def game_odds_same(list1, list2):
-    # Check if the lengths of the lists are the same
-    if len(list1) != len(list2):
-        return False
+class LazyGames(Sequence):
+    """
+    Games held as raw BSON documents, about the size of the stored data. A Game is decoded on every access,
+    so iterating keeps only the current game in memory.
+    """
+
+    def __init__(self, documents: List[RawBSONDocument]):
+        self.documents = documents
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return LazyGames(self.documents[index])
+        # Decoding the whole document at once is several times faster than reading fields of the raw document one by one
+        return to_game(decode(self.documents[index].raw))
+
+def game_key(game: dict[str, any]) -> tuple:
+    return tuple(game.get(field) for field in GAME_KEY_FIELDS)
 
-    # Compare values of corresponding objects
-    for obj1, obj2 in zip(list1, list2):
-        if obj1['name'] != obj2['name'] or obj1['home'] != obj2['home'] or obj1['away'] != obj2['away']:
-            return False
+def odds_hash(odds: List[dict[str, any]]) -> str:
+    # Bookmakers are sorted so the hash does not depend on the order they were scraped in
+    books = sorted([ [ odd['name'], odd['home'], odd['away'] ] for odd in odds ], key = lambda book: [ str(value) for value in book ])
+    return hashlib.sha1(json.dumps(books).encode('utf-8')).hexdigest()
 
-    # If all corresponding objects have the same values, return True
-    return True
+def odds_changes(old_odds: List[dict[str, any]], new_odds: List[dict[str, any]]) -> tuple:
+    ''' Bookmakers whose prices are new or changed and names of bookmakers that are no longer listed '''
+    old_prices = { odd['name']: (odd['home'], odd['away']) for odd in old_odds }
+    new_names = { odd['name'] for odd in new_odds }
+    changed = [ odd for odd in new_odds if old_prices.get(odd['name']) != (odd['home'], odd['away']) ]
+    removed = [ name for name in old_prices.keys() if name not in new_names ]
+    return changed, removed
 
+def written_snapshots(snapshots: List[tuple], details: dict[str, any]) -> List[dict[str, any]]:
+    ''' Snapshots of (operation index, snapshot) pairs whose operation was written, new games get the id they were upserted with '''
+    failed = { error['index'] for error in details.get('writeErrors', []) }
+    upserted = { upsert['index']: upsert['_id'] for upsert in details.get('upserted', []) }
+    written = []
+    for index, snapshot in snapshots:
+        if index in failed:
+            continue
+        if snapshot['game_id'] == None:
+            # An upsert that matched a game inserted meanwhile did not write these odds
+            if index not in upserted:
+                continue
+            snapshot['game_id'] = upserted[index]
+        written.append(snapshot)
+    return written
 
+def to_snapshot(game_id, taken_at: datetime, odds: List[dict[str, any]], removed: List[str]) -> dict[str, any]:
+    return { 'game_id': game_id, 'taken_at': taken_at, 'odds': odds, 'removed': removed }
@@ -0,0 +1,93 @@
+import glob
+import gzip
+import hashlib
+import logging
+import os
+import time
+from typing import Iterator
+
+from models import ScrapeType
+from metrics import run_metrics, write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cached page stays fresh per scrape type, None never expires. Finished seasons do not change,
+# results of the running season get new games and upcoming odds move all the time
+DEFAULT_TTL = {
+    ScrapeType.Historical: None,
+    ScrapeType.CurrentSeasonHistorical: 6 * 3600,
+    ScrapeType.Upcoming: 2 * 60,
+}
+
+class PageCache(object):
+    """
+    Rendered page sources on disk, gzip compressed and addressed by the sha256 of their URL.
+
+    A file starts with the URL it was fetched from, so a cache directory can be inspected or rebuilt without an index.
+    Freshness is judged from the file modification time and the TTL of the scrape type the page is read for.
+    """
+
+    def __init__(self, directory: str, ttl: dict[ScrapeType, float] = None, compress_level: int = 6):
+        self.directory = directory
+        self.ttl = dict(DEFAULT_TTL, **(ttl or {}))
+        self.compress_level = compress_level
+
+    @staticmethod
+    def from_config(config) -> 'PageCache':
+        ''' Page cache of the PageCache config section, None when the cache is disabled '''
+        cache_config = config.get('PageCache', {})
+        if not cache_config.get('Enabled', False):
+            return None
+
+        ttl = { ScrapeType[name]: minutes * 60 if minutes != None else None for name, minutes in cache_config.get('TtlMinutes', {}).items() }
+        return PageCache(cache_config.get('Directory', 'page_cache'), ttl)
+
+    def path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        # Two level fan out keeps directories small for crawls of many seasons
+        return os.path.join(self.directory, key[:2], key + '.html.gz')
+
+    def get(self, url: str, scrapeType: ScrapeType, ignore_ttl: bool = False) -> str:
+        ''' Cached page source of url, None when it is not cached or expired for the scrape type '''
+        path = self.path(url)
+        try:
+            age = time.time() - os.path.getmtime(path)
+        except OSError:
+            run_metrics.increment('page_cache', result = 'miss')
+            return None
+
+        ttl = self.ttl.get(scrapeType)
+        if not ignore_ttl and ttl != None and age > ttl:
+            run_metrics.increment('page_cache', result = 'expired')
+            return None
+
+        try:
+            with gzip.open(path, 'rt', encoding = 'utf-8') as cache_file:
+                cached_url = cache_file.readline().rstrip('\n')
+                html = cache_file.read()
+        except (OSError, EOFError) as e:
+            logger.warning('Cached page of {} is unreadable and is fetched again - {}'.format(url, e))
+            run_metrics.increment('page_cache', result = 'corrupt')
+            return None
+
+        if cached_url != url:
+            # Hash collisions are not expected, but a wrong page must never be parsed as this one
+            run_metrics.increment('page_cache', result = 'miss')
+            return None
+
+        run_metrics.increment('page_cache', result = 'hit')
+        return html
+
+    def pages(self) -> Iterator[tuple[str, str]]:
+        ''' Every readable cached page as (url, html), whatever its age '''
+        for path in sorted(glob.glob(os.path.join(self.directory, '*', '*.html.gz'))):
+            try:
+                with gzip.open(path, 'rt', encoding = 'utf-8') as cache_file:
+                    yield cache_file.readline().rstrip('\n'), cache_file.read()
+            except (OSError, EOFError) as e:
+                logger.warning('Cached page {} is unreadable - {}'.format(path, e))
+
+    def put(self, url: str, html: str):
+        path = self.path(url)
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        write_atomic(path, gzip.compress((url + '\n' + html).encode('utf-8'), compresslevel = self.compress_level))
@@ -0,0 +1,96 @@
+import time
+import logging
+
+from metrics import run_metrics
+
+logger = logging.getLogger(__name__)
+
+# Installs a MutationObserver on first call after each navigation and reports
+# [matching element count, document height, milliseconds since last DOM mutation]
+READINESS_SCRIPT = """
+if (!window.__oddsMutationObserver) {
+    window.__oddsLastMutation = Date.now();
+    window.__oddsMutationObserver = new MutationObserver(function() { window.__oddsLastMutation = Date.now(); });
+    window.__oddsMutationObserver.observe(document.body, { childList: true, subtree: true, characterData: true });
+}
+return [document.querySelectorAll(arguments[0]).length, document.body.scrollHeight, Date.now() - window.__oddsLastMutation];
+"""
+
+class WaitRecord:
+    def __init__(self, name: str, seconds: float, reason: str, count: int) -> None:
+        self.name = name
+        self.seconds = seconds
+        self.reason = reason
+        self.count = count
+
+    def __str__(self):
+        return f"{self.name} {self.seconds:.2f}s ({self.reason}, {self.count} elements)"
+
+class PageWaiter(object):
+    """
+    Waits until page content has stopped loading instead of sleeping a fixed time.
+
+    A page is ready once the elements matched by a selector and the document height have stopped growing,
+    or no DOM mutations happened for settle_time seconds. A page with no matched elements is only considered
+    ready after it stayed quiet for empty_settle_time. Every wait is bounded by timeout.
+    """
+
+    def __init__(self, driver, timeout: float = 10, poll_interval: float = 0.2, settle_time: float = 0.6, empty_settle_time: float = 2.5):
+        self.driver = driver
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.empty_settle_time = empty_settle_time
+        # Aggregates instead of every wait, scrapers and the scheduler run for days
+        self.wait_count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.reasons = {}
+
+    def wait_until_ready(self, selector: str, name: str = None) -> WaitRecord:
+        ''' Blocks until page content matched by selector has settled, returns how long the wait took '''
+        started = time.monotonic()
+        last_state = None
+        last_change = started
+        reason = 'timeout'
+
+        while True:
+            count, height, quiet_ms = self.driver.execute_script(READINESS_SCRIPT, selector)
+            now = time.monotonic()
+
+            if (count, height) != last_state:
+                last_state = (count, height)
+                last_change = now
+
+            stable_for = now - last_change
+            # The mutation clock is only reset after a navigation, quiet time from before this wait must not count
+            quiet_for = min(quiet_ms / 1000, now - started)
+
+            if count > 0 and stable_for >= self.settle_time:
+                reason = 'stable'
+                break
+            elif count > 0 and quiet_for >= self.settle_time:
+                reason = 'quiet'
+                break
+            elif count == 0 and quiet_for >= self.empty_settle_time:
+                reason = 'empty'
+                break
+            elif now - started >= self.timeout:
+                break
+
+            time.sleep(self.poll_interval)
+
+        record = WaitRecord(name or selector, time.monotonic() - started, reason, count)
+        self.wait_count += 1
+        self.total_seconds += record.seconds
+        self.max_seconds = max(self.max_seconds, record.seconds)
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+        run_metrics.observe('readiness_wait_seconds', record.seconds, reason = reason)
+        logger.debug('Page ready {}'.format(record))
+        return record
+
+    def total_wait_time(self) -> float:
+        return self.total_seconds
+
+    def summary(self) -> dict[str, any]:
+        return { 'waits': self.wait_count, 'total_seconds': self.total_seconds, 'max_seconds': self.max_seconds, 'reasons': dict(self.reasons) }
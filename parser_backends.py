@@ -0,0 +1,247 @@
+import logging
+import threading
+
+from bs4 import BeautifulSoup
+import soupsieve
+
+logger = logging.getLogger(__name__)
+
+# Text of these elements is not page content, all backends leave it out like BeautifulSoup does
+SKIPPED_TEXT_TAGS = ( 'script', 'style', 'template' )
+
+class Selector:
+    """
+    A page selector as CSS for BeautifulSoup, selectolax and the browser, and the same selector as XPath for lxml.
+    XPath expressions are evaluated relative to the node they are applied to.
+    """
+
+    def __init__(self, css: str, xpath: str) -> None:
+        self.css = css
+        self.xpath = xpath
+
+class ParserBackend(object):
+    """
+    Parses a page source once and answers the few tree queries extraction needs, so extraction code stays the same
+    for every parser. Nodes are the parser's own objects, selectors are compiled on first use and reused for every page.
+    """
+
+    name = None
+
+    def __init__(self):
+        # Compiled lxml XPath expressions must not be shared between threads, so every worker thread compiles its own
+        self.local = threading.local()
+
+    def parse(self, html: str):
+        ''' Parses a page and returns its root node '''
+        raise NotImplementedError()
+
+    def compile(self, selector: Selector):
+        raise NotImplementedError()
+
+    def select(self, node, selector: Selector) -> list:
+        raise NotImplementedError()
+
+    def select_one(self, node, selector: Selector):
+        nodes = self.select(node, selector)
+        return nodes[0] if len(nodes) > 0 else None
+
+    def children(self, node, tag: str) -> list:
+        ''' Direct child elements with the tag '''
+        raise NotImplementedError()
+
+    def descendants(self, node, tag: str) -> list:
+        ''' All elements with the tag below node in document order '''
+        raise NotImplementedError()
+
+    def next_siblings(self, node, tag: str, limit: int) -> list:
+        ''' Up to limit following sibling elements with the tag '''
+        raise NotImplementedError()
+
+    def attr(self, node, name: str) -> str:
+        raise NotImplementedError()
+
+    def strings(self, node) -> list[str]:
+        ''' Stripped, non empty text pieces of node and its descendants in document order '''
+        raise NotImplementedError()
+
+    def text(self, node) -> str:
+        return ''.join(self.strings(node))
+
+    def compiled_selector(self, selector: Selector):
+        compiled_selectors = self.local.__dict__.setdefault('compiled', {})
+        compiled = compiled_selectors.get(selector)
+        if compiled == None:
+            compiled = self.compile(selector)
+            compiled_selectors[selector] = compiled
+        return compiled
+
+class HtmlParserBackend(ParserBackend):
+    ''' BeautifulSoup over the standard library html.parser, always available but the slowest '''
+
+    name = 'html.parser'
+
+    def parse(self, html: str):
+        return BeautifulSoup(html, 'html.parser')
+
+    def compile(self, selector: Selector):
+        return soupsieve.compile(selector.css)
+
+    def select(self, node, selector: Selector) -> list:
+        return self.compiled_selector(selector).select(node)
+
+    def select_one(self, node, selector: Selector):
+        return self.compiled_selector(selector).select_one(node)
+
+    def children(self, node, tag: str) -> list:
+        return node.find_all(tag, recursive = False)
+
+    def descendants(self, node, tag: str) -> list:
+        return node.find_all(tag)
+
+    def next_siblings(self, node, tag: str, limit: int) -> list:
+        return node.find_next_siblings(tag, limit = limit)
+
+    def attr(self, node, name: str) -> str:
+        return node.get(name)
+
+    def strings(self, node) -> list[str]:
+        return list(node.stripped_strings)
+
+class LxmlBackend(ParserBackend):
+    ''' lxml.html with selectors as precompiled XPath expressions '''
+
+    name = 'lxml'
+
+    def __init__(self):
+        super().__init__()
+        import lxml.html
+        from lxml import etree
+        self.html = lxml.html
+        self.etree = etree
+
+    def parse(self, html: str):
+        return self.html.document_fromstring(html)
+
+    def compile(self, selector: Selector):
+        return self.etree.XPath(selector.xpath)
+
+    def select(self, node, selector: Selector) -> list:
+        return self.compiled_selector(selector)(node)
+
+    def children(self, node, tag: str) -> list:
+        return list(node.iterchildren(tag))
+
+    def descendants(self, node, tag: str) -> list:
+        return list(node.iterdescendants(tag))
+
+    def next_siblings(self, node, tag: str, limit: int) -> list:
+        siblings = []
+        for sibling in node.itersiblings(tag):
+            if len(siblings) >= limit:
+                break
+            siblings.append(sibling)
+        return siblings
+
+    def attr(self, node, name: str) -> str:
+        return node.get(name)
+
+    def strings(self, node) -> list[str]:
+        pieces = []
+        self.collect_strings(node, pieces)
+        return pieces
+
+    def collect_strings(self, node, pieces: list[str]):
+        # Comments and processing instructions have a non string tag, their text is skipped but not the text that follows them
+        if isinstance(node.tag, str) and node.tag not in SKIPPED_TEXT_TAGS:
+            append_stripped(pieces, node.text)
+            for child in node:
+                self.collect_strings(child, pieces)
+                append_stripped(pieces, child.tail)
+
+class SelectolaxBackend(ParserBackend):
+    ''' selectolax over the lexbor HTML5 parser, selectors are handed to lexbor which matches them in C '''
+
+    name = 'selectolax'
+
+    def __init__(self):
+        super().__init__()
+        from selectolax.lexbor import LexborHTMLParser
+        self.parser = LexborHTMLParser
+
+    def parse(self, html: str):
+        return self.parser(html).root
+
+    def compile(self, selector: Selector):
+        return selector.css
+
+    def select(self, node, selector: Selector) -> list:
+        return node.css(self.compiled_selector(selector))
+
+    def select_one(self, node, selector: Selector):
+        return node.css_first(self.compiled_selector(selector))
+
+    def children(self, node, tag: str) -> list:
+        return [ child for child in node.iter() if child.tag == tag ]
+
+    def descendants(self, node, tag: str) -> list:
+        return node.css(tag)
+
+    def next_siblings(self, node, tag: str, limit: int) -> list:
+        siblings = []
+        sibling = node.next
+        while sibling != None and len(siblings) < limit:
+            if sibling.tag == tag:
+                siblings.append(sibling)
+            sibling = sibling.next
+        return siblings
+
+    def attr(self, node, name: str) -> str:
+        return node.attributes.get(name)
+
+    def strings(self, node) -> list[str]:
+        pieces = []
+        for child in node.traverse(include_text = True):
+            if child.tag == '-text' and child.parent.tag not in SKIPPED_TEXT_TAGS:
+                append_stripped(pieces, child.text_content)
+        return pieces
+
+def append_stripped(pieces: list[str], text: str):
+    if text != None:
+        text = text.strip()
+        if text != '':
+            pieces.append(text)
+
+# Fastest first, html.parser is the fallback when neither optional parser is installed
+BACKENDS = [ SelectolaxBackend, LxmlBackend, HtmlParserBackend ]
+
+def available_backends() -> list[ParserBackend]:
+    backends = []
+    for backend in BACKENDS:
+        try:
+            backends.append(backend())
+        except ImportError:
+            continue
+    return backends
+
+default_backend = None
+
+def get_backend(name: str = None) -> ParserBackend:
+    ''' The named parser backend, or the fastest installed one when name is None '''
+    global default_backend
+    if name == None:
+        if default_backend == None:
+            default_backend = available_backends()[0]
+            logger.info('Parsing pages with {}'.format(default_backend.name))
+        return default_backend
+
+    for backend in BACKENDS:
+        if backend.name == name:
+            return backend()
+
+    raise ValueError('Unknown parser backend {}, use one of {}'.format(name, [ backend.name for backend in BACKENDS ]))
+
+def set_default_backend(name: str):
+    ''' Makes the named backend the one used when extraction is not given a backend, e.g. from config '''
+    global default_backend
+    default_backend = get_backend(name)
+    logger.info('Parsing pages with {}'.format(default_backend.name))
@@ -0,0 +1,183 @@
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+
+from models import ScrapeType
+from domain_mapper import DomainMapper
+from mongo import Mongo, odds_hash
+from scraper import WorkerPool
+from browser import BrowserProfile
+from fetch_policy import FetchPolicy
+from analytics import log_opportunities
+from metrics import run_metrics
+
+logger = logging.getLogger(__name__)
+
+class GameWatch:
+    def __init__(self, link: str, sport: str, country: str, tournament: str, home: str, away: str, start: datetime) -> None:
+        self.link = link
+        self.sport = sport
+        self.country = country
+        self.tournament = tournament
+        self.home = home
+        self.away = away
+        self.start = start
+        self.odds_hash = None
+        self.changes = deque(maxlen = 20)
+        self.polls = 0
+        # Cleared when a refreshed listing of its tournament no longer shows the game
+        self.listed = True
+
+class PollingScheduler(object):
+    """
+    Long running poller of upcoming games of several tournaments.
+
+    Every game is polled at an interval that shrinks as tip-off gets closer and as its odds change more often,
+    so games close to start are refreshed often and far future games rarely. Due polls are taken from a priority
+    queue and run on a pool of browser_budget browsers, never more pages are loaded at once than there are browsers.
+    Game start times are in the browser's local time, so scheduling uses local time as well.
+    """
+
+    def __init__(self, mongo: Mongo, mapper: DomainMapper, tournaments: list[dict[str, str]], value_min_edge: float = 0.03, browser_budget: int = 2,
+                 listing_refresh: timedelta = timedelta(minutes = 30), min_interval: timedelta = timedelta(minutes = 5),
+                 max_interval: timedelta = timedelta(hours = 6), volatility_window: timedelta = timedelta(hours = 3), metrics_directory: str = None,
+                 profile: BrowserProfile = None, fetch_policy: FetchPolicy = None):
+        self.mongo = mongo
+        self.mapper = mapper
+        self.tournaments = tournaments
+        self.value_min_edge = value_min_edge
+        self.browser_budget = browser_budget
+        self.listing_refresh = listing_refresh
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.volatility_window = volatility_window
+        # Run metrics are exported on every listing refresh as the scheduler is not expected to exit
+        self.metrics_directory = metrics_directory
+        self.pool = WorkerPool(browser_budget, profile, fetch_policy = fetch_policy)
+        self.queue = []
+        self.sequence = itertools.count()
+        self.watches = {}
+        self.page_loads = 0
+
+    def run(self, until: datetime = None):
+        ''' Polls until the given time or until interrupted '''
+        for tournament in self.tournaments:
+            self.schedule(datetime.now(), 'listing', tournament)
+
+        in_flight = {}
+        try:
+            while until == None or datetime.now() < until:
+                now = datetime.now()
+                while len(in_flight) < self.browser_budget and len(self.queue) > 0 and self.queue[0][0] <= now:
+                    _, _, kind, item = heapq.heappop(self.queue)
+                    in_flight[self.submit(kind, item)] = (kind, item)
+
+                # Sleep until the next poll is due or, when all browsers are busy, until one of them is free
+                timeout = (self.queue[0][0] - now).total_seconds() if len(self.queue) > 0 else self.listing_refresh.total_seconds()
+                if until != None:
+                    timeout = min(timeout, (until - now).total_seconds())
+                timeout = max(timeout, 0)
+
+                if len(in_flight) == 0:
+                    time.sleep(timeout)
+                    run_metrics.observe('scheduler_idle_seconds', timeout)
+                    continue
+
+                done, _ = wait(list(in_flight.keys()), timeout = None if len(in_flight) == self.browser_budget else timeout, return_when = FIRST_COMPLETED)
+
+                completed_games = []
+                for future in done:
+                    kind, item = in_flight.pop(future)
+                    if kind == 'listing':
+                        self.on_listing(item, future.result())
+                    else:
+                        completed_games.append((item, future.result()))
+
+                if len(completed_games) > 0:
+                    self.on_games(completed_games)
+        except KeyboardInterrupt:
+            logger.info('Scheduler interrupted')
+        finally:
+            self.pool.close()
+            logger.info('Scheduler stopped after {} page loads, watching {} games'.format(self.page_loads, len(self.watches)))
+
+    def schedule(self, due: datetime, kind: str, item):
+        heapq.heappush(self.queue, (due, next(self.sequence), kind, item))
+
+    def submit(self, kind: str, item):
+        self.page_loads += 1
+        if kind == 'listing':
+            return self.pool.submit(lambda worker, tournament: worker.load_listing_typeA(tournament['Sport'], tournament['Country'], tournament['Tournament'], ScrapeType.Upcoming), item)
+
+        return self.pool.submit(lambda worker, watch: worker.scrape_game_type_A(watch.link, watch.sport, watch.tournament, ScrapeType.Upcoming, '', watch.home, watch.away), item)
+
+    def on_listing(self, tournament: dict[str, str], listing):
+        now = datetime.now()
+        self.schedule(now + self.listing_refresh, 'listing', tournament)
+        if self.metrics_directory != None:
+            run_metrics.export(self.metrics_directory)
+        if listing == None:
+            return
+
+        # An empty listing is as likely a blocked page, it does not unlist games
+        listed_links = set([ row.link for row in listing.rows ])
+        for watch in self.watches.values():
+            if len(listed_links) > 0 and (watch.sport, watch.country, watch.tournament) == (tournament['Sport'], tournament['Country'], tournament['Tournament']):
+                watch.listed = watch.link in listed_links
+
+        for row in listing.rows:
+            if row.link in self.watches or (row.date != None and row.date <= now):
+                continue
+
+            watch = GameWatch(row.link, tournament['Sport'], tournament['Country'], tournament['Tournament'], row.home, row.away, row.date)
+            self.watches[row.link] = watch
+            self.schedule(now, 'game', watch)
+
+        logger.info('Watching {} upcoming games'.format(len(self.watches)))
+
+    def on_games(self, completed_games: list):
+        now = datetime.now()
+        scraped = [ (watch, game) for watch, game in completed_games if game != None ]
+        game_dicts = list(self.mapper.map_to_domain([ game for _, game in scraped ]))
+        log_opportunities([ game for _, game in scraped ], self.value_min_edge)
+
+        for (watch, game), game_dict in zip(scraped, game_dicts):
+            watch.start = game.date or watch.start
+            new_hash = odds_hash(game_dict['odds'])
+            if watch.odds_hash != None and watch.odds_hash != new_hash:
+                watch.changes.append(now)
+            watch.odds_hash = new_hash
+
+        for watch, _ in completed_games:
+            watch.polls += 1
+            due = self.next_poll(watch, now)
+            if due == None:
+                logger.info('Stopped watching {}:{} after {} polls'.format(watch.home, watch.away, watch.polls))
+                del self.watches[watch.link]
+            else:
+                self.schedule(due, 'game', watch)
+
+        if len(game_dicts) > 0:
+            self.mongo.insert_many(game_dicts)
+
+    def next_poll(self, watch: GameWatch, now: datetime) -> datetime:
+        ''' Next poll time of a game, None once its closing line was taken '''
+        # Without a start time there is no closing line to wait for, the game is watched while its listing still shows it
+        if watch.start == None:
+            return now + self.max_interval if watch.listed else None
+
+        to_start = watch.start - now
+        if to_start <= timedelta(0):
+            return None
+
+        # A tenth of the time left until tip-off, divided by one plus the number of recent odds changes
+        recent_changes = len([ change for change in watch.changes if now - change <= self.volatility_window ])
+        interval = min(max(to_start / 10 / (1 + recent_changes), self.min_interval), self.max_interval)
+
+        # The last poll is taken shortly before tip-off for the closing line
+        closing_poll = watch.start - self.min_interval
+        return min(now + interval, closing_poll) if closing_poll > now else None
@@ -1,257 +1,443 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-import time
-from selenium.webdriver.common.by import By
 from selenium.common.exceptions import WebDriverException
-from datetime import datetime
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor, Future
+from queue import Queue
+from typing import Iterator
 import logging
-import re
 
-from models import Game, BookOdds, ScrapeType
-from domain_mapper import to_sport
+from models import Game, BookOdds, ScrapeType, LISTING_BOOK_NAME
+from domain_mapper import to_sport, to_sport_name
+from extraction import ListingPage, ListingRow, parse_listing_page, parse_game_page, LISTING_ROW_SELECTOR, BOOKMAKER_ROW_SELECTOR
+from page_waiter import PageWaiter
+from feed import FeedCapture, parse_feed_payload
+from checkpoint import Checkpoint
+from metrics import run_metrics
+from browser import BrowserProfile, PageTraffic, read_network_events, summarize_traffic
+from fetch_policy import FetchPolicy
+from page_cache import PageCache
 
 logger = logging.getLogger(__name__)
 
 class Scraper(object):
     """
     A class to scrape game results from oddsportal.com website
+
+    The browser is started with the scraper and kept open across scrape calls, so one warm session can serve many
+    tournaments and seasons. Close it with close_browser or use the scraper as a context manager.
+
+    With a page cache, page sources are read from the cache while they are fresh. Replay mode parses cached pages
+    only and never starts a browser, pages that are not cached are skipped.
     """
     
-    def __init__(self):
+    def __init__(self, workers: int = 1, listing_only: bool = False, checkpoint: Checkpoint = None, known_links: set = None,
+                 profile: BrowserProfile = None, name: str = 'main', extraction_mode: str = 'dom', fetch_policy: FetchPolicy = None,
+                 page_cache: PageCache = None, replay: bool = False):
+        if extraction_mode not in self.EXTRACTION_MODES:
+            raise ValueError('Unknown extraction mode {}, use one of {}'.format(extraction_mode, self.EXTRACTION_MODES))
+        if replay and (page_cache == None or extraction_mode != 'dom'):
+            raise ValueError('Replay mode parses cached page sources, it needs a page cache and the dom extraction mode')
+
         self.base_url = 'https://www.oddsportal.com'
         self.wait_on_page_load = 3
-        self.options = webdriver.ChromeOptions()
-        # self.options.add_argument('headless')
-        self.options.add_argument("--log-level=3")
-        self.driver = webdriver.Chrome(service=Service(), options=self.options)
+        self.profile = profile if profile != None else BrowserProfile()
+        if extraction_mode == 'feed' and not self.profile.measure_traffic:
+            raise ValueError('Feed extraction reads the browser performance log, enable MeasureTraffic in the browser profile')
+
+        # Rate limits, retries and the circuit breaker of all navigation, shared with the worker browsers
+        self.fetch_policy = fetch_policy if fetch_policy != None else FetchPolicy()
+
+        self.page_cache = page_cache
+        self.replay = replay
+
+        self.driver = self.profile.create_driver(name) if not replay else None
         # exception when no driver created
+        self.waiter = PageWaiter(self.driver) if not replay else None
+
+        # Feed mode reads game odds from the odds feed response instead of the rendered page
+        self.extraction_mode = extraction_mode
+        self.feed_capture = FeedCapture(self.driver) if extraction_mode == 'feed' else None
+
+        # Game pages are fetched by a pool of separate browsers when more than one worker is configured
+        self.workers = workers
+        self.worker_pool = WorkerPool(workers, self.profile, extraction_mode, self.fetch_policy, page_cache) if workers > 1 and not replay else None
+
+        # Listing only mode builds games from listing rows without opening game pages
+        self.listing_only = listing_only
+
+        # Historical crawls skip already stored games and resume from the checkpoint
+        self.checkpoint = checkpoint
+        self.known_links = known_links if known_links != None else set()
 
     SPORTS = [ 'soccer', 'basketball', 'esports', 'darts', 'tennis', 'baseball', 'rugby-union', 'rugby-league', 'american-football', 'hockey', 'volleyball', 'handball' ]
     SPORTS_TYPE_A = [ 'baseball','esports','basketball','darts', 'american-football', 'volleyball' ]
     SPORTS_TYPE_B = [ 'tennis' ]
     SPORTS_TYPE_C = [ 'soccer', 'rugby-union', 'rugby-league', 'handball' ]
     SPORTS_TYPE_D = [ 'hockey' ]
+    EXTRACTION_MODES = [ 'dom', 'feed' ]
 
-    def scrape_oddsportal_historical(self, sport = 'football', country = 'france', tournament = 'ligue-1', start_season = '2019-2020', nseasons = 1, 
-                                     current_season = 'yes', max_page = 25) -> []:
-        ''' Scrapes defined sport tournament historical games in specified seasons from oddsportal.com website '''
-        games = []
+    def __enter__(self):
+        return self
 
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close_browser()
+
+    def scrape_oddsportal_historical(self, sport = 'football', country = 'france', tournament = 'ligue-1', start_season = '2019-2020', nseasons = 1, 
+                                     current_season = 'yes', max_page = 25) -> Iterator[Game]:
+        ''' Scrapes defined sport tournament historical games in specified seasons from oddsportal.com website, games are yielded as they are scraped '''
         if sport not in self.SPORTS :
             logger.warning('Please choose a sport among the following list : \n {} \n'.format(self.SPORTS))
-            return games
+            return
         elif sport == 'tennis' :
             logger.warning('Please indicate the format of tournament for tennis (3 sets or 5 sets) : \n ')
-            return games
+            return
             
         if sport in self.SPORTS_TYPE_A:
-            games = self.scrape_historical_seasons_typeA(start_season, sport, country, tournament, nseasons, current_season, max_page)
+            yield from self.scrape_historical_seasons_typeA(start_season, sport, country, tournament, nseasons, current_season, max_page)
         elif sport in self.SPORTS_TYPE_B:
             logger.warning("Sport {} not supported yet".format(sport))
         elif sport in self.SPORTS_TYPE_C:
             logger.warning("Sport {} not supported yet".format(sport))
         elif sport in self.SPORTS_TYPE_D:
             logger.warning("Sport {} not supported yet".format(sport))
-        
-        self.close_browser()
-        return games
     
-    def scrape_oddsportal_upcoming(self, sport = 'football', country = 'france', tournament = 'ligue-1') -> []:
-        ''' Scrapes defined sport tournament upcoming games from oddsportal.com website '''
-        games = []
-
+    def scrape_oddsportal_upcoming(self, sport = 'football', country = 'france', tournament = 'ligue-1') -> Iterator[Game]:
+        ''' Scrapes defined sport tournament upcoming games from oddsportal.com website, games are yielded as they are scraped '''
         if sport not in self.SPORTS :
             logger.warning('Please choose a sport among the following list : \n {} \n'.format(self.SPORTS))
-            return games
+            return
         elif sport == 'tennis' :
             logger.warning('Please indicate the format of tournament for tennis (3 sets or 5 sets) : \n ')
-            return games
+            return
             
         if sport in self.SPORTS_TYPE_A:
-            games = self.scrape_upcoming_games_TypeA(sport, country, tournament)
+            yield from self.scrape_upcoming_games_TypeA(sport, country, tournament)
         elif sport in self.SPORTS_TYPE_B:
             logger.warning("Sport {} not supported yet".format(sport))
         elif sport in self.SPORTS_TYPE_C:
             logger.warning("Sport {} not supported yet".format(sport))
         elif sport in self.SPORTS_TYPE_D:
             logger.warning("Sport {} not supported yet".format(sport))
-        
-        self.close_browser()
-        return games
 
     def scrape_upcoming_games_TypeA(self, sport, country, tournament) -> []:
         return self.scrape_page_typeA(sport, country, tournament, ScrapeType.Upcoming)
 
-    def scrape_historical_seasons_typeA(self, Season, sport, country, tournament, nseason, current_season = 'yes', max_page = 25) -> []:
+    def scrape_historical_seasons_typeA(self, Season, sport, country, tournament, nseason, current_season = 'yes', max_page = 25) -> Iterator[Game]:
         # Scrapes the number of seasons in given tournament
         long_season = (len(Season) > 6) # indicates whether Season is in format '2010-2011' or '2011' depends on the tournament) 
         Season = int(Season[0:4])
-        games = []
         for _ in range(nseason):
             SEASON1 = '{}'.format(Season)
             if long_season:
                 SEASON1 = '{}-{}'.format(Season, Season+1)
             logger.info('We start to collect season {}'.format(SEASON1))
-            games += self.scrape_season_typeA(sport, country, tournament, ScrapeType.Historical, SEASON1, max_page)
+            yield from self.scrape_season_typeA(sport, country, tournament, ScrapeType.Historical, SEASON1, max_page)
             logger.info('We finished to collect season {} !'.format(SEASON1))
             Season+=1
 
         if current_season == 'yes' : 
+            SEASON1 = '{}'.format(Season)
             if long_season:
                 SEASON1 = '{}-{}'.format(Season, Season+1)
             logger.info('We start to collect current season')
-            games += self.scrape_season_typeA(sport, country, tournament, ScrapeType.CurrentSeasonHistorical, SEASON1, max_page)
+            yield from self.scrape_season_typeA(sport, country, tournament, ScrapeType.CurrentSeasonHistorical, SEASON1, max_page)
             logger.info('We finished to collect current season !')
 
-        return games
+    def scrape_season_typeA(self, sport, country, tournament, scrapeType: ScrapeType, season = '', max_page = 25) -> Iterator[Game]:
+        # Scrape all the pages of game data in particular season, up to the last page of the season.
+        # A page is marked done in the checkpoint once all its games were consumed, the writer saves the checkpoint after persisting them
+        scope = '{}/{}/{}'.format(sport, country, tournament)
+        resumable = self.checkpoint != None and scrapeType == ScrapeType.Historical
+        page_count = self.checkpoint.page_count(scope, season) if resumable else None
 
-    def scrape_season_typeA(self, sport, country, tournament, scrapeType: ScrapeType, season = '', max_page = 25) -> []:
-        # Scrape all the pages of game data in particular season
-        games = []
         for page in range(1, max_page + 1):
+            if page_count != None and page > page_count:
+                logger.info('Reached the last page n°{} of season {}'.format(page_count, season))
+                break
+
+            if resumable and self.checkpoint.is_done(scope, season, page):
+                logger.info('Page n°{} of season {} was already scraped. Skipping'.format(page, season))
+                continue
+
             logger.info('We start to scrape the page n°{}'.format(page))
-            data = self.scrape_page_typeA(sport, country, tournament, scrapeType, season, page)
-            games = games + [y for y in data if y != None]
+            listing = self.load_listing_typeA(sport, country, tournament, scrapeType, season, page)
+            if listing == None:
+                break
 
-        return games
+            if len(listing.rows) == 0:
+                # Left out of the checkpoint so a restart tries the page again, without a page count the season cannot go on
+                logger.warning('Page n°{} of season {} has no games and is not marked done'.format(page, season))
+                if page_count == None:
+                    break
+                continue
+
+            # The page count never shrinks, a page rendered without pagination parses as a single page season
+            page_count = max(page_count or 1, listing.page_count)
+            yield from self.scrape_listing_games_typeA(listing, sport, tournament, scrapeType, season)
+
+            if resumable:
+                self.checkpoint.mark_done(scope, season, page, page_count)
 
     def scrape_page_typeA(self, sport: str, country: str, tournament: str, scrapeType: ScrapeType, season: str = '', page = 1) -> []:
         #Scrape particular page
-        games = []
+        listing = self.load_listing_typeA(sport, country, tournament, scrapeType, season, page)
+        if listing == None:
+            return []
+
+        return self.scrape_listing_games_typeA(listing, sport, tournament, scrapeType, season)
 
+    def load_listing_typeA(self, sport: str, country: str, tournament: str, scrapeType: ScrapeType, season: str = '', page = 1) -> ListingPage:
         if scrapeType == ScrapeType.Upcoming:
-            self.driver.get(self.base_url + '/{}/{}/{}/'.format(sport, country, tournament))
+            url = self.base_url + '/{}/{}/{}/'.format(sport, country, tournament)
         elif scrapeType == ScrapeType.CurrentSeasonHistorical:
-            self.driver.get(self.base_url + '/{}/{}/{}/results/#/page/{}'.format(sport, country, tournament, page))
+            url = self.base_url + '/{}/{}/{}/results/#/page/{}'.format(sport, country, tournament, page)
         elif scrapeType == ScrapeType.Historical:
-            self.driver.get(self.base_url + '/{}/{}/{}-{}/results/#/page/{}'.format(sport, country, tournament, season, page))
+            url = self.base_url + '/{}/{}/{}-{}/results/#/page/{}'.format(sport, country, tournament, season, page)
         else:
             logger.error("Scrape type not specified - {} for sport {} and tournament {}", scrapeType, sport, tournament)
-            return games
+            return None
 
-        self.scroll_to_the_bottom()
-        soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-        eventRows = soup.select('.eventRow')
-
-        games = []
-        for row in eventRows:
-            link_divs = row.find_all('a')
-            game_links = list(filter(lambda x: x.get('href') != None and "{}/{}/{}/".format(sport, country, tournament) in x.get('href') and x.get('href').endswith("{}/".format(tournament)) == False, link_divs))
-
-            game_link = None
-            if len(game_links) == 0:
-                logger.error("Game link was not found. Skipping")
-                continue
-            elif len(game_links) > 1:
-                game_link = game_links[0]['href']
-                logger.warning("There were multiple links found for game at link {}".format(game_link))
+        # Listing pages go through the same retry policy as game pages, a transient error must not end a whole backfill
+        attempt = 0
+        while True:
+            with run_metrics.span('listing', sport = sport, tournament = tournament, season = season, page = page):
+                try:
+                    html = self.get_page_source(url, LISTING_ROW_SELECTOR, 'listing', scrapeType, use_cache = attempt == 0)
+                    if html == None:
+                        logger.warning('Listing page {} is not cached, replay stops here'.format(url))
+                        return None
+
+                    listing = parse_listing_page(html, sport, country, tournament)
+                except WebDriverException as e:
+                    logger.warning('Listing page {} could not be loaded - {}'.format(url, e))
+                    listing, error = None, e
+
+            # A results page without rows is a blocked or half rendered page, upcoming listings can be empty between rounds
+            if listing != None and (len(listing.rows) > 0 or scrapeType == ScrapeType.Upcoming):
+                self.fetch_policy.record_success(url)
+                if len(listing.rows) > 0:
+                    self.cache_page(url, html)
+                run_metrics.increment('listing_rows_parsed', len(listing.rows))
+                return listing
+
+            reason = 'no_rows' if listing != None else 'webdriver'
+            if not self.fetch_policy.should_retry(attempt):
+                self.fetch_policy.record_failure(url, reason)
+                if listing == None:
+                    raise error
+                logger.warning('Listing page {} has no games after {} retries'.format(url, attempt))
+                return listing
+
+            self.fetch_policy.record_failure(url, reason, breaker = False)
+            attempt += 1
+            logger.warning('Listing page unable to be loaded. Retry {} of {}.'.format(attempt, self.fetch_policy.max_retries))
+            run_metrics.increment('retries', page = 'listing')
+            self.fetch_policy.wait_before_retry(attempt)
+
+    def scrape_listing_games_typeA(self, listing: ListingPage, sport: str, tournament: str, scrapeType: ScrapeType, season: str) -> []:
+        game_rows = []
+        for row in listing.rows:
+            if scrapeType != ScrapeType.Upcoming and self.base_url + row.link in self.known_links:
+                logger.debug("Game already stored, skipping location {}".format(self.base_url + row.link))
+                run_metrics.increment('games_skipped', reason = 'stored')
+            elif row.odd_home != "-" or row.odd_away != "-":
+                game_rows.append(row)
             else:
-                game_link = game_links[0]['href']
+                logger.warning("Game skipped due to no odds at location {}".format(self.base_url + row.link))
+                run_metrics.increment('games_skipped', reason = 'no_odds')
 
+        if self.listing_only:
+            run_metrics.increment('games_scraped', len(game_rows), source = 'listing')
+            return [ self.to_listing_game(row, sport, tournament, scrapeType, season) for row in game_rows ]
 
-            event_row_click = row.find('div', {"class": "group flex"})
-            inside_divs = event_row_click.find_all('div', recursive=False)
+        if self.extraction_mode == 'feed':
+            games = self.scrape_game_feeds_type_A(game_rows, sport, tournament, scrapeType, season)
+        else:
+            games = self.scrape_games_type_A([ (row.link, row.home, row.away) for row in game_rows ], sport, tournament, scrapeType, season)
+        return [ game for game in games if game != None ]
 
-            links = event_row_click.find_all('a', {"title" : re.compile(r".*")})
+    def scrape_games_type_A(self, game_rows: list, sport: str, tournament: str, scrapeType: ScrapeType, season: str) -> []:
+        # Scrape game pages of (link, home, away) rows, results are returned in the same order as rows
+        def scrape(worker, row):
+            with run_metrics.span('game', link = row[0]):
+                return worker.scrape_game_type_A(row[0], sport, tournament, scrapeType, season, row[1], row[2])
 
-            if len(links) == 0:
-                logger.warning("No links for game was scraped")
-                continue
+        if self.worker_pool == None:
+            return [ scrape(self, row) for row in game_rows ]
 
-            home = links[0]['title']
-            away = links[1]['title']
+        return self.worker_pool.map(scrape, game_rows)
 
-            if home == None or away == None or len(home) < 3 or len(away) < 3:
-                logger.warning("Game teams {}:{} probably was scraped incorrectly".format(home, away))
+    def scrape_game_feeds_type_A(self, game_rows: list[ListingRow], sport: str, tournament: str, scrapeType: ScrapeType, season: str) -> []:
+        # Same as scrape_games_type_A for feed mode, the listing rows provide the start time and scores the feed does not have
+        def scrape(worker, row):
+            with run_metrics.span('game', link = row.link):
+                return worker.scrape_game_feed_type_A(row, sport, tournament, scrapeType, season)
 
-            odd_home = inside_divs[0].find('p').text
-            odd_away = inside_divs[1].find('p').text
+        if self.worker_pool == None:
+            return [ scrape(self, row) for row in game_rows ]
 
-            if odd_home != "-" or odd_away != "-":
-                game = self.scrape_game_type_A(game_link, sport, tournament, scrapeType, season, home, away)
-                if game != None:
-                    games += [ game ]
-            else:
-                logger.warning("Game skipped due to no odds at location {}".format(self.base_url + game_link))
-        
-        return(games) 
+        return self.worker_pool.map(scrape, game_rows)
+
+    def scrape_game_feed_type_A(self, row: ListingRow, sport: str, tournament: str, scrapeType: ScrapeType, season: str) -> Game:
+        url = self.base_url + row.link
+        self.fetch_policy.before_fetch(url)
+        try:
+            with run_metrics.timer('page_load_seconds', page = 'game_feed'):
+                payload = self.feed_capture.load(url)
+        except WebDriverException:
+            self.fetch_policy.record_failure(url, 'webdriver')
+            raise
 
-    def scrape_game_type_A(self, link: str, sport: str, tournament: str, scrapeType: ScrapeType, season: str, home: str, away: str, retries: int = 0, wait_time = 1) -> Game:
-        self.driver.get(self.base_url + link)
-        self.scroll_to_the_bottom()
+        traffic = self.feed_capture.last_traffic
+        run_metrics.increment('page_bytes', traffic.bytes, page = 'game_feed')
+        run_metrics.increment('requests_blocked', traffic.blocked, page = 'game_feed')
 
+        book_odds, source = [], 'feed'
+        try:
+            book_odds = parse_feed_payload(payload, self.feed_capture.bookmaker_names) if payload != None else []
+        except ValueError as e:
+            logger.warning("Odds feed of {} could not be read - {}".format(url, e))
+
+        if len(book_odds) == 0:
+            # Pages without a readable feed, e.g. an encrypted one, are read from the page that is already loaded instead
+            logger.warning("No odds feed for {}:{} at {}, falling back to the page".format(row.home, row.away, url))
+            run_metrics.increment('feed_fallbacks')
+            book_odds, source = self.read_loaded_game_page(url), 'feed_page'
+            if len(book_odds) == 0:
+                # Only a page without bookmakers is navigated to again, with the retry policy of page scraping
+                return self.scrape_game_type_A(row.link, sport, tournament, scrapeType, season, row.home, row.away)
+
+        self.fetch_policy.record_success(url)
         if scrapeType == ScrapeType.Upcoming or scrapeType == ScrapeType.CurrentSeasonHistorical:
             season = ''
 
-        # Upcoming games do not have scores yet (duh)
-        home_score, away_score = None, None
+        home_score, away_score = (None, None) if scrapeType == ScrapeType.Upcoming else (row.home_score, row.away_score)
+        logger.info("Game scraped from {} {}:{} at {}".format(source, row.home, row.away, row.date))
+        run_metrics.increment('games_scraped', source = source)
+        return Game(to_sport(sport), tournament, row.home, row.away, row.date, season, home_score, away_score, book_odds, url)
 
-        if scrapeType != ScrapeType.Upcoming:
-            home_score = self.get_text('//*[@id="app"]/div/div[1]/div/main/div[2]/div[2]/div/div/div[1]//div[contains(@class, "text-gray-dark")]')
-            away_score = self.get_text('//*[@id="app"]/div/div[1]/div/main/div[2]/div[2]/div/div/div[3]//div[contains(@class, "text-gray-dark")]')
+    def read_loaded_game_page(self, url: str) -> list[BookOdds]:
+        ''' Bookmaker odds of the game page the browser is on, scrolled until all bookmaker rows are rendered '''
+        try:
+            with run_metrics.span('scroll', page = 'game_feed'):
+                self.scroll_to_the_bottom(BOOKMAKER_ROW_SELECTOR)
+            return parse_game_page(self.driver.page_source).book_odds
+        except WebDriverException as e:
+            logger.warning("Loaded game page {} could not be read - {}".format(url, e))
+            return []
+
+    def to_listing_game(self, row: ListingRow, sport: str, tournament: str, scrapeType: ScrapeType, season: str) -> Game:
+        # Game built from the listing row alone, listing odds are kept as a single aggregate bookmaker entry
+        if scrapeType == ScrapeType.Upcoming or scrapeType == ScrapeType.CurrentSeasonHistorical:
+            season = ''
 
-        date_portion_1 = self.get_text('//div[contains(@class, "event-start-time")]/following-sibling::p[2]')
-        date_portion_2 = self.get_text('//div[contains(@class, "event-start-time")]/following-sibling::p[3]')
+        # The aggregate entry is kept even when a price is missing, it marks the game as listing only for the detail scrape
+        book_odds = [ BookOdds(LISTING_BOOK_NAME, to_listing_price(row.odd_home), to_listing_price(row.odd_away)) ]
+        if None in (book_odds[0].home, book_odds[0].away):
+            logger.warning("Listing odds {}:{} for {}:{} probably was scraped incorrectly".format(row.odd_home, row.odd_away, row.home, row.away))
 
-        date_str = None if date_portion_1 == None or date_portion_2 == None else date_portion_1 + date_portion_2
-        date_format = '%d %b %Y,%H:%M'
-        date_time =  None if date_str == None else datetime.strptime(date_str, date_format)
+        home_score, away_score = (None, None) if scrapeType == ScrapeType.Upcoming else (row.home_score, row.away_score)
+        return Game(to_sport(sport), tournament, row.home, row.away, row.date, season, home_score, away_score, book_odds, self.base_url + row.link)
 
-        # Now we collect all bookmaker
-        book_odds = []
+    def scrape_game_details_type_A(self, games: list[Game], scrapeType: ScrapeType) -> []:
+        # Fetch full bookmaker detail for games of a single tournament season collected in listing only mode
+        if len(games) == 0:
+            return []
 
-        soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-        books = soup.select('div.text-xs.border-black-borders')
-        for idx in range(len(books)): # only first 10 bookmakers displayed
-            try:
-                # //div[contains(@cl    ass, "text-xs")][{}]/div[@provider-name="0"]/a[2]/p
-                book = self.get_text('//div[contains(@class, "text-xs")][{}]/div[@provider-name="0"]/a[2]/p'.format(idx + 1)) # bookmaker name
-                
-                if book == None:
-                    continue
+        sport, tournament, season = to_sport_name(games[0].sport), games[0].tournament, games[0].season
+        game_rows = [ (game.link.replace(self.base_url, '', 1), game.home, game.away) for game in games ]
+        details = self.scrape_games_type_A(game_rows, sport, tournament, scrapeType, season)
 
-                book_rows = books[idx].find_all('div', recursive=False)
+        # The listing start time is kept, so the detailed game replaces the stored listing game instead of being added next to it
+        for game, detail in zip(games, details):
+            if detail != None:
+                detail.date = game.date
+        return [ detail for detail in details if detail != None ]
 
-                p_odd =  book_rows[1].find('p')
-                odd_home = p_odd.text if p_odd is not None else '' # home odd
-                p_odd =  book_rows[2].find('p')
-                odd_away = p_odd.text if p_odd is not None else '' # away odd
+    def scrape_game_type_A(self, link: str, sport: str, tournament: str, scrapeType: ScrapeType, season: str, home: str, away: str) -> Game:
+        url = self.base_url + link
+        if scrapeType == ScrapeType.Upcoming or scrapeType == ScrapeType.CurrentSeasonHistorical:
+            season = ''
 
-                try:
-                    odd_home = float(odd_home)
-                    odd_away = float(odd_away)
-                except ValueError:
-                    logger.warning("Skipped! Book {} odds {}:{} probably was scraped incorrectly".format(book, odd_home, odd_away))
-                    continue
-
-                book_odds = book_odds + [BookOdds(book, odd_home, odd_away)]
-            except:
-                logger.error("Exception was thrown for {}", book)
-
-        if len(book_odds) > 0:
-            logger.info("Game scraped {}:{} at {}".format(home, away, date_time))
-            return Game(to_sport(sport), tournament, home, away, date_time, season, home_score, away_score, book_odds, self.base_url + link)
-        elif retries < 10:
-            # Retry policy, increase delay time and cut out once 10 retries are reached
-            logger.warning("Game unable to be scraped, could not locate books Retrying.")
-            self.scrape_game_type_A(link, sport, tournament, scrapeType, season, retries + 1, wait_time * 2)
-        else:
-            logger.warning("Game {}:{} at {} was unable to be scraped at location {}. Skipping.".format(home, away, date_time, self.base_url + link))
-            return None    
-
-    def get_text(self, target):
-        if self.try_get_text(target) != False :
-            return self.driver.find_element(By.XPATH, target).text
-        
-    def try_get_text(self, target):
-        try:
-            self.driver.find_element(By.XPATH, target).text
-        except:
-            return False
-        
-    def scroll_to_the_bottom(self):
-        """A method for scrolling the page."""
+        attempt = 0
+        while True:
+            # Scores, start time and all bookmakers are extracted from a single page source read
+            try:
+                html = self.get_page_source(url, BOOKMAKER_ROW_SELECTOR, 'game', scrapeType, use_cache = attempt == 0)
+                if html == None:
+                    logger.warning("Game page {} is not cached. Skipping.".format(url))
+                    run_metrics.increment('games_skipped', reason = 'not_cached')
+                    return None
+
+                details = parse_game_page(html)
+            except WebDriverException as e:
+                logger.warning("Game page {} could not be loaded - {}".format(url, e))
+                details = None
+
+            if details != None and len(details.book_odds) > 0:
+                self.fetch_policy.record_success(url)
+                self.cache_page(url, html)
+                # Upcoming games do not have scores yet (duh)
+                home_score, away_score = (None, None) if scrapeType == ScrapeType.Upcoming else (details.home_score, details.away_score)
+                logger.info("Game scraped {}:{} at {}".format(home, away, details.date))
+                run_metrics.increment('games_scraped', source = 'game_page')
+                return Game(to_sport(sport), tournament, home, away, details.date, season, home_score, away_score, details.book_odds, url)
+
+            if self.replay:
+                # A cached page is the same on every attempt, it is parsed once and skipped without backing off
+                logger.warning("Cached game page {} has no bookmakers. Skipping.".format(url))
+                run_metrics.increment('games_skipped', reason = 'no_bookmakers')
+                return None
+
+            reason = 'no_bookmakers' if details != None else 'webdriver'
+            if not self.fetch_policy.should_retry(attempt):
+                # Only a game that failed every attempt counts towards the breaker, a ban or challenge page is served on every retry
+                self.fetch_policy.record_failure(url, reason)
+                logger.warning("Game {}:{} was unable to be scraped at location {}. Skipping.".format(home, away, url))
+                run_metrics.increment('games_skipped', reason = reason)
+                return None
+
+            self.fetch_policy.record_failure(url, reason, breaker = False)
+
+            # Retry policy, back off with a growing delay and give up after the configured number of retries
+            attempt += 1
+            logger.warning("Game unable to be scraped, could not locate books. Retry {} of {}.".format(attempt, self.fetch_policy.max_retries))
+            run_metrics.increment('retries', page = 'game')
+            self.fetch_policy.wait_before_retry(attempt)
+
+    def get_page_source(self, url: str, ready_selector: str, page_type: str, scrapeType: ScrapeType, use_cache: bool = True) -> str:
+        ''' Page source of url from the page cache while it is fresh, otherwise loaded in the browser. None when replaying a page that is not cached '''
+        if self.page_cache != None and (use_cache or self.replay):
+            html = self.page_cache.get(url, scrapeType, ignore_ttl = self.replay)
+            if html != None or self.replay:
+                return html
+
+        self.load_page(url, ready_selector, page_type)
+        return self.driver.page_source
+
+    def cache_page(self, url: str, html: str):
+        # Only pages that parsed into data are cached, a page served while blocked must be fetched again
+        if self.page_cache != None and not self.replay:
+            self.page_cache.put(url, html)
+
+    def load_page(self, url: str, ready_selector: str, page_type: str) -> PageTraffic:
+        ''' Navigates to url and scrolls until content matched by ready_selector stops loading, returns the page traffic when it is measured '''
+        self.fetch_policy.before_fetch(url)
+        with run_metrics.timer('page_load_seconds', page = page_type):
+            self.driver.get(url)
+
+        with run_metrics.span('scroll', page = page_type):
+            self.scroll_to_the_bottom(ready_selector)
+
+        if self.profile.measure_traffic:
+            traffic = summarize_traffic(read_network_events(self.driver))
+            run_metrics.increment('page_bytes', traffic.bytes, page = page_type)
+            run_metrics.increment('requests_blocked', traffic.blocked, page = page_type)
+            logger.debug('Loaded {} page {} - {}'.format(page_type, url, traffic))
+            return traffic
+
+        return None
+
+    def scroll_to_the_bottom(self, ready_selector: str):
+        """A method for scrolling the page until no more content is loaded."""
 
         # Get scroll height.
         last_height = self.driver.execute_script("return document.body.scrollHeight")
@@ -261,8 +447,8 @@ class Scraper(object):
             # Scroll down to the bottom.
             self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
 
-            # Wait to load the page.
-            time.sleep(2)
+            # Wait until the page stops loading content, bounded by the waiter timeout.
+            self.waiter.wait_until_ready(ready_selector)
 
             # Calculate new scroll height and compare with last scroll height.
             new_height = self.driver.execute_script("return document.body.scrollHeight")
@@ -274,9 +460,83 @@ class Scraper(object):
             last_height = new_height
 
     def close_browser(self):
-        time.sleep(5)
+        if self.replay:
+            return
+
+        logger.info('Waited for pages {}'.format(self.waiter.summary()))
+        logger.info('Fetch policy {}'.format(self.fetch_policy.summary()))
+        if self.worker_pool != None:
+            self.worker_pool.close()
+
         try:
             self.driver.quit()
             logger.debug('Browser closed')
         except WebDriverException:
-            logger.error('WebDriverException on closing browser - maybe closed?')
\ No newline at end of file
+            logger.error('WebDriverException on closing browser - maybe closed?')
+
+
+def to_listing_price(odd: str) -> float:
+    ''' Price of a listing odds cell, None for '-' and anything else that is not a number '''
+    try:
+        return float(odd)
+    except ValueError:
+        return None
+
+class WorkerPool(object):
+    """
+    A pool of Scraper workers, each driving its own browser, used to fetch game pages in parallel
+    """
+
+    def __init__(self, size: int, profile: BrowserProfile = None, extraction_mode: str = 'dom', fetch_policy: FetchPolicy = None,
+                 page_cache: PageCache = None):
+        self.size = size
+        self.profile = profile
+        self.extraction_mode = extraction_mode
+        self.fetch_policy = fetch_policy if fetch_policy != None else FetchPolicy()
+        self.page_cache = page_cache
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='scraper-worker')
+        self.idle_workers = Queue()
+        self.all_workers = []
+
+    def start(self):
+        # Browsers are started lazily and in parallel as each takes a couple of seconds to launch
+        if len(self.all_workers) > 0:
+            return
+
+        self.all_workers = list(self.executor.map(lambda index: Scraper(profile = self.profile, name = 'worker-{}'.format(index), extraction_mode = self.extraction_mode,
+                                                                    fetch_policy = self.fetch_policy, page_cache = self.page_cache), range(self.size)))
+        for worker in self.all_workers:
+            self.idle_workers.put(worker)
+        logger.info('Started {} scraper workers'.format(self.size))
+
+    def map(self, func, items: list) -> []:
+        ''' Runs func(worker, item) for every item on a free worker, returns results in the order of items '''
+        self.start()
+        return list(self.executor.map(lambda item: self.run(func, item), items))
+
+    def submit(self, func, item) -> Future:
+        ''' Runs func(worker, item) on the next free worker without waiting for the result '''
+        self.start()
+        return self.executor.submit(self.run, func, item)
+
+    def run(self, func, item):
+        worker = self.idle_workers.get()
+        try:
+            return func(worker, item)
+        except Exception as e:
+            logger.error('Worker failed to scrape {} - {}'.format(item, e))
+            return None
+        finally:
+            self.idle_workers.put(worker)
+
+    def close(self):
+        for worker in self.all_workers:
+            logger.info('Worker waited for pages {}'.format(worker.waiter.summary()))
+            try:
+                worker.driver.quit()
+            except WebDriverException:
+                logger.error('WebDriverException on closing worker browser - maybe closed?')
+        self.all_workers = []
+        self.idle_workers = Queue()
+        self.executor.shutdown(wait=True)
+        logger.debug('Worker browsers closed')
\ No newline at end of file